@@ -75,6 +75,20 @@ parser.add_argument('--is-visual-test',
                     help="""If set on the command line, the video is processed only for 10 seconds.
                     This however does not prevent the full thumbnail extraction.""")
 
+parser.add_argument('--jobs',
+                    metavar='N',
+                    type=int,
+                    default=1,
+                    help="""Number of videos processed concurrently, each in its own process (defaults to 1).
+                    The interactive selections (slides, speaker) should have been performed beforehand as
+                    the processes cannot interact with the user.""")
+parser.add_argument('--cores-per-encode',
+                    metavar='K',
+                    type=int,
+                    default=None,
+                    help="""When several videos are processed concurrently, limits the number of concurrent video
+                    encodings to the number of CPUs divided by K. By default, the encodings are not limited.""")
+
 
 args = parser.parse_args()
 
@@ -196,31 +210,41 @@ if args.option:
 # we need only one instance of the workflow as the parents are static fields
 workflow_instance = workflow_factory_obj()
 
-# process all files
+from video.processing.batch import get_video_parameters
+
+videos_and_parameters = []
 for index, f in enumerate(video_files):
 
     if args.process_only_index is not None:
         if index != int(args.process_only_index):
             continue
 
-    video_base_name = os.path.splitext(os.path.basename(f))[0]
-    output_location = os.path.join(args.output_folder, video_base_name)
-    if not os.path.exists(output_location):
-        os.makedirs(output_location)
+    params = get_video_parameters(f,
+                                  options,
+                                  output_folder=args.output_folder,
+                                  thumbnails_folder=args.thumbnails_folder,
+                                  is_visual_test=args.is_visual_test is not None and args.is_visual_test)
+    videos_and_parameters.append((f, params))
 
-    thumbnails_root = os.path.join(args.thumbnails_folder, video_base_name)
-    if not os.path.exists(thumbnails_root):
-        os.makedirs(thumbnails_root)
+if args.jobs > 1 and len(videos_and_parameters) > 1:
+    from multiprocessing import cpu_count
+    from util.parallel import create_resource_limit
+    from video.processing.batch import process_videos_parallel
 
-    params = options.copy()
+    resource_limits = {}
+    if args.cores_per_encode is not None and args.cores_per_encode > 0:
+        resource_limits['video_encoding'] = create_resource_limit(cpu_count() // args.cores_per_encode)
 
-    # those important parameter should not be overriden
-    params.update({'video_filename': os.path.basename(f),
-                   'video_location': os.path.dirname(f),
-                   'thumbnails_root': thumbnails_root,
-                   'json_prefix': os.path.join(output_location, video_base_name),
-                   'is_visual_test': args.is_visual_test is not None and args.is_visual_test
-                   })
+    results = process_videos_parallel(workflow_instance,
+                                      videos_and_parameters,
+                                      nb_jobs=min(args.jobs, len(videos_and_parameters)),
+                                      resource_limits=resource_limits)
+
+    if any(error is not None for _, error in results):
+        sys.exit(1)
 
-    outputs = workflow_module.process(workflow_instance, **params)
-    # outputs.write_videofile(os.path.join(slide_clip_folder, 'slideclip.mp4'))
+else:
+    # process all files
+    for f, params in videos_and_parameters:
+        outputs = workflow_module.process(workflow_instance, **params)
+        # outputs.write_videofile(os.path.join(slide_clip_folder, 'slideclip.mp4'))
@@ -0,0 +1,272 @@
+"""
+FFMpeg runner
+=============
+
+This module runs the ffmpeg processes of the workflow (eg. the extraction of the thumbnails, the mixing of
+the audio or the concatenation of the rendered chunks), and reports their progress.
+
+The progress is read from the ``-progress pipe:1`` output of ffmpeg, made of blocks of ``key=value`` lines,
+each block ending with a ``progress`` line. Each block is given to a progress callback as an
+:py:class:`FFMpegProgress`, giving the number of frames processed per second and the estimated remaining time
+(see :py:class:`ProgressLogger` for logging those).
+
+The runner fails as soon as ffmpeg exits with an error, with the last error messages of ffmpeg, and
+terminates the processes running longer than a timeout.
+
+.. autosummary::
+
+  FFMpegProgress
+  FFMpegProgressParser
+  ProgressLogger
+  ErrorOutputReader
+  run_ffmpeg
+
+"""
+
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+
+logger = logging.getLogger()
+
+#: Number of lines of the error output of ffmpeg reported on failure
+nb_error_lines = 20
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_time(value):
+    """Parses a time given as ``HH:MM:SS.microseconds``, returns the number of seconds"""
+    try:
+        hours, minutes, seconds = value.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+
+class FFMpegProgress(object):
+    """The progress of an ffmpeg process, given by one block of its ``-progress`` output.
+
+    :param dict values: the ``key=value`` pairs of the block
+    :param float elapsed: the time elapsed since the process started, in seconds
+    :param float duration: the duration to process in seconds, ``None`` if unknown
+    """
+
+    def __init__(self, values, elapsed, duration=None):
+        #: The pairs of the block, as strings
+        self.values = values
+
+        #: Time elapsed since the process started, in seconds
+        self.elapsed = elapsed
+
+        #: Duration to process, in seconds
+        self.duration = duration
+
+        #: Number of frames processed, ``None`` if unknown (eg. audio only)
+        self.frame = int(values['frame']) if values.get('frame', '').isdigit() else None
+
+        #: Position reached in the output, in seconds
+        self.out_time = self._get_out_time(values)
+
+        #: ``True`` for the last block, written when the process completes
+        self.is_end = values.get('progress') == 'end'
+
+    @staticmethod
+    def _get_out_time(values):
+        # out_time_ms is also given in microseconds
+        for key in ('out_time_us', 'out_time_ms'):
+            value = _parse_float(values.get(key))
+            if value is not None:
+                return value / 1e6
+
+        return _parse_time(values.get('out_time'))
+
+    @property
+    def fps(self):
+        """Number of frames processed per second, ``None`` if unknown"""
+        fps = _parse_float(self.values.get('fps'))
+        if not fps and self.frame is not None and self.elapsed > 0:
+            fps = self.frame / self.elapsed
+        return fps
+
+    @property
+    def speed(self):
+        """Number of seconds of the output processed per second elapsed, ``None`` if unknown"""
+        if self.out_time is None or self.elapsed <= 0:
+            return None
+        return self.out_time / self.elapsed
+
+    @property
+    def eta(self):
+        """Estimated remaining time in seconds, ``None`` if unknown (eg. if the duration is not given)"""
+        if self.is_end:
+            return 0.
+
+        speed = self.speed
+        if self.duration is None or not speed:
+            return None
+        return max(self.duration - self.out_time, 0.) / speed
+
+
+class FFMpegProgressParser(object):
+    """Parses the ``-progress`` output of ffmpeg, line by line.
+
+    :param float duration: the duration to process in seconds, for estimating the remaining time
+    :param float start_time: the time at which the process started (defaults to now)
+    """
+
+    def __init__(self, duration=None, start_time=None):
+        self.duration = duration
+        self.start_time = time.time() if start_time is None else start_time
+        self._values = {}
+
+    def feed(self, line):
+        """Parses one line of the output, and returns the :py:class:`FFMpegProgress` if the line ends a block
+        (``None`` otherwise)."""
+        if '=' not in line:
+            return None
+
+        key, value = [item.strip() for item in line.split('=', 1)]
+        self._values[key] = value
+        if key != 'progress':
+            return None
+
+        values, self._values = self._values, {}
+        return FFMpegProgress(values, time.time() - self.start_time, self.duration)
+
+
+class ProgressLogger(object):
+    """Progress callback logging the progress of an ffmpeg process, at most every ``interval`` seconds.
+
+    :param str description: the description of the processing (eg. ``'thumbnails of video.mp4'``)
+    :param float interval: the minimal time between two messages, in seconds
+    """
+
+    def __init__(self, description, interval=30):
+        self.description = description
+        self.interval = interval
+        self._last_elapsed = None
+
+    def __call__(self, progress):
+        if progress.is_end or (self._last_elapsed is not None and
+                               progress.elapsed - self._last_elapsed < self.interval):
+            # the completion is logged by the runner
+            return
+
+        self._last_elapsed = progress.elapsed
+        logger.info('[FFMPEG] %s: %s frames, %.1f fps, remaining %s',
+                    self.description,
+                    progress.frame if progress.frame is not None else '?',
+                    progress.fps or 0,
+                    '%.0fs' % progress.eta if progress.eta is not None else 'unknown')
+
+
+def _read_lines(stream, callback):
+    for line in iter(stream.readline, ''):
+        callback(line.rstrip())
+    stream.close()
+
+
+class ErrorOutputReader(object):
+    """Reads the error output of an ffmpeg process in a thread, keeping its last :py:data:`nb_error_lines` lines
+    for reporting the failures. The output is read concurrently as ffmpeg blocks if the pipe is full.
+
+    :param stream: the error output of the process
+    """
+
+    def __init__(self, stream):
+        #: The last lines of the error output
+        self.lines = deque(maxlen=nb_error_lines)
+
+        self._thread = threading.Thread(target=_read_lines, args=(stream, self.lines.append))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def join(self):
+        """Waits for the end of the error output (the process should be terminated)"""
+        self._thread.join()
+
+    def get_text(self):
+        """Returns the last lines of the error output"""
+        return '\n'.join(self.lines)
+
+
+def run_ffmpeg(args, progress_callback=None, duration=None, timeout=None, description=None):
+    """Runs ffmpeg, and waits for its completion while reporting its progress.
+
+    :param list args: the command line, starting with the ffmpeg executable. The output should not be
+      the standard output, which carries the progress.
+    :param progress_callback: the function called with the :py:class:`FFMpegProgress` of each block of the
+      progress output. The process is terminated if the callback raises an exception.
+    :param float duration: the duration to process in seconds, for estimating the remaining time
+    :param float timeout: the maximal duration of the process in seconds. Defaults to no limit.
+    :param str description: the description of the processing in the messages. Defaults to the last argument
+      (the output file).
+    :returns: the last :py:class:`FFMpegProgress` of the process (eg. for the throughput), ``None`` if ffmpeg
+      did not report any progress
+    :raises RuntimeError: if ffmpeg exits with an error, or does not complete before the timeout
+    """
+    description = description or args[-1]
+    args = [args[0], '-nostats', '-progress', 'pipe:1'] + list(args[1:])
+
+    parser = FFMpegProgressParser(duration)
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    errors = ErrorOutputReader(proc.stderr)
+
+    timed_out = threading.Event()
+
+    def terminate():
+        if proc.poll() is None:
+            timed_out.set()
+            proc.kill()
+
+    watchdog = None
+    if timeout is not None:
+        watchdog = threading.Timer(timeout, terminate)
+        watchdog.daemon = True
+        watchdog.start()
+
+    last_progress = None
+    try:
+        for line in iter(proc.stdout.readline, ''):
+            progress = parser.feed(line)
+            if progress is None:
+                continue
+
+            last_progress = progress
+            if progress_callback is not None:
+                progress_callback(progress)
+
+        proc.wait()
+
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        errors.join()
+
+    if timed_out.is_set():
+        raise RuntimeError("ffmpeg did not complete %s within %s seconds" % (description, timeout))
+
+    if proc.returncode != 0:
+        raise RuntimeError("ffmpeg failed on %s (code %d):\n%s" % (description, proc.returncode, errors.get_text()))
+
+    if last_progress is not None:
+        logger.info('[FFMPEG] %s: %s frames in %.1fs (%.1f fps)',
+                    description,
+                    last_progress.frame if last_progress.frame is not None else '?',
+                    last_progress.elapsed,
+                    last_progress.fps or 0)
+
+    return last_progress
@@ -2,9 +2,17 @@
 Functor
 =======
 
-This module provides a class that wraps data into a callable object.
+This module provides classes that wrap data into a callable object.
+
+.. autosummary::
+
+  Functor
+  ArrayFunctor
+
 """
 
+import numpy as np
+
 
 class Functor(object):
     """
@@ -44,3 +52,42 @@ class Functor(object):
             item = self.transform(item)
 
         return item
+
+
+class ArrayFunctor(object):
+    """
+    Creates a callable object from a dense array, indexed by a label on its first axis followed by
+    indices on the other axes.
+
+    This has the same signature as :py:class:`Functor` over a dictionary of arrays, but returns views
+    on the array: no copy or conversion is performed on each call. The indices may be slices, which gives
+    for instance a whole range of frames at once.
+
+    :param data: the array, of shape ``(len(labels), ...)``
+    :param labels: the labels of the first axis of ``data``
+
+    .. note::
+
+       The returned arrays are views on ``data``, and should not be modified.
+    """
+
+    def __init__(self, data, labels):
+        self.data = np.asarray(data)
+        self.labels = list(labels)
+        self._label_indices = dict((label, index) for index, label in enumerate(self.labels))
+
+        if len(self.labels) != self.data.shape[0]:
+            raise RuntimeError("The number of labels (%d) does not match the first dimension of the data %r" %
+                               (len(self.labels), self.data.shape))
+
+    def __call__(self, label, *indices):
+        """Returns the view ``data[index_of(label), indices...]``.
+
+        :param label: the label on the first axis
+        :param indices: the indices (or slices) on the next axes
+        """
+        return self.data[(self._label_indices[label],) + indices]
+
+    def get_range(self, label, start, stop):
+        """Returns the view on the entries ``start`` to ``stop`` (excluded) of the second axis, for ``label``"""
+        return self.data[self._label_indices[label], start:stop]
@@ -3,8 +3,20 @@ Histograms
 ==========
 
 This module contains utilities for histograms
+
+.. autosummary::
+
+  get_histogram_min_max_with_percentile
+  get_histogram_stretching_lut
+  HistogramStretching
+  compare_consecutive_histograms
+
 '''
+import math
+from collections import OrderedDict
+
 import cv2
+import numpy as np
 
 
 def get_histogram_min_max_with_percentile(hist,
@@ -41,3 +53,134 @@ def get_histogram_min_max_with_percentile(hist,
         t_max -= 1
 
     return t_min, t_max
+
+
+def get_histogram_stretching_lut(min_val, max_val):
+    """Returns the lookup table (256 ``uint8`` values) stretching the range ``[min_val, max_val]``
+    to ``[0, 255]``.
+
+    The values are computed in single precision, as for a direct computation on ``float32`` images.
+    """
+    values = np.arange(256, dtype=np.float32)
+    stretched = np.maximum(values - min_val, 0) * (255.0 / (max_val - min_val))
+    return np.minimum(stretched, 255.0).astype(np.uint8)
+
+
+class HistogramStretching(object):
+    """Callable object stretching the histogram of ``uint8`` images with lookup tables.
+
+    The lookup tables are kept for the most recently used boundaries, the boundaries being quantized
+    by steps of ``quantization`` gray levels. A quantization error ``e`` of the boundaries changes the stretched
+    values by up to ``255 * e / (max_val - min_val)`` gray levels: the boundaries closer than
+    ``255 * quantization`` are hence quantized by a smaller step (see :py:func:`get_quantization_step`). The
+    results differ from the stretching with the exact boundaries by at most one gray level.
+
+    :param float quantization: the quantization step of the boundaries
+    :param int max_tables: the maximum number of lookup tables kept
+    :param bool reuse_output: if ``True``, the output image is written in the same buffer on each call,
+      and is valid until the next call only.
+    """
+
+    def __init__(self, quantization=0.01, max_tables=256, reuse_output=False):
+        self.quantization = quantization
+        self.max_tables = max_tables
+        self.reuse_output = reuse_output
+
+        self.tables = OrderedDict()
+        self.output = None
+
+    def get_quantization_step(self, min_val, max_val):
+        """Returns the quantization step of the boundaries ``[min_val, max_val]``: ``quantization``, or the
+        largest power of two smaller than ``(max_val - min_val) / 255`` for the boundaries closer than
+        ``255 * quantization``."""
+        width = max_val - min_val
+        if width <= 0 or width >= 255 * self.quantization:
+            return self.quantization
+
+        return 2. ** math.floor(math.log(width / 255., 2))
+
+    def get_lut(self, min_val, max_val):
+        """Returns the lookup table for the boundaries ``[min_val, max_val]``."""
+        step = self.get_quantization_step(min_val, max_val)
+        key = (step, int(round(min_val / step)), int(round(max_val / step)))
+
+        lut = self.tables.pop(key, None)
+        if lut is None:
+            lut = get_histogram_stretching_lut(key[1] * step, key[2] * step)
+            if len(self.tables) >= self.max_tables:
+                # removes the least recently used
+                self.tables.popitem(last=False)
+
+        self.tables[key] = lut
+        return lut
+
+    def __call__(self, image, min_val, max_val):
+        """Stretches the histogram of ``image`` from ``[min_val, max_val]`` to ``[0, 255]``."""
+        lut = self.get_lut(min_val, max_val)
+
+        if not self.reuse_output:
+            return cv2.LUT(image, lut)
+
+        if self.output is None or self.output.shape != image.shape:
+            self.output = np.empty(image.shape, dtype=np.uint8)
+
+        return cv2.LUT(image, lut, dst=self.output)
+
+
+def _compare_correlation(h1, h2):
+    h1 = h1 - h1.mean(axis=-1)[..., np.newaxis]
+    h2 = h2 - h2.mean(axis=-1)[..., np.newaxis]
+    s12 = (h1 * h2).sum(axis=-1)
+    s1122 = (h1 * h1).sum(axis=-1) * (h2 * h2).sum(axis=-1)
+
+    # constant histograms are considered correlated, as in OpenCV
+    valid = np.abs(s1122) > np.finfo(np.float64).eps
+    return np.where(valid, s12 / np.sqrt(np.where(valid, s1122, 1)), 1.)
+
+
+def _compare_chi_square(h1, h2):
+    valid = np.abs(h1) > np.finfo(np.float64).eps
+    return np.where(valid, (h1 - h2) ** 2 / np.where(valid, h1, 1), 0).sum(axis=-1)
+
+
+def _compare_intersection(h1, h2):
+    return np.minimum(h1, h2).sum(axis=-1)
+
+
+def _compare_bhattacharyya(h1, h2):
+    s = np.sqrt(h1 * h2).sum(axis=-1)
+    s12 = h1.sum(axis=-1) * h2.sum(axis=-1)
+
+    valid = np.abs(s12) > np.finfo(np.float32).eps
+    scale = np.where(valid, 1. / np.sqrt(np.where(valid, s12, 1)), 1.)
+    return np.sqrt(np.maximum(1. - s * scale, 0))
+
+
+_histogram_comparisons = {'correl': _compare_correlation,
+                          'chisqr': _compare_chi_square,
+                          'intersect': _compare_intersection,
+                          'bhattacharyya': _compare_bhattacharyya}
+
+#: The methods of :py:func:`compare_consecutive_histograms`, equivalent to the ``HISTCMP_CORREL``,
+#: ``HISTCMP_CHISQR``, ``HISTCMP_INTERSECT`` and ``HISTCMP_BHATTACHARYYA`` methods of :py:func:`cv2.compareHist`
+histogram_comparison_methods = sorted(_histogram_comparisons.keys())
+
+
+def compare_consecutive_histograms(histograms, method='correl'):
+    """Compares each histogram to the previous one, for all the histograms at once.
+
+    The comparisons are computed in double precision with the formulas of :py:func:`cv2.compareHist`, the
+    histogram of a row being the first argument and the one of the previous row the second.
+
+    :param histograms: an array of shape ``(..., nb_rows, nb_bins)``, eg. the histograms of the frames for
+      several areas
+    :param str method: one of :py:data:`histogram_comparison_methods`
+    :returns: an array of shape ``(..., nb_rows - 1)``, the element ``i`` being the comparison of the
+      rows ``i + 1`` and ``i``
+    """
+    if method not in _histogram_comparisons:
+        raise RuntimeError('Unknown histogram comparison method %s (should be one of %s)' %
+                           (method, ', '.join(histogram_comparison_methods)))
+
+    histograms = np.asarray(histograms, dtype=np.float64)
+    return _histogram_comparisons[method](histograms[..., 1:, :], histograms[..., :-1, :])
@@ -0,0 +1,136 @@
+"""
+Parallel
+========
+
+This module provides the pool of worker processes that Jobs may use for parallelizing their computations
+(eg. the analysis of the frames by :py:class:`FrameAnalysisJob
+<livius.video.processing.jobs.frame_analysis.FrameAnalysisJob>`).
+
+The number of workers is given by the runtime option ``nb_processes`` (eg. ``--option nb_processes=32``) and
+defaults to the number of CPUs. The pools are always closed and joined, which avoids leaving worker processes
+behind when several videos are processed in the same session.
+
+It also provides limits on the number of processes using a resource concurrently (eg. the video encoding when
+several videos are processed in parallel, see :py:func:`limited_resource`).
+
+.. autosummary::
+
+  get_nb_workers
+  get_chunk_size
+  process_pool
+  parallel_map
+  create_resource_limit
+  set_resource_limits
+  limited_resource
+
+"""
+
+import math
+import logging
+from contextlib import contextmanager
+from multiprocessing import Pool, BoundedSemaphore, cpu_count
+
+logger = logging.getLogger()
+
+# semaphores limiting the concurrent use of the resources, indexed by the name of the resource
+_resource_limits = {}
+
+
+def get_nb_workers(nb_workers=None):
+    """Returns the number of workers to use: ``nb_workers`` if set (and strictly positive), the number of CPUs
+    otherwise.
+
+    :param nb_workers: the requested number of workers, possibly given as a string (runtime option).
+    """
+    if nb_workers is not None and int(nb_workers) > 0:
+        return int(nb_workers)
+
+    return cpu_count()
+
+
+def get_chunk_size(nb_items, nb_workers, nb_chunks_per_worker=4):
+    """Returns the number of items sent at once to each worker.
+
+    Each worker receives about ``nb_chunks_per_worker`` chunks, which balances the load between the workers
+    while keeping the communication overhead low.
+    """
+    return max(1, int(math.ceil(float(nb_items) / (nb_workers * nb_chunks_per_worker))))
+
+
+@contextmanager
+def process_pool(nb_workers=None, **kwargs):
+    """Context manager providing a :py:class:`multiprocessing.Pool` of ``nb_workers`` processes
+    (see :py:func:`get_nb_workers`). The additional arguments are passed to the pool.
+
+    On exit, the pool is closed and its workers are joined. If an exception occurred, the pending tasks
+    are cancelled.
+    """
+    pool = Pool(processes=get_nb_workers(nb_workers), **kwargs)
+    try:
+        yield pool
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def parallel_map(function, items, nb_workers=None, chunk_size=None, pool=None):
+    """Applies ``function`` to each element of ``items`` in a pool of processes and returns the list of results.
+
+    :param function: a picklable function (defined at the module level)
+    :param items: the elements to process
+    :param nb_workers: the number of processes (see :py:func:`get_nb_workers`)
+    :param chunk_size: the number of elements sent at once to each process. Defaults to :py:func:`get_chunk_size`.
+    :param pool: the pool (see :py:func:`process_pool`) of ``nb_workers`` processes on which the elements are
+      processed, for reusing the same pool for several calls. Defaults to a new pool, closed on return.
+    """
+    items = list(items)
+    nb_workers = get_nb_workers(nb_workers)
+
+    if chunk_size is None:
+        chunk_size = get_chunk_size(len(items), nb_workers)
+
+    logger.debug('[PARALLEL] processing %d elements with %d processes (chunks of %d)', len(items), nb_workers, chunk_size)
+
+    if pool is not None:
+        return pool.map(function, items, chunksize=chunk_size)
+
+    with process_pool(nb_workers) as pool:
+        return pool.map(function, items, chunksize=chunk_size)
+
+
+def create_resource_limit(nb_concurrent_uses):
+    """Returns a limit allowing ``nb_concurrent_uses`` processes to use a resource at the same time.
+
+    The limits should be created before the processes using them, and given to :py:func:`set_resource_limits`
+    in each process (eg. by the initializer of a pool).
+    """
+    return BoundedSemaphore(max(1, int(nb_concurrent_uses)))
+
+
+def set_resource_limits(limits):
+    """Sets the limits (created by :py:func:`create_resource_limit`) of the current process.
+
+    :param dict limits: the limits indexed by the name of the resources.
+    """
+    _resource_limits.update(limits)
+
+
+@contextmanager
+def limited_resource(name):
+    """Context manager waiting for the resource ``name`` to be available, and holding it until exit.
+
+    If no limit was set for this resource, the resource is always available.
+    """
+    semaphore = _resource_limits.get(name, None)
+    if semaphore is None:
+        yield
+        return
+
+    logger.debug('[PARALLEL] waiting for the resource %s', name)
+    with semaphore:
+        logger.debug('[PARALLEL] acquired the resource %s', name)
+        yield
@@ -48,7 +48,9 @@ def createFinalVideo(slide_clip,
                      codecFormat='libx264',
                      container='.mp4',
                      flagWrite=True,
-                     is_test=False):
+                     is_test=False,
+                     nb_render_processes=1,
+                     encoding=None):
 
     """
     This function serves to form the video layout, create the final video and write it.
@@ -88,6 +90,12 @@ def createFinalVideo(slide_clip,
     :param str container: the video file format (container) including all streams.
     :param bool is_test: if set to ``True``, only 10 seconds of the video are processed
     :param bool flagWrite: A flag to set whether write the new video or not
+    :param int nb_render_processes: number of processes rendering the video. If greater than 1, the video
+      is rendered by time chunks that are concatenated afterwards (see
+      :py:func:`write_video_in_chunks <livius.video.editing.rendering.write_video_in_chunks>`).
+    :param dict encoding: the settings of the encoder, as returned by :py:func:`get_encoding_settings
+      <livius.video.editing.rendering.get_encoding_settings>`. If given, ``fps`` and ``codecFormat`` are
+      taken from those settings. Defaults to the ``'default'`` profile with ``fps`` and ``codecFormat``.
 
     .. rubric:: Images
 
@@ -122,6 +130,10 @@ def createFinalVideo(slide_clip,
     If ``audio_clip`` is the name of an audio_clip file, this audio_clip file
     will be incorporated as a soundtrack in the movie.
 
+    If the audio clip has an attribute ``ffmpeg_audio_filter`` (eg. the mixing of the channels by
+    :py:class:`AudioMixerJob <livius.video.processing.jobs.audio_mixer.AudioMixerJob>`), this ffmpeg
+    filter is applied to the audio stream when it is encoded.
+
     Possible audio_clip codecs are:
 
     * ``'libmp3lame'``: for '.mp3'
@@ -426,13 +438,35 @@ def createFinalVideo(slide_clip,
     outputVideo = concatenate([first_segment_clip, second_segment_overlay_clip, third_segment_clip])
 
     if flagWrite:
-        kw_additional_args = {}
+        from .rendering import get_encoding_settings, get_write_arguments, write_videofile, write_video_in_chunks
+
+        if encoding is None:
+            encoding = get_encoding_settings(overrides={'fps': fps, 'codec': codecFormat})
+
+        kw_additional_args = get_write_arguments(encoding)
+        fps = kw_additional_args.pop('fps')
         if is_test:
             kw_additional_args['threads'] = 4
             kw_additional_args['preset'] = 'ultrafast'
-        outputVideo.write_videofile(output_file_name + container,
-                                    fps,
-                                    codec=codecFormat,
-                                    **kw_additional_args)
+
+        if getattr(audio_clip, 'ffmpeg_audio_filter', None) is not None:
+            kw_additional_args['audio_filter'] = audio_clip.ffmpeg_audio_filter
+
+        if nb_render_processes > 1:
+            # the chunks do not overlap the introduction, talk and credits
+            section_boundaries = [first_segment_clip.duration,
+                                  first_segment_clip.duration + second_segment_overlay_clip.duration]
+            write_video_in_chunks(outputVideo,
+                                  output_file_name + container,
+                                  fps,
+                                  nb_processes=nb_render_processes,
+                                  section_boundaries=section_boundaries,
+                                  keyframe_interval=encoding['gop'],
+                                  **kw_additional_args)
+        else:
+            write_videofile(outputVideo,
+                            output_file_name + container,
+                            fps,
+                            **kw_additional_args)
 
     return outputVideo
@@ -0,0 +1,362 @@
+"""
+Rendering
+=========
+
+This module implements the rendering of a video in several processes: the video is split in time chunks that
+are rendered concurrently, and the chunks are then concatenated without reencoding with the concat demuxer
+of ffmpeg. The audio is written once, while the chunks are being rendered, and muxed with the concatenated
+video.
+
+The chunks are aligned to the frames and to the boundaries of the sections of the video (eg. the introduction,
+the talk and the credits), so that each section is split in chunks of about equal durations. Within a section,
+the chunks are aligned to the key frames of the encoder, and are not shorter than :py:data:`min_chunk_duration`.
+
+It also defines the settings of the encoder, given by named profiles (see :py:data:`encoding_profiles`) that
+may be refined by individual settings (see :py:func:`get_encoding_settings`).
+
+.. note::
+
+   The worker processes are forked from the calling process, and inherit the clips. The video readers of the
+   clips should hence be reopened in each process (see
+   :py:class:`SourceVideoClipJob <livius.video.processing.jobs.dummy_clip.SourceVideoClipJob>`).
+
+.. autosummary::
+
+  encoding_profiles
+  get_encoding_settings
+  get_write_arguments
+  write_videofile
+  min_chunk_duration
+  get_chunk_boundaries
+  concatenate_video_files
+  write_video_in_chunks
+
+"""
+
+import os
+import glob
+import shutil
+import tempfile
+import logging
+import multiprocessing
+
+from ...util.parallel import process_pool
+from ...util.ffmpeg_runner import run_ffmpeg, ProgressLogger
+
+logger = logging.getLogger()
+
+# the chunks being rendered, inherited by the forked worker processes (avoids pickling the clips)
+_render_tasks = []
+
+#: Minimal duration in seconds of the chunks rendered by :py:func:`write_video_in_chunks` (the rendering of
+#: each chunk has a fixed cost, and the encoder restarts a group of pictures at each chunk)
+min_chunk_duration = 10.
+
+#: The profiles of the encoder. Each profile contains the following settings, ``None`` leaving the
+#: default of the encoder:
+#:
+#: * ``fps`` the number of frames per second of the output video
+#: * ``codec`` the video codec
+#: * ``preset`` the preset of the encoder, trading the encoding speed for the compression
+#: * ``crf`` the constant rate factor (quality) of the encoder
+#: * ``gop`` the maximal number of frames between two key frames
+#: * ``threads`` the number of threads of the encoder (0 for automatic)
+#: * ``video_bitrate`` the target bitrate of the video (eg. ``'2000k'``), required by the two pass encoding
+#: * ``audio_bitrate`` the bitrate of the audio (eg. ``'128k'``)
+#: * ``two_pass`` if ``True``, the video is encoded in two passes
+#:
+#: The ``default`` profile corresponds to the default settings of MoviePy.
+encoding_profiles = {
+    'default': {'fps': 30, 'codec': 'libx264', 'preset': None, 'crf': None, 'gop': None, 'threads': None,
+                'video_bitrate': None, 'audio_bitrate': None, 'two_pass': False},
+    'archive': {'fps': 30, 'codec': 'libx264', 'preset': 'slow', 'crf': 18, 'gop': 300, 'threads': 0,
+                'video_bitrate': None, 'audio_bitrate': '192k', 'two_pass': False},
+    'web-fast': {'fps': 30, 'codec': 'libx264', 'preset': 'veryfast', 'crf': 23, 'gop': 60, 'threads': 0,
+                 'video_bitrate': None, 'audio_bitrate': '128k', 'two_pass': False},
+    'preview': {'fps': 30, 'codec': 'libx264', 'preset': 'ultrafast', 'crf': 30, 'gop': 30, 'threads': 4,
+                'video_bitrate': None, 'audio_bitrate': '96k', 'two_pass': False},
+}
+
+
+def _to_bool(value):
+    if isinstance(value, basestring):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+# conversions of the settings given as strings (runtime options)
+_encoding_settings_types = {'fps': float,
+                            'codec': unicode,
+                            'preset': unicode,
+                            'crf': int,
+                            'gop': int,
+                            'threads': int,
+                            'video_bitrate': unicode,
+                            'audio_bitrate': unicode,
+                            'two_pass': _to_bool}
+
+
+def get_encoding_settings(profile='default', overrides=None):
+    """Returns the settings of the encoder for the profile ``profile`` (see :py:data:`encoding_profiles`),
+    updated with ``overrides``.
+
+    :param str profile: the name of the profile
+    :param dict overrides: settings replacing the ones of the profile. The values may be given as
+      strings (eg. from the runtime options), the strings ``'none'`` and ``''`` standing for ``None``.
+    """
+    if profile not in encoding_profiles:
+        raise RuntimeError('Unknown encoding profile %s (should be one of %s)' % (profile, ', '.join(sorted(encoding_profiles))))
+
+    settings = dict(encoding_profiles[profile])
+    for key, value in (overrides or {}).items():
+        if key not in _encoding_settings_types:
+            raise RuntimeError('Unknown encoding setting %s' % key)
+
+        if value is None or (isinstance(value, basestring) and value.lower() in ('', 'none')):
+            settings[key] = None
+        else:
+            settings[key] = _encoding_settings_types[key](value)
+
+    if settings['two_pass'] and settings['video_bitrate'] is None:
+        raise RuntimeError('The two pass encoding requires a video bitrate')
+
+    return settings
+
+
+def get_write_arguments(settings):
+    """Returns the arguments of :py:func:`write_videofile` (except the clip and the file) for the encoding
+    ``settings`` (see :py:func:`get_encoding_settings`)."""
+    kwargs = {'fps': settings['fps'],
+              'codec': settings['codec'],
+              'two_pass': settings['two_pass']}
+
+    for setting, argument in [('preset', 'preset'),
+                              ('threads', 'threads'),
+                              ('video_bitrate', 'bitrate'),
+                              ('audio_bitrate', 'audio_bitrate')]:
+        if settings[setting] is not None:
+            kwargs[argument] = settings[setting]
+
+    ffmpeg_params = []
+    if settings['crf'] is not None and settings['video_bitrate'] is None:
+        ffmpeg_params += ['-crf', str(settings['crf'])]
+    if settings['gop'] is not None:
+        ffmpeg_params += ['-g', str(settings['gop'])]
+    if ffmpeg_params:
+        kwargs['ffmpeg_params'] = ffmpeg_params
+
+    return kwargs
+
+
+def _get_audio_file(base_name, audio_codec):
+    return base_name + ('.mp3' if audio_codec == 'libmp3lame' else '.m4a')
+
+
+def _write_audiofile(audio_clip, audio_file, audio_codec, audio_bitrate, audio_filter=None):
+    audio_clip.write_audiofile(audio_file, fps=44100, codec=audio_codec, bitrate=audio_bitrate,
+                               ffmpeg_params=['-af', audio_filter] if audio_filter is not None else None)
+
+
+def write_videofile(clip, output_file, fps, two_pass=False, audio_filter=None, **kwargs):
+    """Writes the video clip ``clip`` to ``output_file``, in one or two passes.
+
+    :param clip: the moviepy clip to write
+    :param str output_file: the output file
+    :param fps: the number of frames per second
+    :param bool two_pass: if ``True``, the video is first encoded for collecting the statistics of the encoder,
+      and then encoded using those statistics. The frames are hence computed twice.
+    :param str audio_filter: the ffmpeg filter applied to the audio of the clip by the encoder of the audio
+      stream (eg. the mixing of the channels given by :py:func:`get_pan_filter
+      <livius.video.processing.jobs.audio_mixer.get_pan_filter>`). The encoded stream is then muxed as is.
+    :param kwargs: additional arguments given to the ``write_videofile`` method of the clip
+    """
+    audio_file = None
+    if audio_filter is not None and clip.audio is not None and kwargs.get('audio', True) is True:
+        audio_codec = kwargs.get('audio_codec') or 'libmp3lame'
+        audio_file = _get_audio_file(os.path.splitext(output_file)[0] + '_audio', audio_codec)
+        _write_audiofile(clip.audio, audio_file, audio_codec, kwargs.get('audio_bitrate'), audio_filter)
+        kwargs['audio'] = audio_file
+
+    try:
+        _write_videofile(clip, output_file, fps, two_pass, **kwargs)
+    finally:
+        if audio_file is not None and os.path.exists(audio_file):
+            os.remove(audio_file)
+
+
+def _write_videofile(clip, output_file, fps, two_pass, **kwargs):
+    if not two_pass:
+        clip.write_videofile(output_file, fps, **kwargs)
+        return
+
+    passlogfile = output_file + '.passlog'
+    first_pass_file = os.path.splitext(output_file)[0] + '.pass1' + os.path.splitext(output_file)[1]
+    ffmpeg_params = kwargs.pop('ffmpeg_params', None) or []
+
+    try:
+        first_pass_kwargs = dict(kwargs, audio=False)
+        clip.write_videofile(first_pass_file, fps,
+                             ffmpeg_params=ffmpeg_params + ['-pass', '1', '-passlogfile', passlogfile],
+                             **first_pass_kwargs)
+
+        clip.write_videofile(output_file, fps,
+                             ffmpeg_params=ffmpeg_params + ['-pass', '2', '-passlogfile', passlogfile],
+                             **kwargs)
+    finally:
+        for f in [first_pass_file] + glob.glob(passlogfile + '*'):
+            if os.path.exists(f):
+                os.remove(f)
+
+
+def get_chunk_boundaries(duration, fps, nb_chunks, section_boundaries=None, keyframe_interval=None,
+                         min_chunk_duration=None):
+    """Returns the boundaries ``[0, t_1, ..., duration]`` of the time chunks of a video.
+
+    Each section (delimited by ``section_boundaries``) is split in chunks of about equal durations, the number of
+    chunks of each section being proportional to its duration. Each section has at least one chunk, and the
+    boundaries are rounded to the frames.
+
+    :param float duration: the duration of the video
+    :param fps: the number of frames per second
+    :param int nb_chunks: the maximal number of chunks
+    :param list section_boundaries: the times separating the sections of the video.
+    :param int keyframe_interval: the number of frames between two key frames (the ``gop`` setting of the
+      encoder). If given, the chunks start at a multiple of this interval from the beginning of their section,
+      so that the groups of pictures of the concatenated section are as regular as in a single encoding.
+    :param float min_chunk_duration: if given, the sections are not split in chunks shorter than this duration,
+      which may lead to fewer chunks than ``nb_chunks``.
+    """
+    def round_to_frame(t):
+        return round(t * fps) / float(fps)
+
+    sections_times = [0] + sorted(round_to_frame(t) for t in (section_boundaries or []) if 0 < t < duration) + [duration]
+    sections = [(t0, t1) for t0, t1 in zip(sections_times[:-1], sections_times[1:]) if t1 > t0]
+
+    # each new chunk goes to the section with the longest chunks
+    nb_chunks_per_section = [1] * len(sections)
+    for _ in range(nb_chunks - len(sections)):
+        longest = max(range(len(sections)),
+                      key=lambda i: float(sections[i][1] - sections[i][0]) / nb_chunks_per_section[i])
+
+        t0, t1 = sections[longest]
+        if min_chunk_duration is not None and float(t1 - t0) / (nb_chunks_per_section[longest] + 1) < min_chunk_duration:
+            break
+        nb_chunks_per_section[longest] += 1
+
+    keyframe_duration = float(keyframe_interval) / fps if keyframe_interval else None
+
+    boundaries = [0]
+    for (t0, t1), nb_section_chunks in zip(sections, nb_chunks_per_section):
+        for index in range(1, nb_section_chunks):
+            t = t0 + (t1 - t0) * index / float(nb_section_chunks)
+            if keyframe_duration is not None:
+                t = t0 + round((t - t0) / keyframe_duration) * keyframe_duration
+            t = round_to_frame(t)
+            if boundaries[-1] < t < t1:
+                boundaries.append(t)
+        boundaries.append(t1)
+
+    return boundaries
+
+
+def concatenate_video_files(video_files, output_file, audio_file=None, duration=None, timeout=None):
+    """Concatenates the video streams of ``video_files`` into ``output_file`` without reencoding.
+
+    The video files should have been encoded with the same parameters.
+
+    :param list video_files: the files to concatenate, in order
+    :param str output_file: the output file
+    :param str audio_file: if given, a file containing the audio stream of the output file
+    :param float duration: the duration of the output in seconds, for estimating the remaining time
+    :param float timeout: the maximal duration of the concatenation in seconds
+    :raises RuntimeError: if ffmpeg fails or does not complete before the timeout
+    """
+    list_file = output_file + '.concat.txt'
+    with open(list_file, 'w') as f:
+        for video_file in video_files:
+            f.write("file '%s'\n" % os.path.abspath(video_file).replace("'", "'\\''"))
+
+    args = ['ffmpeg', '-y', '-v', 'error',
+            '-f', 'concat', '-safe', '0', '-i', list_file]
+    if audio_file is not None:
+        args += ['-i', audio_file, '-map', '0:v', '-map', '1:a']
+    args += ['-c', 'copy', output_file]
+
+    description = 'concatenation of the chunks into %s' % os.path.basename(output_file)
+    try:
+        run_ffmpeg(args,
+                   progress_callback=ProgressLogger(description),
+                   duration=duration,
+                   timeout=timeout,
+                   description=description)
+    finally:
+        os.remove(list_file)
+
+
+def _render_chunk(task_index):
+    clip, chunk_file, fps, kwargs = _render_tasks[task_index]
+
+    logger.info('[RENDER] rendering chunk %s', os.path.basename(chunk_file))
+    write_videofile(clip, chunk_file, fps, audio=False, **kwargs)
+    return chunk_file
+
+
+def write_video_in_chunks(clip, output_file, fps, nb_processes, section_boundaries=None, keyframe_interval=None,
+                          audio_codec='libmp3lame', audio_bitrate=None, audio_filter=None, **kwargs):
+    """Writes the video clip ``clip`` to ``output_file`` with ``nb_processes`` processes.
+
+    :param clip: the moviepy clip to write
+    :param str output_file: the output file
+    :param fps: the number of frames per second
+    :param int nb_processes: the number of processes rendering the chunks
+    :param list section_boundaries: the times separating the sections of the video
+      (see :py:func:`get_chunk_boundaries`)
+    :param int keyframe_interval: the number of frames between two key frames of the encoder, to which the
+      chunks are aligned. The chunks are not shorter than :py:data:`min_chunk_duration`.
+    :param str audio_codec: the codec of the audio stream
+    :param str audio_bitrate: the bitrate of the audio stream
+    :param str audio_filter: the ffmpeg filter applied to the audio by its encoder (see :py:func:`write_videofile`)
+    :param kwargs: additional arguments given to :py:func:`write_videofile` for each chunk (eg. the codec)
+
+    .. note::
+
+       As daemonic processes cannot have children, the video is rendered by the calling process if this
+       one is a worker of a pool (eg. when several videos are processed in parallel).
+    """
+    if multiprocessing.current_process().daemon:
+        logger.warning('[RENDER] cannot start the rendering processes from a worker process, rendering in one process')
+        write_videofile(clip, output_file, fps, audio_codec=audio_codec, audio_bitrate=audio_bitrate,
+                        audio_filter=audio_filter, **kwargs)
+        return
+
+    boundaries = get_chunk_boundaries(clip.duration, fps, nb_processes, section_boundaries,
+                                      keyframe_interval=keyframe_interval,
+                                      min_chunk_duration=min_chunk_duration)
+    chunks_folder = tempfile.mkdtemp(prefix='chunks_', dir=os.path.dirname(os.path.abspath(output_file)))
+    extension = os.path.splitext(output_file)[1]
+
+    try:
+        chunk_files = []
+        for index, (t0, t1) in enumerate(zip(boundaries[:-1], boundaries[1:])):
+            chunk_file = os.path.join(chunks_folder, 'chunk_%05d%s' % (index, extension))
+            _render_tasks.append((clip.subclip(t0, t1), chunk_file, fps, kwargs))
+            chunk_files.append(chunk_file)
+
+        logger.info('[RENDER] rendering %d chunks with %d processes', len(chunk_files), nb_processes)
+
+        with process_pool(nb_processes, maxtasksperchild=1) as pool:
+            result = pool.map_async(_render_chunk, range(len(_render_tasks)), chunksize=1)
+
+            # the audio is written while the chunks are being rendered
+            audio_file = None
+            if clip.audio is not None:
+                audio_file = _get_audio_file(os.path.join(chunks_folder, 'audio'), audio_codec)
+                _write_audiofile(clip.audio, audio_file, audio_codec, audio_bitrate, audio_filter)
+
+            result.get()
+
+        concatenate_video_files(chunk_files, output_file, audio_file, duration=clip.duration)
+
+    finally:
+        del _render_tasks[:]
+        shutil.rmtree(chunks_folder)
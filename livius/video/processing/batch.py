@@ -0,0 +1,140 @@
+"""
+Batch processing
+================
+
+This module provides the processing of several videos by the same workflow, as performed from the command line
+(see ``python -m livius --help``).
+
+With :py:func:`process_videos_parallel`, several videos are processed concurrently, each video in its own
+worker process. The workflows are built by modifying the static ``parents`` of the Job classes: each worker
+process is forked from the calling process and processes only one video, which isolates the workflows of the
+different videos.
+
+.. note::
+
+   The interactive Jobs (for instance the slide and speaker selections) cannot interact with the user
+   from the worker processes: the selections should be performed beforehand, eg. by a sequential processing with
+   the ``workflow_slide_detection_window`` workflow.
+
+.. autosummary::
+
+  get_video_parameters
+  process_videos_parallel
+
+"""
+
+import os
+import logging
+import traceback
+
+from ...util.parallel import process_pool, set_resource_limits
+
+logger = logging.getLogger()
+
+# the tasks of the current batch, inherited by the forked worker processes (avoids pickling the workflows)
+_tasks = []
+
+
+def get_video_parameters(video_file, options, output_folder, thumbnails_folder, is_visual_test=False):
+    """Returns the runtime parameters of the processing of one video, and creates the output folders.
+
+    :param str video_file: the video file to process
+    :param dict options: the additional runtime options
+    :param str output_folder: the root of the output folders, one folder being created per video
+    :param str thumbnails_folder: the root of the thumbnails folders, one folder being created per video
+    :param bool is_visual_test: see :py:class:`ClipsToMovie <livius.video.processing.jobs.create_movie.ClipsToMovie>`
+    """
+    video_base_name = os.path.splitext(os.path.basename(video_file))[0]
+    output_location = os.path.join(output_folder, video_base_name)
+    if not os.path.exists(output_location):
+        os.makedirs(output_location)
+
+    thumbnails_root = os.path.join(thumbnails_folder, video_base_name)
+    if not os.path.exists(thumbnails_root):
+        os.makedirs(thumbnails_root)
+
+    params = options.copy()
+
+    # those important parameter should not be overriden
+    params.update({'video_filename': os.path.basename(video_file),
+                   'video_location': os.path.dirname(video_file),
+                   'thumbnails_root': thumbnails_root,
+                   'json_prefix': os.path.join(output_location, video_base_name),
+                   'is_visual_test': is_visual_test
+                   })
+
+    return params
+
+
+def _set_log_prefix(prefix):
+    """Prefixes the log messages of the current process with ``prefix``."""
+    prefix = prefix.replace('%', '%%')
+    for handler in logging.getLogger().handlers:
+        log_format = handler.formatter._fmt if handler.formatter is not None else '%(message)s'
+        handler.setFormatter(logging.Formatter(log_format.replace('%(message)s', '[%s] %%(message)s' % prefix)))
+
+
+def _initialize_worker(resource_limits):
+    set_resource_limits(resource_limits)
+
+
+def _process_video_in_worker(task_index):
+    """Processes the video of the task ``task_index`` and returns a tuple ``(video_file, error)``, ``error``
+    being ``None`` on success."""
+    process_function, workflow_instance, video_file, params = _tasks[task_index]
+
+    _set_log_prefix(os.path.splitext(os.path.basename(video_file))[0])
+    logger.info('[BATCH] processing %s', video_file)
+
+    try:
+        process_function(workflow_instance, **params)
+    except Exception:
+        error = traceback.format_exc()
+        logger.error('[BATCH] processing of %s failed:\n%s', video_file, error)
+        return video_file, error
+
+    logger.info('[BATCH] processing of %s done', video_file)
+    return video_file, None
+
+
+def process_videos_parallel(workflow_instance, videos_and_parameters, nb_jobs, resource_limits=None,
+                            process_function=None):
+    """Processes several videos concurrently, one worker process per video.
+
+    The failure of the processing of one video does not interrupt the processing of the other videos.
+
+    :param workflow_instance: the workflow (final Job class) used for processing all the videos
+    :param videos_and_parameters: list of tuples ``(video_file, runtime_parameters)`` (see
+      :py:func:`get_video_parameters`)
+    :param int nb_jobs: the number of videos processed concurrently
+    :param dict resource_limits: limits of the resources shared by the workers, indexed by resource name
+      (see :py:func:`limited_resource <livius.util.parallel.limited_resource>`)
+    :param process_function: the function processing the workflow on one video. Defaults to
+      :py:func:`process <livius.video.processing.workflow.process>`.
+    :returns: a list of tuples ``(video_file, error)`` in the order of the videos, where ``error`` is ``None``
+      on success and the formatted exception otherwise.
+    """
+    if process_function is None:
+        from .workflow import process as process_function
+
+    _tasks[:] = [(process_function, workflow_instance, video_file, params)
+                 for video_file, params in videos_and_parameters]
+
+    logger.info('[BATCH] processing %d videos with %d concurrent jobs', len(_tasks), nb_jobs)
+
+    try:
+        # one process per video
+        with process_pool(nb_jobs,
+                          initializer=_initialize_worker,
+                          initargs=(resource_limits or {},),
+                          maxtasksperchild=1) as pool:
+            results = pool.map(_process_video_in_worker, range(len(_tasks)), chunksize=1)
+    finally:
+        del _tasks[:]
+
+    failures = [video_file for video_file, error in results if error is not None]
+    logger.info('[BATCH] %d videos processed, %d failed', len(results), len(failures))
+    for video_file in failures:
+        logger.error('[BATCH] failed: %s', video_file)
+
+    return results
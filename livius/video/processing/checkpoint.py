@@ -0,0 +1,153 @@
+"""
+Checkpoints
+===========
+
+This module provides the periodic checkpoints of the Jobs computing their outputs frame by frame. When
+the processing is interrupted (eg. killed by the system or preempted), the next run of the Job restarts
+from the last checkpoint instead of the first frame.
+
+The checkpoint is stored next to the state of the Job, and contains the :py:func:`state key
+<livius.video.processing.job.Job.get_state_key>` of the Job: a checkpoint made with other parameters or other
+inputs is discarded. The checkpoint is removed once the Job completes.
+
+Each checkpoint stores only the values of the frames processed since the previous one, in a block file of its
+own (with the arrays in sidecar files, see :py:class:`NumpySidecarStateStorage
+<livius.video.processing.state_storage.NumpySidecarStateStorage>`), and the checkpoint file lists the blocks
+written so far. The blocks are joined back when resuming. The cost of a checkpoint is hence proportional
+to the interval, and not to the number of frames already processed.
+
+The interval between two checkpoints is given by the runtime option ``checkpoint_interval`` (in frames, not
+cached), ``0`` disabling the checkpoints.
+
+.. autosummary::
+
+  FrameCheckpoint
+
+"""
+
+import os
+import glob
+import logging
+
+import numpy as np
+
+from .state_storage import JSONStateStorage, NumpySidecarStateStorage
+
+logger = logging.getLogger()
+
+#: Default number of frames between two checkpoints
+default_checkpoint_interval = 600
+
+
+def _join_blocks(blocks):
+    """Concatenates the values of consecutive blocks, having the same structure (dictionaries of arrays or
+    lists indexed by frame)"""
+    first = blocks[0]
+    if isinstance(first, dict):
+        return dict((key, _join_blocks([block[key] for block in blocks])) for key in first)
+
+    if isinstance(first, np.ndarray):
+        return np.concatenate(blocks)
+
+    return [value for block in blocks for value in block]
+
+
+class FrameCheckpoint(object):
+    """Periodic checkpoints of the outputs of a Job computed frame by frame.
+
+    :param job: the Job being run
+    :param interval: the number of frames between two checkpoints. ``0`` or ``None`` disables the checkpoints.
+    """
+
+    def __init__(self, job, interval):
+        self.interval = int(interval) if interval else 0
+        self.storage = None
+        self.state_key = None
+        self.nb_frames_saved = 0
+
+        #: The blocks stored so far, as a list of ``[start, stop, filename]`` (the filename being relative
+        #: to the checkpoint file)
+        self.blocks = []
+
+        if self.interval > 0 and job.json_filename is not None:
+            self.storage = JSONStateStorage(os.path.splitext(job.json_filename)[0] + '.checkpoint.json')
+            self.state_key = job.get_state_key()
+
+    @property
+    def enabled(self):
+        """``True`` if the checkpoints are enabled"""
+        return self.storage is not None
+
+    def _get_block_storage(self, filename):
+        return NumpySidecarStateStorage(os.path.join(os.path.dirname(self.storage.json_filename), filename))
+
+    def load(self):
+        """Returns a tuple ``(nb_frames, values)`` where ``values`` are the values stored by the last valid
+        checkpoint for the ``nb_frames`` first frames, or ``(0, None)`` if there is no such checkpoint."""
+        if not self.enabled or not self.storage.exists():
+            return 0, None
+
+        try:
+            checkpoint = self.storage.load()
+            nb_frames, blocks = int(checkpoint['nb_frames']), checkpoint['blocks']
+        except (ValueError, KeyError, IOError, TypeError):
+            logger.warning('[CHECKPOINT] cannot read the checkpoint %s, ignoring it', self.storage.json_filename)
+            return 0, None
+
+        if checkpoint.get('state_key', None) != self.state_key:
+            logger.info('[CHECKPOINT] the checkpoint %s was made with another configuration, ignoring it',
+                        self.storage.json_filename)
+            return 0, None
+
+        # the blocks cover the frames from the first one, without gaps
+        if not blocks or [start for start, _, _ in blocks] != [0] + [stop for _, stop, _ in blocks[:-1]] \
+           or blocks[-1][1] != nb_frames:
+            logger.warning('[CHECKPOINT] the blocks of the checkpoint %s are not contiguous, ignoring it',
+                           self.storage.json_filename)
+            return 0, None
+
+        try:
+            values = _join_blocks([self._get_block_storage(filename).load() for _, _, filename in blocks])
+        except (ValueError, KeyError, IOError, TypeError):
+            logger.warning('[CHECKPOINT] cannot read the blocks of the checkpoint %s, ignoring it',
+                           self.storage.json_filename)
+            return 0, None
+
+        logger.info('[CHECKPOINT] resuming from frame %d (%s)', nb_frames, self.storage.json_filename)
+        self.nb_frames_saved = nb_frames
+        self.blocks = blocks
+        return nb_frames, values
+
+    def update(self, nb_frames, get_values):
+        """Stores a checkpoint if at least ``interval`` frames were processed since the last one.
+
+        :param int nb_frames: the number of frames processed so far
+        :param get_values: a function returning the values to store for the frames processed since the
+          last checkpoint, called with the range ``start, stop`` of those frames. It is called only
+          when the checkpoint is stored.
+        """
+        if not self.enabled or nb_frames - self.nb_frames_saved < self.interval:
+            return
+
+        # the block is complete before being referenced by the checkpoint
+        block_filename = '%s.%d.json' % (os.path.splitext(os.path.basename(self.storage.json_filename))[0],
+                                         self.nb_frames_saved)
+        self._get_block_storage(block_filename).save(get_values(self.nb_frames_saved, nb_frames))
+        self.blocks.append([self.nb_frames_saved, nb_frames, block_filename])
+
+        temporary_filename = self.storage.json_filename + '.tmp'
+        JSONStateStorage(temporary_filename).save({'state_key': self.state_key,
+                                                   'nb_frames': nb_frames,
+                                                   'blocks': self.blocks})
+        os.rename(temporary_filename, self.storage.json_filename)
+
+        self.nb_frames_saved = nb_frames
+        logger.debug('[CHECKPOINT] %d frames stored in %s', nb_frames, self.storage.json_filename)
+
+    def remove(self):
+        """Removes the stored checkpoint, if any"""
+        if not self.enabled:
+            return
+
+        for filename in glob.glob(os.path.splitext(self.storage.json_filename)[0] + '.*'):
+            os.remove(filename)
@@ -0,0 +1,404 @@
+"""
+Frame sources
+=============
+
+This module provides the sources of frames (thumbnails) on which the per-frame analysis Jobs operate.
+
+A frame source is a sequence of BGR images (as read by OpenCV) with a fixed length. It can be iterated in order,
+which is the efficient way of accessing all the frames, and supports random access through
+:py:func:`get_frame <FFMpegFrameSource.get_frame>`.
+
+* :py:class:`ImageFilesFrameSource` reads the frames from image files (eg. the PNG thumbnails extracted by
+  :py:class:`FFMpegThumbnailsJob <livius.video.processing.jobs.ffmpeg_to_thumbnails.FFMpegThumbnailsJob>`)
+* :py:class:`FFMpegFrameSource` decodes the video on the fly with one ffmpeg process, and reads the
+  raw frames from its standard output: nothing is written to disk.
+* :py:class:`MemmapFrameSource` maps in memory a single file containing all the raw frames (see
+  :py:func:`write_memmap_frames`). The frames are views on the mapped file: nothing is decoded or copied,
+  and there is only one file to open instead of one file per frame.
+
+.. autosummary::
+
+  ImageFilesFrameSource
+  FFMpegFrameSource
+  MemmapFrameSource
+  write_memmap_frames
+  as_frame_source
+  get_video_information
+  get_video_identity
+
+"""
+
+import os
+import json
+import hashlib
+import subprocess
+import threading
+import logging
+
+import numpy as np
+
+from ...util.ffmpeg_runner import ErrorOutputReader
+
+logger = logging.getLogger()
+
+#: Maximal number of frames missing at the end of the stream decoded by :py:class:`FFMpegFrameSource`, which
+#: are replaced by the last frame (the duration of the video is rounded to a number of frames)
+max_missing_frames = 2
+
+
+class ImageFilesFrameSource(object):
+    """Frames read from a list of image files.
+
+    :param list filenames: the image files, one per frame, in order.
+    """
+
+    def __init__(self, filenames):
+        self.filenames = list(filenames)
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, index):
+        """Iterates over the frames, starting from the frame at position ``index``"""
+        for current in xrange(index, len(self)):
+            yield self.get_frame(current)
+
+    def get_frame(self, index):
+        """Returns the frame at position ``index``"""
+        import cv2
+        return cv2.imread(self.filenames[index])
+
+    def get_frame_keys(self):
+        """Returns the keys identifying the frames (see :py:mod:`livius.video.processing.incremental`): the
+        digests of the content of the image files."""
+        keys = []
+        for filename in self.filenames:
+            with open(filename, 'rb') as f:
+                keys.append(hashlib.sha1(f.read()).hexdigest())
+        return keys
+
+
+#: Number of bytes at the beginning of a video file identifying the video (see :py:func:`get_video_identity`)
+video_identity_size = 1 << 20
+
+
+def get_video_identity(video_file_name):
+    """Returns a key identifying the video file, used in the keys of its frames: the digest of the
+    :py:data:`video_identity_size` first bytes of the file.
+
+    The beginning of the file (container header and first encoded frames) differs between two videos, even
+    when those have the same size and duration. The end of the file is not read, which keeps the key of a
+    recording that was extended."""
+    with open(video_file_name, 'rb') as f:
+        return hashlib.sha1(f.read(video_identity_size)).hexdigest()
+
+
+def get_video_information(video_file_name):
+    """Returns the width, height and duration (in seconds) of the first video stream of a file,
+    as reported by ``ffprobe``."""
+
+    args = ['ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height:format=duration',
+            '-of', 'json',
+            os.path.abspath(video_file_name)]
+
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE)
+    out, _ = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError("ffprobe failed on the video file %s" % video_file_name)
+
+    info = json.loads(out)
+    stream = info['streams'][0]
+    return int(stream['width']), int(stream['height']), float(info['format']['duration'])
+
+
+class FFMpegFrameSource(object):
+    """Frames decoded from a video file by an ffmpeg process.
+
+    The frames are resized to ``width`` x ``height`` and sampled at ``fps`` frames per second by ffmpeg,
+    and piped as raw ``bgr24`` images (the layout used by OpenCV), which avoids any intermediate image encoding.
+
+    The number of frames is fixed: if the decoded stream is shorter by at most :py:data:`max_missing_frames`
+    frames, the last frame is repeated. An error is raised if ffmpeg fails (with the end of its error output),
+    or if the stream is shorter than that.
+
+    :param str video_file_name: the video file
+    :param int width: width of the frames
+    :param int height: height of the frames
+    :param float fps: number of frames per second
+    :param int nb_frames: number of frames of the source
+    :param float timeout: the maximal time in seconds spent waiting for ffmpeg to output a frame (or to exit
+      at the end of the stream), after which the process is killed and an error is raised. The time spent
+      by the caller on the frames is not counted. Defaults to no limit.
+    """
+
+    def __init__(self, video_file_name, width, height, fps, nb_frames, timeout=None):
+        self.video_file_name = os.path.abspath(video_file_name)
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps)
+        self.nb_frames = int(nb_frames)
+        self.timeout = timeout
+        self._video_key = None
+
+    @property
+    def video_key(self):
+        """The key identifying the video file (see :py:func:`get_video_identity`)"""
+        if self._video_key is None:
+            self._video_key = get_video_identity(self.video_file_name)
+        return self._video_key
+
+    @classmethod
+    def from_video(cls, video_file_name, width, fps, timeout=None):
+        """Creates a source of frames of width ``width`` (the height follows the aspect ratio of the video),
+        spanning the duration of the video."""
+        video_width, video_height, duration = get_video_information(video_file_name)
+        height = int(round(float(video_height) * width / video_width))
+        nb_frames = max(1, int(round(duration * float(fps))))
+        return cls(video_file_name, width, height, fps, nb_frames, timeout=timeout)
+
+    def __len__(self):
+        return self.nb_frames
+
+    def _get_ffmpeg_arguments(self, start_time=None, nb_frames=None):
+        args = ['ffmpeg', '-v', 'error']
+        if start_time is not None:
+            args += ['-ss', '%.3f' % start_time]
+
+        args += ['-i', self.video_file_name,
+                 '-vf', 'fps=%s,scale=%d:%d' % (self.fps, self.width, self.height),
+                 '-frames:v', '%d' % (self.nb_frames if nb_frames is None else nb_frames),
+                 '-f', 'rawvideo',
+                 '-pix_fmt', 'bgr24',
+                 'pipe:1']
+        return args
+
+    def _read_frames(self, start_time=None, nb_frames=None):
+        frame_size = self.width * self.height * 3
+        nb_frames = self.nb_frames if nb_frames is None else nb_frames
+
+        proc = subprocess.Popen(self._get_ffmpeg_arguments(start_time, nb_frames),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                bufsize=frame_size)
+        errors = ErrorOutputReader(proc.stderr)
+        timed_out = threading.Event()
+
+        nb_read = 0
+        last_frame = None
+        end_of_stream = False
+        try:
+            while nb_read < nb_frames:
+                data = self._wait_for(proc, timed_out, proc.stdout.read, frame_size)
+                if len(data) < frame_size:
+                    break
+
+                last_frame = np.frombuffer(bytearray(data), dtype=np.uint8).reshape(self.height, self.width, 3)
+                nb_read += 1
+                yield last_frame
+
+            # all the frames were read, or ffmpeg closed its output: waits for its exit status
+            self._wait_for(proc, timed_out, proc.wait)
+            end_of_stream = True
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None:
+                # the frames are not consumed anymore
+                proc.kill()
+                proc.wait()
+            errors.join()
+
+        if timed_out.is_set():
+            raise RuntimeError("ffmpeg did not output the frames of %s within %s seconds" % (self.video_file_name,
+                                                                                           self.timeout))
+
+        if end_of_stream and proc.returncode != 0:
+            raise RuntimeError("ffmpeg failed on %s (code %d):\n%s" % (self.video_file_name,
+                                                                       proc.returncode,
+                                                                       errors.get_text()))
+
+        if last_frame is None:
+            raise RuntimeError("ffmpeg could not decode any frame from %s" % self.video_file_name)
+
+        if nb_read < nb_frames:
+            if nb_frames - nb_read > max_missing_frames:
+                raise RuntimeError("ffmpeg decoded %d frames from %s instead of %d" % (nb_read,
+                                                                                      self.video_file_name,
+                                                                                      nb_frames))
+
+            logger.warning("FFMpegFrameSource: %d frames decoded from %s instead of %d, repeating the last frame",
+                           nb_read, self.video_file_name, nb_frames)
+
+        for _ in xrange(nb_frames - nb_read):
+            yield last_frame.copy()
+
+    def _wait_for(self, proc, timed_out, function, *args):
+        """Calls ``function``, which waits for the process, killing the process if it takes longer than the
+        timeout"""
+        if self.timeout is None:
+            return function(*args)
+
+        def terminate():
+            if proc.poll() is None:
+                timed_out.set()
+                proc.kill()
+
+        watchdog = threading.Timer(self.timeout, terminate)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            return function(*args)
+        finally:
+            watchdog.cancel()
+
+    def __iter__(self):
+        return self._read_frames()
+
+    def iter_from(self, index):
+        """Iterates over the frames, starting from the frame at position ``index``.
+
+        The decoding starts by seeking in the video."""
+        if index <= 0:
+            return self._read_frames()
+
+        if index >= self.nb_frames:
+            return iter([])
+
+        return self._read_frames(start_time=index / self.fps, nb_frames=self.nb_frames - index)
+
+    def get_frame(self, index):
+        """Returns the frame at position ``index``.
+
+        This seeks in the video and decodes one frame: iterating over the source is more efficient for
+        accessing all the frames."""
+        if index < 0 or index >= self.nb_frames:
+            raise IndexError("frame index %d out of range" % index)
+
+        return next(self._read_frames(start_time=index / self.fps, nb_frames=1))
+
+    def get_frame_keys(self):
+        """Returns the keys identifying the frames (see :py:mod:`livius.video.processing.incremental`): the
+        identity of the video, the timestamps and the size of the frames. The frames are not decoded, the
+        content of a video up to the last frame being assumed unchanged (eg. a recording that was extended)."""
+        return _get_timestamp_keys(self.video_key, self.fps, self.width, self.height, self.nb_frames)
+
+
+def _get_timestamp_keys(video_key, fps, width, height, nb_frames):
+    return ['%s:%.3f@%dx%d' % (video_key, index / fps, width, height) for index in xrange(nb_frames)]
+
+
+#: Alignment of the beginning of the frames in the raw frame files
+memmap_header_alignment = 4096
+
+
+def write_memmap_frames(filename, frames, fps):
+    """Writes all the frames of a frame source to a single raw file, read by :py:class:`MemmapFrameSource`.
+
+    The file starts with a JSON header (one line padded to :py:data:`memmap_header_alignment` bytes) giving
+    the shape of the frame array, the frame rate and the identity of the video the frames are decoded from (if
+    any), followed by the ``uint8`` BGR pixels of the frames in C order.
+    The frames are written one after the other (the source is iterated once), and the file is replaced atomically.
+
+    :param str filename: the raw file
+    :param frames: the frame source, of which all the frames have the same size
+    :param float fps: number of frames per second
+    """
+    nb_frames = len(frames)
+    temporary_filename = filename + '.tmp'
+
+    with open(temporary_filename, 'wb') as f:
+        nb_written = 0
+        for frame in frames:
+            frame = np.ascontiguousarray(frame, dtype=np.uint8)
+
+            if nb_written == 0:
+                header = json.dumps({'shape': [nb_frames] + list(frame.shape),
+                                     'dtype': 'uint8',
+                                     'fps': float(fps),
+                                     'video_key': getattr(frames, 'video_key', None)})
+                padding = -(len(header) + 1) % memmap_header_alignment
+                f.write(header + ' ' * padding + '\n')
+
+            f.write(frame.tobytes())
+            nb_written += 1
+
+    if nb_written != nb_frames or nb_frames == 0:
+        os.remove(temporary_filename)
+        raise RuntimeError("%d frames written to %s instead of %d" % (nb_written, filename, nb_frames))
+
+    os.rename(temporary_filename, filename)
+
+
+class MemmapFrameSource(object):
+    """Frames mapped in memory from a raw file written by :py:func:`write_memmap_frames`.
+
+    The frames are read-only views on the mapped file: iterating over the source or slicing :py:attr:`frames`
+    does not copy any pixel, and only the accessed pages are read from the disk.
+
+    :param str filename: the raw file
+    """
+
+    def __init__(self, filename):
+        self.filename = os.path.abspath(filename)
+
+        with open(self.filename, 'rb') as f:
+            header_line = f.readline()
+            offset = f.tell()
+
+        try:
+            header = json.loads(header_line)
+        except ValueError:
+            raise RuntimeError("The file %s is not a raw frame file" % self.filename)
+
+        self.fps = float(header['fps'])
+
+        #: The key identifying the video the frames are decoded from, or the raw file itself if the frames do
+        #: not come from a video (or for the files written without this key)
+        self.video_key = header.get('video_key', None) or get_video_identity(self.filename)
+
+        #: The array of the frames, of shape ``(nb_frames, height, width, 3)``
+        self.frames = np.memmap(self.filename,
+                                dtype=np.dtype(header['dtype']),
+                                mode='r',
+                                offset=offset,
+                                shape=tuple(header['shape']))
+
+        self.height, self.width = self.frames.shape[1:3]
+
+    def __len__(self):
+        return self.frames.shape[0]
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, index):
+        """Iterates over the frames, starting from the frame at position ``index``"""
+        for current in xrange(max(index, 0), len(self)):
+            yield self.frames[current]
+
+    def get_frame(self, index):
+        """Returns the frame at position ``index`` (a view on the mapped file)"""
+        if index < 0 or index >= len(self):
+            raise IndexError("frame index %d out of range" % index)
+
+        return self.frames[index]
+
+    def get_frame_keys(self):
+        """Returns the keys identifying the frames (see :py:mod:`livius.video.processing.incremental`): the
+        identity of the video, the timestamps and the size of the frames, as for :py:class:`FFMpegFrameSource`.
+        The outputs computed on the frames decoded on the fly are then reused on the frames of the raw file, and
+        conversely."""
+        return _get_timestamp_keys(self.video_key, self.fps, self.width, self.height, len(self))
+
+
+def as_frame_source(frames):
+    """Returns a frame source from ``frames``, which is either already a frame source or a list of image files."""
+    if isinstance(frames, (ImageFilesFrameSource, FFMpegFrameSource, MemmapFrameSource)):
+        return frames
+
+    return ImageFilesFrameSource(frames)
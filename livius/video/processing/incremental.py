@@ -0,0 +1,109 @@
+"""
+Incremental processing
+======================
+
+This module provides the reuse of the per-frame outputs of a previous run of a Job, when only some of the
+frames changed (eg. the recording was extended, or the thumbnails are sampled at another frame rate).
+
+Each frame is identified by a key given by the frame source (see :py:func:`get_frame_keys
+<livius.video.processing.frame_source.FFMpegFrameSource.get_frame_keys>`): the identity of the video and the
+timestamp of the frame for the frames decoded from the video, the digest of the file content for the image
+files. The Jobs computing per-frame outputs store the keys of the frames next to their outputs. When the Job is
+run again, the outputs of the frames having the same keys are copied from the previous state, and only the new
+or changed frames are computed.
+
+The outputs of the previous run are reused only if they were computed with the same parameters and the
+same other inputs (eg. the areas of the histograms): those are summarized by a *reuse key* stored with
+the outputs.
+
+.. autosummary::
+
+  PreviousFrameOutputs
+
+"""
+
+import logging
+
+from .state_storage import get_hash_of_values
+
+logger = logging.getLogger()
+
+
+class PreviousFrameOutputs(object):
+    """The per-frame outputs of the previous run of a Job, indexed by the keys of the frames.
+
+    The Job should cache the :py:attr:`frame_keys` and :py:attr:`reuse_key` in its outputs, as
+    ``frame_keys`` and ``frame_reuse_key`` respectively.
+
+    :param job: the Job being run
+    :param frame_keys: the keys of the current frames, or ``None`` if the frames have no keys (nothing
+      is reused then)
+    :param inputs: the inputs of the Job, other than the frames, on which the outputs of each frame depend
+    """
+
+    def __init__(self, job, frame_keys, inputs=None):
+        #: The keys of the current frames
+        self.frame_keys = list(frame_keys) if frame_keys is not None else None
+
+        #: The key of the configuration of the per-frame outputs
+        self.reuse_key = get_hash_of_values([job.name, job.version, job.get_parameters_hash(), inputs])
+
+        #: The previous state of the Job, ``None`` if it cannot be reused
+        self.state = None
+        self._previous_indices = {}
+
+        if self.frame_keys is None:
+            return
+
+        state = job.load_state()
+        if state is None or state.get('frame_keys', None) is None:
+            return
+
+        if state.get('frame_reuse_key', None) != self.reuse_key:
+            logger.debug('[INCREMENTAL] the previous outputs of %s were computed with another configuration', job.name)
+            return
+
+        self.state = state
+        self._previous_indices = dict((key, index) for index, key in enumerate(state['frame_keys']))
+
+    def get(self, name):
+        """Returns the previous output ``name``"""
+        return self.state[name]
+
+    def get_reusable_frames(self, nb_preceding_frames=0, reference_frames=()):
+        """Returns a dictionary ``{index: previous_index}`` of the frames that were already processed
+        by the previous run.
+
+        :param int nb_preceding_frames: the number of frames preceding a frame on which its outputs depend (eg. ``1``
+          for the difference of two consecutive frames). The outputs of a frame are reused if its preceding frames
+          were also the preceding frames in the previous run.
+        :param list reference_frames: the indices of the frames on which the outputs of all the frames depend (eg.
+          ``[0]`` for the differences with the first frame). Nothing is reused if one of those frames changed.
+        """
+        reusable = {}
+        if self.state is None:
+            return reusable
+
+        for index in reference_frames:
+            if index >= len(self.frame_keys) or self._previous_indices.get(self.frame_keys[index], None) != index:
+                logger.debug('[INCREMENTAL] the reference frame %d changed, nothing is reused', index)
+                return reusable
+
+        for index, key in enumerate(self.frame_keys):
+            previous_index = self._previous_indices.get(key, None)
+            if previous_index is None:
+                continue
+
+            if index < nb_preceding_frames:
+                # the first frames should have been the first ones
+                if previous_index != index:
+                    continue
+            elif any(self._previous_indices.get(self.frame_keys[index - offset], None) != previous_index - offset
+                     for offset in xrange(1, nb_preceding_frames + 1)):
+                continue
+
+            reusable[index] = previous_index
+
+        if reusable:
+            logger.info('[INCREMENTAL] reusing the outputs of %d frames out of %d', len(reusable), len(self.frame_keys))
+        return reusable
@@ -11,12 +11,78 @@ computations if needed. This can happen if some parameters of a predecessing act
 import os
 import json
 import logging
+import threading
+import functools
 from exceptions import AttributeError
 
+import numpy as np
+
+from .state_storage import NumpySidecarStateStorage, get_hash_of_values
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
 
+class UpToDateCache(object):
+    """
+    Memoization of the state checks of the Jobs of a workflow instance.
+
+    One instance of this class is shared by all the Jobs created together (the final Job
+    passes it to its parents), and the values are keyed by Job instance. The full cache is invalidated
+    each time a Job flushes a new state or a cached parameter of a Job is changed, which
+    makes the checks of a workflow without any change run in constant time after the first check.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._values = {}
+
+    @property
+    def generation(self):
+        """Incremented on each invalidation"""
+        return self._generation
+
+    def get(self, key):
+        """Returns the cached value for ``key`` or ``None``"""
+        with self._lock:
+            return self._values.get(key, None)
+
+    def set(self, key, value, generation):
+        """Caches ``value`` if no invalidation happened since ``generation`` (value computed
+        concurrently to an invalidation)."""
+        with self._lock:
+            if generation == self._generation:
+                self._values[key] = value
+
+    def invalidate(self):
+        """Discards all the cached values"""
+        with self._lock:
+            self._generation += 1
+            self._values = {}
+
+
+def _memoized_state_check(function):
+    """Memoizes the result of a state check member function in the shared :py:class:`UpToDateCache`."""
+
+    @functools.wraps(function)
+    def wrapper(self):
+        cache = self._up_to_date_cache
+        if cache is None:
+            return function(self)
+
+        key = (self, function.__name__)
+        value = cache.get(key)
+        if value is None:
+            generation = cache.generation
+            value = function(self)
+            cache.set(key, value, generation)
+
+        return value
+
+    return wrapper
+
+
 class Job(object):
 
     """
@@ -26,7 +92,8 @@ class Job(object):
         All subclasses must override the run() function. It should compute all attributes
         mentioned in self.outputs_to_cache.
 
-    After the Job is run, the state is serialized to a JSON file.
+    After the Job is run, the state is serialized to a JSON file (see :py:attr:`state_storage_class` for
+    the storage of the numpy arrays).
 
     Subclasses can optionally override the :func:`load_state` function which provides a way to
     deal with the difference between JSON storage and the Python objects
@@ -51,8 +118,23 @@ class Job(object):
     #:      Job's :func:`run` method.
     parents = None
 
+    #: Indicates that the Job interacts with the user (eg. selection windows, terminal prompts).
+    #: Such Jobs are always run from the main thread by the parallel scheduler
+    #: (see :py:mod:`livius.video.processing.scheduler`).
+    is_interactive = False
+
+    #: Version of the computations performed by the Job. Changing the version invalidates the stored
+    #: states, for instance when the results of the Job change for the same parameters.
+    version = None
+
+    #: Backend storing the state of the Job. The default stores the parameters and
+    #: outputs in JSON, except for the numpy arrays that are stored in memory mapped sidecar files
+    #: (see :py:mod:`livius.video.processing.state_storage`).
+    state_storage_class = NumpySidecarStateStorage
+
     # private API
     _is_frozen = False
+    _up_to_date_cache = None
 
     @classmethod
     def add_parent(cls, obj):
@@ -139,6 +221,10 @@ class Job(object):
 
         self._is_frozen = False
 
+        #: Serializes the caching of the outputs, the parents being shared by the Jobs run concurrently
+        #: (reentrant for the outputs created lazily after caching the state)
+        self._outputs_lock = threading.RLock()
+
         self.json_prefix = kwargs.get('json_prefix', '')
         self.json_filename = self.json_prefix + '_' + self.name + '.json'
 
@@ -152,6 +238,11 @@ class Job(object):
         for name, value in kwargs.items():
             setattr(self, name, value)
 
+        # the memoization of the up to date checks is shared with the parents
+        if kwargs.get('up_to_date_cache', None) is None:
+            kwargs['up_to_date_cache'] = UpToDateCache()
+        self._up_to_date_cache = kwargs['up_to_date_cache']
+
         # Creation of all parents
         self._parent_names = []
         self._parent_instances = []
@@ -204,6 +295,10 @@ class Job(object):
         else:
             object.__setattr__(self, key, value)
 
+            # a change of parameter makes the memoized checks obsolete
+            if self._is_frozen and key in self.attributes_to_serialize and self._up_to_date_cache is not None:
+                self._up_to_date_cache.invalidate()
+
     def get_parent_by_type(self, t):
         """Algorithm is breadth first."""
         if len(self._parent_instances) == 0:
@@ -236,11 +331,16 @@ class Job(object):
 
         return None
 
+    @_memoized_state_check
     def is_up_to_date(self):
         """Indicate wether this step should be processed again.
 
         This may be overriden by a child Job for instance when the output is a file and cannot be seen
         by the internal state (example: output file does not exist, input parameters makes the output file obsolete...)
+
+        .. note::
+
+           The result is memoized until a Job of the workflow flushes its state (see :py:class:`UpToDateCache`).
         """
         for par in self._parent_instances:
             if not par.is_up_to_date():
@@ -248,8 +348,50 @@ class Job(object):
 
         return self.are_states_equal()
 
+    def get_parameters_hash(self):
+        """Returns a hash of the parameters (``attributes_to_serialize``) of this Job."""
+        return get_hash_of_values(dict((k, getattr(self, k)) for k in self.attributes_to_serialize))
+
+    @_memoized_state_check
+    def get_stored_header(self):
+        """Returns the header of the stored state, or ``None`` if there is none."""
+        return self.get_state_storage().load_header()
+
+    @_memoized_state_check
+    def get_state_key(self):
+        """Returns the key identifying the current state of this Job.
+
+        The key is a hash of the name, the version and the parameters of this Job, and of the keys and outputs hashes
+        stored in the headers of the parents. A change in any of the predecessors hence changes the key.
+        The key does not depend on the location of the files, which allows the states to be shared
+        between different machines.
+        """
+        parents = []
+        for par in self._parent_instances:
+            header = par.get_stored_header() or {}
+            parents.append([par.name, header.get('state_key', None), header.get('outputs_hash', None)])
+
+        return get_hash_of_values([self.name, self.version, self.get_parameters_hash(), parents])
+
+    @_memoized_state_check
     def are_states_equal(self):
-        """Return True is the state of the current object is the same as the one in the serialized json dump."""
+        """Return True is the state of the current object is the same as the one in the serialized json dump.
+
+        If the stored state has a header, only the state keys are compared (see :py:func:`get_state_key`),
+        without loading the stored state. Otherwise the parameters are compared one by one against the
+        stored ones, unless the Job has a :py:attr:`version` (the states without header are older).
+        """
+        header = self.get_stored_header()
+        if header is not None and self.get_state_storage().exists():
+            if header.get('state_key', None) != self.get_state_key():
+                logger.debug("Job.are_states_equal: state key mismatch for %s", self.name)
+                return False
+            return True
+
+        if self.version is not None:
+            logger.debug("Job.are_states_equal: no state header for the versioned Job %s", self.name)
+            return False
+
         dict_json = self.load_state()
 
         if dict_json is None:
@@ -261,6 +403,13 @@ class Job(object):
 
                 current_object = getattr(self, k)
 
+                # arrays are compared element-wise
+                if isinstance(current_object, np.ndarray) or isinstance(dict_json[k], np.ndarray):
+                    if not np.array_equal(np.asarray(dict_json[k]), np.asarray(current_object)):
+                        logger.debug("Key %s mismatch (arrays)", k)
+                        return False
+                    continue
+
                 # unicode or string: we compare in unicode
                 if isinstance(current_object, unicode) or isinstance(current_object, str):
                     if unicode(dict_json[k]) != unicode(current_object):
@@ -286,18 +435,29 @@ class Job(object):
 
         return True
 
-    def serialize_state(self):
+    def serialize_state(self, with_parents=True):
         """
         Flush the state of the runner into the json file mentioned by 'json_prefix' (init) to
         which the name of the current Job has been appended in the form 'json_prefix'_'name'.json
-        Also flushes the state of the parents as well.
+
+        :param bool with_parents: if ``True`` (default), also flushes the state of the parents.
         """
-        for par in self._parent_instances:
-            par.serialize_state()
+        if with_parents:
+            for par in self._parent_instances:
+                par.serialize_state()
 
-        # no need if there is no change in configuration
+        # no need if there is no change in configuration, unless the state was stored without header (older
+        # versions): the state is then stored again once with its header, which is otherwise loaded at each
+        # check, and which the state keys of the children need
         if self.are_states_equal():
-            return
+            if self.get_stored_header() is not None:
+                return
+
+            logger.info('Job.serialize_state: %s/%s writing the header of the state',
+                        os.path.basename(self.json_prefix), self.name)
+            with self._outputs_lock:
+                if not self.is_output_cached():
+                    self.cache_output()
 
         assert(self.json_filename is not None)
 
@@ -311,21 +471,33 @@ class Job(object):
         for k in self.outputs_to_cache:
             d[k] = getattr(self, k)
 
-        with open(self.json_filename, 'w') as f:
-            json.dump(d, f, indent=4)
+        storage = self.get_state_storage()
+
+        # the header is written last: an interrupted flush leaves a state that is not up to date
+        storage.remove_header()
+        storage.save(d)
+        storage.save_header({'state_key': self.get_state_key(),
+                             'outputs_hash': get_hash_of_values(dict((k, d[k]) for k in self.outputs_to_cache))})
+
+        self._up_to_date_cache.invalidate()
+
+    def get_state_storage(self):
+        """Returns the storage backend of the state of this Job."""
+        return self.state_storage_class(self.json_filename)
 
     def load_state(self):
-        """Load the json file."""
+        """Load the json file.
+
+        The numpy arrays stored in sidecar files are memory mapped (read-only)."""
         if self.json_filename is None:
             return None
 
-        if not os.path.exists(self.json_filename):
+        storage = self.get_state_storage()
+        if not storage.exists():
             logger.debug("Job.load_state: file does not exist %s.", self.json_filename)
             return None
 
-        dict_json = json.load(open(self.json_filename))
-
-        return dict_json
+        return storage.load()
 
     def run(self, *args, **kwargs):
         """
@@ -343,6 +515,9 @@ class Job(object):
         """
         if self.is_up_to_date():
             logger.info('Job.process: %s/%s state is up to date', os.path.basename(self.json_prefix), self.name)
+
+            # writes the missing headers, if any
+            self.serialize_state()
             return
 
         # if not up to date, we need all the parents
@@ -366,20 +541,31 @@ class Job(object):
 
     def cache_output(self):
         """Set all output attributes as loaded from the JSON file."""
-        json_state = self.load_state()
+        with self._outputs_lock:
+            json_state = self.load_state()
 
-        if json_state is None:
-            raise RuntimeError('Trying to cache output from non-existing JSON file.')
+            if json_state is None:
+                raise RuntimeError('Trying to cache output from non-existing JSON file.')
 
-        for attribute in self.outputs_to_cache:
-            setattr(self, attribute, json_state[attribute])
+            for attribute in self.outputs_to_cache:
+                setattr(self, attribute, json_state[attribute])
 
     def get_outputs(self):
         """Return all the possible outputs of this step."""
         if not self.is_up_to_date():
             raise RuntimeError("Cannot query for the outputs of Job {} before those are computed with the new parameters".format(self.name))
 
-        if not self.is_output_cached():
-            self.cache_output()
+        with self._outputs_lock:
+            if not self.is_output_cached():
+                self.cache_output()
 
         return None
+
+    def get_output_reader(self):
+        """Returns a reader over the per-frame outputs of this step, or ``None`` if the outputs cannot be streamed.
+
+        This is optional: a Job having per-frame outputs may return a :py:class:`FrameRangeReader
+        <livius.video.processing.streaming.FrameRangeReader>`, through which the downstream Jobs process the
+        outputs by chunks of frames in bounded memory (see :py:mod:`livius.video.processing.streaming`).
+        """
+        return None
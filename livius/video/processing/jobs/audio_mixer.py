@@ -7,20 +7,68 @@ This file contains jobs able to process the audio stream of moviePy.
 .. autosummary::
 
   AudioMixerJob
+  AudioMixer
+  get_mixing_matrix
+  get_pan_filter
 
 """
 
 from ..job import Job
 
-import datetime
 import os
 import logging
 import numpy as np
 
+logger = logging.getLogger()
 
-from moviepy.editor import AudioFileClip
 
-logger = logging.getLogger()
+def get_mixing_matrix(mixing_left, mixing_right):
+    """Returns the 2x2 matrix mixing the left and right channels into two identical channels.
+
+    The mixed channels of a stereo chunk ``frame`` of shape ``(n, 2)`` are given by ``frame * matrix``.
+
+    :param float mixing_left: the amount of the left channel
+    :param float mixing_right: the amount of the right channel
+    """
+    a = mixing_left / (mixing_left + mixing_right)
+    return np.array([[a, a],
+                     [1 - a, 1 - a]])
+
+
+def get_pan_filter(mixing_left, mixing_right):
+    """Returns the ffmpeg ``pan`` filter performing the same mixing as :py:func:`get_mixing_matrix`."""
+    a = mixing_left / (mixing_left + mixing_right)
+    mix = '%r*c0+%r*c1' % (a, 1 - a)
+    return 'pan=stereo|c0=%s|c1=%s' % (mix, mix)
+
+
+class AudioMixer(object):
+    """Callable object mixing the channels of the audio chunks with a mixing matrix, for the ``fl``
+    method of the moviePy audio clips.
+
+    The chunks are mixed with one matrix product, in an output buffer reused from one chunk to the other.
+    Mono chunks are returned as is.
+
+    :param mixing_matrix: the matrix given by :py:func:`get_mixing_matrix`
+    """
+
+    def __init__(self, mixing_matrix):
+        self.mixing_matrix = mixing_matrix
+        self.output = None
+
+    def __call__(self, get_frame, t):
+        frame = get_frame(t)
+
+        if frame.ndim < 2 or frame.shape[1] < 2:
+            return frame
+
+        output_shape = (frame.shape[0], 2)
+        output_dtype = np.result_type(frame, self.mixing_matrix)
+        if self.output is None or self.output.shape != output_shape or self.output.dtype != output_dtype:
+            self.output = np.empty(output_shape, dtype=output_dtype)
+
+        return np.dot(frame[:, :2], self.mixing_matrix, out=self.output)
+
 
 class AudioMixerJob(Job):
     """
@@ -35,6 +83,9 @@ class AudioMixerJob(Job):
     * ``video_location`` location of the video to process (not cached)
     * ``audio_mixing_left`` amount of the left channel in the final stream
     * ``audio_mixing_right`` amount of the right channel in the final stream
+    * ``audio_mixing_method`` ``python`` (default) for mixing the audio chunks with :py:class:`AudioMixer`
+      while the video is written, or ``ffmpeg`` for mixing the audio with the ``pan`` filter of ffmpeg
+      (see :py:func:`get_pan_filter`) in the encoding of the audio stream of the final video. Not cached.
 
     .. rubric:: Workflow inputs
 
@@ -42,7 +93,9 @@ class AudioMixerJob(Job):
 
     .. rubric:: Workflow outputs
 
-    A transformed moviePy audio clip.
+    A transformed moviePy audio clip. With the ``ffmpeg`` mixing method, the clip is the audio of the video
+    as is, and its attribute ``ffmpeg_audio_filter`` holds the ``pan`` filter applied when the final video is
+    written (see :py:func:`write_videofile <livius.video.editing.rendering.write_videofile>`).
 
     :note:
         The transformations are only applied at write-time.
@@ -69,27 +122,29 @@ class AudioMixerJob(Job):
         self.mixing_left = float(kwargs['audio_mixing_left']) if 'audio_mixing_left' in kwargs else 0.5
         self.mixing_right = float(kwargs['audio_mixing_right']) if 'audio_mixing_right' in kwargs else 0.5
 
+        self.audio_mixing_method = kwargs.get('audio_mixing_method', 'python')
+        if self.audio_mixing_method not in ('python', 'ffmpeg'):
+            raise RuntimeError('Unknown audio mixing method %s' % self.audio_mixing_method)
+
     def run(self, *args, **kwargs):
         pass
 
     def get_outputs(self):
         super(AudioMixerJob, self).get_outputs()
 
+        from moviepy.editor import AudioFileClip
+
         input_video = os.path.join(self.video_location, self.video_filename)
 
         clip = AudioFileClip(input_video)
 
-        def apply_effects(get_frame, t):
-            """Function that chains together all the post processing effects."""
-
-            frame = get_frame(t)
-
-            if frame.shape[1] < 2:
-                return frame
+        if clip.nchannels < 2:
+            return clip
 
-            a = self.mixing_left / (self.mixing_left + self.mixing_right)
-            mixed = a * frame[:, 0] + (1 - a) * frame[:, 1]
-            return np.vstack([mixed, mixed]).transpose()
+        if self.audio_mixing_method == 'ffmpeg':
+            # mixed by the encoder of the final audio stream
+            clip.ffmpeg_audio_filter = get_pan_filter(self.mixing_left, self.mixing_right)
+            return clip
 
         # retains the duration of the clip
-        return clip.fl(apply_effects, keep_duration=True)
+        return clip.fl(AudioMixer(get_mixing_matrix(self.mixing_left, self.mixing_right)), keep_duration=True)
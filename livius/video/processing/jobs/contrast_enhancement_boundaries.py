@@ -11,47 +11,123 @@ we apply in order to enhance the contrast of the slides.
   ContrastEnhancementBoundaries
   ComputeExtremaOnAndBetweenSegments
   ComputesExtremaByLinearInterpolationOnSegments
+  SegmentLocator
+  get_min_max_boundary
 
 """
 
 from ..job import Job
 
 import itertools
-from multiprocessing import Pool
+import bisect
 
 from ....util.tools import get_polygon_outer_bounding_box, crop_image_from_normalized_coordinates, \
     linear_interpolation, sort_dictionary_by_integer_key
 from ....util.histogram import get_histogram_min_max_with_percentile
+from ....util.parallel import parallel_map, process_pool
+from ..frame_source import as_frame_source, ImageFilesFrameSource
+from ..checkpoint import FrameCheckpoint, default_checkpoint_interval
+from ..incremental import PreviousFrameOutputs
 
 
 import numpy as np
 import math
 
 
+def get_min_max_boundary(im_gray, slide_crop_rect, percentile):
+    """
+    Computes the boundaries for the histogram stretching from the histogram of the slide area.
+
+    :param im_gray: the grayscale image
+    :param slide_crop_rect: The location of the slides specified by normalized coordinates [x,y,width,height]
+    :param percentile: the percentile of the histogram defining the boundaries
+    """
+    import cv2
+
+    slide = crop_image_from_normalized_coordinates(im_gray, slide_crop_rect)
+    slidehist = cv2.calcHist([slide], [0], None, [256], [0, 256])
+
+    return get_histogram_min_max_with_percentile(slidehist, False, percentile=percentile)
+
+
 def _get_min_max_boundary_from_file(args):
     """
     Load a frame from disk and computes the boundaries for the histogram stretching.
 
     :param args:
-        A tuple (filename, rect) where
-            * filename: The filename to be read
+        A tuple (frame, rect, percentile) where
+            * frame: The filename to be read, or the image itself
             * rect: The location of the slides specified by normalized coordinates [x,y,width,height]
+            * percentile: the percentile of the histogram defining the boundaries
 
     .. note:: The histogram is computed on the cropped grayscale image.
     """
 
     import cv2
 
-    filename, slide_crop_rect, percentile = args
-    im = cv2.imread(filename)
+    frame, slide_crop_rect, percentile = args
+    im = cv2.imread(frame) if isinstance(frame, basestring) else frame
     im_gray = cv2.cvtColor(im, cv2.COLOR_BGR2GRAY)
 
-    slide = crop_image_from_normalized_coordinates(im_gray, slide_crop_rect)
-    slidehist = cv2.calcHist([slide], [0], None, [256], [0, 256])
+    return get_min_max_boundary(im_gray, slide_crop_rect, percentile)
+
+
+class SegmentLocator(object):
+    """Locates a time with respect to a list of segments.
+
+    The time ``t`` lies inside the segment ``i`` if ``start_i <= t <= last_i``, where ``last_i`` is the last time
+    considered inside the segment. The segments are scanned in order, and the first segment that contains ``t``
+    or that starts after ``t`` gives the location.
+
+    When the starts and the last times are both sorted (as for the stable segments, that are computed in
+    the order of the video), the location is found by bisection in `O(log(n))`. Otherwise, the segments
+    are scanned linearly.
+
+    :param starts: the start of each segment
+    :param lasts: the last time inside each segment
+    """
+
+    def __init__(self, starts, lasts):
+        self.starts = list(starts)
+        self.lasts = list(lasts)
+        assert(len(self.starts) == len(self.lasts))
+
+        self.is_sorted = all(s0 <= s1 for s0, s1 in zip(self.starts, self.starts[1:])) and \
+            all(l0 <= l1 for l0, l1 in zip(self.lasts, self.lasts[1:]))
 
-    boundaries = get_histogram_min_max_with_percentile(slidehist, False, percentile=percentile)
+    def __len__(self):
+        return len(self.starts)
 
-    return boundaries
+    def locate(self, t):
+        """Returns a tuple ``(segment_index, is_inside)``.
+
+        * if ``is_inside`` is ``True``, ``t`` lies inside the segment ``segment_index``
+        * otherwise, ``t`` lies before the segment ``segment_index`` and after the previous ones. The index is
+          equal to the number of segments if ``t`` lies after all the segments.
+        """
+        if not self.is_sorted:
+            return self.locate_by_scan(t)
+
+        # first segment starting after t: all the previous ones start before t
+        index_after = bisect.bisect_right(self.starts, t)
+
+        # first segment not finishing before t
+        index_inside = bisect.bisect_left(self.lasts, t)
+
+        if index_inside < index_after:
+            return index_inside, True
+
+        return index_after, False
+
+    def locate_by_scan(self, t):
+        """Same as :py:func:`locate` by scanning the segments linearly."""
+        for segment_index, (start, last) in enumerate(zip(self.starts, self.lasts)):
+            if (start <= t) and (t <= last):
+                return segment_index, True
+            elif t < start:
+                return segment_index, False
+
+        return len(self.starts), False
 
 
 class ComputeExtremaOnAndBetweenSegments(object):
@@ -65,6 +141,8 @@ class ComputeExtremaOnAndBetweenSegments(object):
 
     .. note:: the average function may be replaced by any other function returning a pair of appropriate values
        representing a linear slope. The function will then interpolate on this slope.
+
+    .. note:: the segment containing the time is found by bisection (see :py:class:`SegmentLocator`).
     """
 
     def __init__(self, boundaries, segments, default_boundary):
@@ -76,40 +154,39 @@ class ComputeExtremaOnAndBetweenSegments(object):
         self.boundary_for_segment = map(self.get_histogram_boundary_average_for_segment,
                                         self.segments)
 
+        self.segment_locator = SegmentLocator([start for start, _ in self.segments],
+                                              [end for _, end in self.segments])
+
         return
 
     def __call__(self, t):
-        segment_index = 0
-        for (start, end) in self.segments:
+        segment_index, is_inside = self.segment_locator.locate(t)
 
-            if (start <= t) and (t <= end):
-                # We are inside a segment and thus know the boundaries
-                segment_begin_value, segment_end_value = self.boundary_for_segment[segment_index]
+        if is_inside:
+            # We are inside a segment and thus know the boundaries
+            segment_begin_value, segment_end_value = self.boundary_for_segment[segment_index]
 
-                t0 = self.segments[segment_index][0]  # Start of this segment
-                t1 = self.segments[segment_index][1]  # End of this segment
+            t0 = self.segments[segment_index][0]  # Start of this segment
+            t1 = self.segments[segment_index][1]  # End of this segment
 
-                return linear_interpolation(t, t0, t1, segment_begin_value, segment_end_value)
+            return linear_interpolation(t, t0, t1, segment_begin_value, segment_end_value)
 
-            elif (t < start):
-                if segment_index == 0:
-                    # In this case, we are before the first segment
-                    # Return the default boundary.
-                    return self.default_boundary
+        elif segment_index == 0:
+            # In this case, we are before the first segment
+            # Return the default boundary.
+            return self.default_boundary
 
-                else:
-                    # We are between two segments and thus have to interpolate
-                    t0 = self.segments[segment_index - 1][1]  # End of last segment
-                    t1 = self.segments[segment_index][0]  # Start of new segment
+        elif segment_index < len(self.segments):
+            # We are between two segments and thus have to interpolate
+            t0 = self.segments[segment_index - 1][1]  # End of last segment
+            t1 = self.segments[segment_index][0]  # Start of new segment
 
-                    boundary0 = self.boundary_for_segment[segment_index - 1][1]  # value at the end of the segment
-                    boundary1 = self.boundary_for_segment[segment_index][0]  # value at the beginning of the segment
+            boundary0 = self.boundary_for_segment[segment_index - 1][1]  # value at the end of the segment
+            boundary1 = self.boundary_for_segment[segment_index][0]  # value at the beginning of the segment
 
-                    lerped_boundary = linear_interpolation(t, t0, t1, boundary0, boundary1)
+            lerped_boundary = linear_interpolation(t, t0, t1, boundary0, boundary1)
 
-                    return lerped_boundary
-
-            segment_index += 1
+            return lerped_boundary
 
         # We are behind the last computed segment, since we have no end value to
         # interpolate, we just return the bounds of the last computed segment
@@ -153,16 +230,26 @@ class ContrastEnhancementBoundaries(Job):
 
     The boundaries are computed on the thumbnail image transformed to grayscale.
 
+    .. note::
+
+       The workflows compute the boundaries with the other per-frame features in
+       :py:class:`FrameAnalysisJob <livius.video.processing.jobs.frame_analysis.FrameAnalysisJob>`,
+       which also analyses the frames with ``nb_processes`` processes.
+
     .. rubric:: Runtime parameters
 
     * `histogram_contrast_enhancement_percentile` the percentile (in `[0, 1]`) of the
       histogram that defines the lower or upper bound. Defaults to `0.01 (1%)`
+    * `nb_processes` the number of processes reading the image files (not cached). Defaults to the number
+      of CPUs (see :py:mod:`livius.util.parallel`).
+    * `checkpoint_interval` the number of frames between two checkpoints of the boundaries (not cached,
+      see :py:mod:`livius.video.processing.checkpoint`). Defaults to 600.
 
     .. rubric:: Workflow inputs
 
     The inputs of the parents are expected to be the following:
 
-    * A list of images (specified by filename) to operate on
+    * A list of images (specified by filename) or a frame source to operate on
     * The location of the slides given as a rectangle: [x, y, widht, height]
     * A list of stable segments `[t_segment_start, t_segment_end]`
 
@@ -184,12 +271,16 @@ class ContrastEnhancementBoundaries(Job):
 
     .. rubric:: Complexity
 
-    Linear in the number of thumbnails. The thumbnails are read once.
+    Linear in the number of thumbnails. The thumbnails are read once. When the Job is run again, only the
+    boundaries of the new or changed frames are computed (see :py:mod:`livius.video.processing.incremental`).
     """
 
     #: Name of the job in the workflow
     name = 'contrast_enhancement_boundaries'
 
+    #: The keys of the frames are stored with the boundaries
+    version = 1
+
     #: Cached inputs:
     #:
     #: * ``histogram_contrast_enhancement_percentile`` the percentile to keep for computing the boundaries from the histograms
@@ -199,8 +290,12 @@ class ContrastEnhancementBoundaries(Job):
     #:
     #: * ``min_bounds`` min sequence function of time
     #: * ``max_bounds`` max sequence function of time
+    #: * ``frame_keys`` and ``frame_reuse_key`` identify the frames and the configuration of the boundaries,
+    #:   for reusing them in the next runs (see :py:mod:`livius.video.processing.incremental`)
     outputs_to_cache = ['min_bounds',
-                        'max_bounds']
+                        'max_bounds',
+                        'frame_keys',
+                        'frame_reuse_key']
 
     def __init__(self,
                  *args,
@@ -208,25 +303,79 @@ class ContrastEnhancementBoundaries(Job):
         super(ContrastEnhancementBoundaries, self).__init__(*args, **kwargs)
 
         self.histogram_contrast_enhancement_percentile = float(kwargs['histogram_contrast_enhancement_percentile']) if 'histogram_contrast_enhancement_percentile' in kwargs else 0.01
+        self.nb_processes = kwargs.get('nb_processes', None)
+        self.checkpoint_interval = int(kwargs.get('checkpoint_interval', default_checkpoint_interval))
 
     def run(self, *args, **kwargs):
         assert(len(args) >= 2)
 
-        # First parent is ffmpeg (list of thumbnails)
-        image_list = args[0]
+        # First parent is ffmpeg (list of thumbnails or frame source)
+        frames = as_frame_source(args[0])
 
         # Second parent is selected slide
         slide_crop_rect = get_polygon_outer_bounding_box(args[1])
 
-        pool = Pool(processes=6)
-
-        boundaries = pool.map(_get_min_max_boundary_from_file,
-                              itertools.izip(image_list,
-                                             itertools.repeat(slide_crop_rect),
-                                             itertools.repeat(self.histogram_contrast_enhancement_percentile)))
+        nb_frames = len(frames)
+        min_bounds, max_bounds = [None] * nb_frames, [None] * nb_frames
+
+        # the boundaries of the frames already processed by the previous run are reused
+        previous = PreviousFrameOutputs(self, frames.get_frame_keys(), inputs=slide_crop_rect)
+        self.frame_keys, self.frame_reuse_key = previous.frame_keys, previous.reuse_key
+
+        reusable = previous.get_reusable_frames()
+        if reusable:
+            previous_min_bounds, previous_max_bounds = previous.get('min_bounds'), previous.get('max_bounds')
+            for index, previous_index in reusable.items():
+                min_bounds[index] = previous_min_bounds[previous_index]
+                max_bounds[index] = previous_max_bounds[previous_index]
+
+        # resuming after the last frame of the checkpoint, if any
+        checkpoint = FrameCheckpoint(self, self.checkpoint_interval)
+        nb_frames_done, checkpoint_values = checkpoint.load()
+        if checkpoint_values is not None:
+            min_bounds[:nb_frames_done] = checkpoint_values['min_bounds'][:nb_frames_done]
+            max_bounds[:nb_frames_done] = checkpoint_values['max_bounds'][:nb_frames_done]
+
+        to_compute = [index for index in xrange(nb_frames_done, nb_frames) if index not in reusable]
+
+        def set_boundaries(indices, boundaries):
+            for index, (min_bound, max_bound) in itertools.izip(indices, boundaries):
+                min_bounds[index] = min_bound
+                max_bounds[index] = max_bound
+
+            # all the frames before the last computed one are set
+            nb_frames_set = indices[-1] + 1
+            checkpoint.update(nb_frames_set, lambda start, stop: {'min_bounds': min_bounds[start:stop],
+                                                                  'max_bounds': max_bounds[start:stop]})
+
+        if isinstance(frames, ImageFilesFrameSource) and to_compute:
+            # the image files are read in parallel by the workers, by blocks of frames between two checkpoints.
+            # The same pool processes all the blocks.
+            block_size = checkpoint.interval if checkpoint.enabled else len(to_compute)
+            with process_pool(self.nb_processes) as pool:
+                for block_start in xrange(0, len(to_compute), block_size):
+                    indices = to_compute[block_start:block_start + block_size]
+                    set_boundaries(indices,
+                                   parallel_map(_get_min_max_boundary_from_file,
+                                                itertools.izip([frames.filenames[index] for index in indices],
+                                                               itertools.repeat(slide_crop_rect),
+                                                               itertools.repeat(self.histogram_contrast_enhancement_percentile)),
+                                                nb_workers=self.nb_processes,
+                                                pool=pool))
+        elif to_compute:
+            # the frames are decoded by the frame source while being consumed here: the remaining
+            # computations are light and this avoids keeping all the decoded frames in memory
+            to_compute = set(to_compute)
+            for index, frame in enumerate(frames.iter_from(min(to_compute)), min(to_compute)):
+                if index in to_compute:
+                    set_boundaries([index], [_get_min_max_boundary_from_file((frame,
+                                                                              slide_crop_rect,
+                                                                              self.histogram_contrast_enhancement_percentile))])
+
+        checkpoint.remove()
 
         # Create two single lists
-        self.min_bounds, self.max_bounds = map(list, zip(*boundaries))
+        self.min_bounds, self.max_bounds = min_bounds, max_bounds
 
     def get_outputs(self):
         super(ContrastEnhancementBoundaries, self).get_outputs()
@@ -244,54 +393,57 @@ class ComputesExtremaByLinearInterpolationOnSegments(object):
     for the estimation of the extreams). The callable object performs a linear interpolation of those values
     within segments to have a continuous function of time.
 
-    Between segments, a linear interpolation is also performed. """
+    Between segments, a linear interpolation is also performed.
+
+    The segment containing the time is found by bisection (see :py:class:`SegmentLocator`), which makes
+    each call `O(log(n))` in the number of segments. """
 
     def __init__(self, boundaries, segments, default_boundary):
         self.boundaries = boundaries
         self.segments = segments
         self.default_boundary = default_boundary
+
+        # the last value of a segment is at its end - 1
+        self.segment_locator = SegmentLocator([start for start, _ in self.segments],
+                                              [end - 1 for _, end in self.segments])
         return
 
     def __call__(self, t):
-        segment_index = 0
-
-        for (start, end) in self.segments:
-
-            if (start <= t) and (t <= end - 1):
+        segment_index, is_inside = self.segment_locator.locate(t)
 
-                # We are inside a segment and thus know the boundaries
-                current_segment_values = self.boundaries[segment_index]
+        if is_inside:
+            start, end = self.segments[segment_index]
 
-                t0 = int(math.floor(t))  # linear interpolation between each of the elements
-                t1 = t0 + 1  # spaced by 1 sec
+            # We are inside a segment and thus know the boundaries
+            current_segment_values = self.boundaries[segment_index]
 
-                if (t == end - 1):
-                    assert(current_segment_values[int(t) - int(start)] == current_segment_values[-1])
-                    return current_segment_values[int(t) - int(start)]
+            t0 = int(math.floor(t))  # linear interpolation between each of the elements
+            t1 = t0 + 1  # spaced by 1 sec
 
-                return linear_interpolation(t,
-                                            t0, t1,
-                                            current_segment_values[t0 - int(start)], current_segment_values[t1 - int(start)])
+            if (t == end - 1):
+                assert(current_segment_values[int(t) - int(start)] == current_segment_values[-1])
+                return current_segment_values[int(t) - int(start)]
 
-            elif (t < start):
-                if segment_index == 0:
-                    # In this case, we are before the first segment
-                    # Return the default boundary.
-                    return self.default_boundary
+            return linear_interpolation(t,
+                                        t0, t1,
+                                        current_segment_values[t0 - int(start)], current_segment_values[t1 - int(start)])
 
-                else:
-                    # We are between two segments and thus have to interpolate
-                    t0 = self.segments[segment_index - 1][1]  # End of last segment
-                    t1 = self.segments[segment_index][0]  # Start of new segment
+        elif segment_index == 0:
+            # In this case, we are before the first segment
+            # Return the default boundary.
+            return self.default_boundary
 
-                    boundary0 = self.boundaries[segment_index - 1][-1]  # value at the end of the segment
-                    boundary1 = self.boundaries[segment_index][0]  # value at the beginning of the segment
+        elif segment_index < len(self.segments):
+            # We are between two segments and thus have to interpolate
+            t0 = self.segments[segment_index - 1][1]  # End of last segment
+            t1 = self.segments[segment_index][0]  # Start of new segment
 
-                    lerped_boundary = linear_interpolation(t, t0, t1, boundary0, boundary1)
+            boundary0 = self.boundaries[segment_index - 1][-1]  # value at the end of the segment
+            boundary1 = self.boundaries[segment_index][0]  # value at the beginning of the segment
 
-                    return lerped_boundary
+            lerped_boundary = linear_interpolation(t, t0, t1, boundary0, boundary1)
 
-            segment_index += 1
+            return lerped_boundary
 
         # We are behind the last computed segment, since we have no end value to
         # interpolate, we just return the bounds of the last computed segment
@@ -18,6 +18,8 @@ import logging
 
 from moviepy.editor import AudioFileClip
 from ...editing.layout import createFinalVideo, default_layout as video_default_layout
+from ...editing.rendering import get_encoding_settings
+from ....util.parallel import limited_resource
 
 logger = logging.getLogger()
 
@@ -37,6 +39,12 @@ class ClipsToMovie(Job):
     * ``output_video_file`` name (without folder) of the output video.
     * ``output_video_folder`` folder where the videos are stored. This value is not cached for the same rationale as the
       other parameters.
+    * ``video_encoding_profile`` the name of the profile of the encoder (see :py:data:`encoding_profiles
+      <livius.video.editing.rendering.encoding_profiles>`). Defaults to ``default``.
+    * ``video_encoding_<setting>`` overrides the setting ``<setting>`` of the profile, eg.
+      ``--option video_encoding_crf=20``.
+    * ``render_nb_processes`` number of processes rendering the video by time chunks (not cached). Defaults to 1
+      (see :py:func:`write_video_in_chunks <livius.video.editing.rendering.write_video_in_chunks>`).
 
     .. rubric:: Workflow input
 
@@ -48,6 +56,12 @@ class ClipsToMovie(Job):
 
     The metadata feed is a dictionaty containing the informations about the video.
 
+    .. note::
+
+       The encoding is performed under the resource ``'video_encoding'``, which limits the number of concurrent
+       encodings when several videos are processed in parallel (see
+       :py:func:`limited_resource <livius.util.parallel.limited_resource>`).
+
     """
 
     #: name of the job in the workflow
@@ -63,12 +77,17 @@ class ClipsToMovie(Job):
     #:   python livius package.
     #: * ``video_layout`` the layout of the final video. See :py:func:`createFinalVideo <livius.video.editing.layout.createFinalVideo>` for a description
     #:   of the layout.
+    #: * ``video_encoding_profile`` the name of the profile of the encoder
+    #: * ``video_encoding`` the settings of the encoder (profile and overrides). Changing those settings
+    #:   reencodes the video without recomputing the parents.
     attributes_to_serialize = ['output_video_file',
                                'video_filename',
                                'slide_clip_desired_format',
                                'background_image_name',
                                'credit_image_names',
-                               'video_layout']
+                               'video_layout',
+                               'video_encoding_profile',
+                               'video_encoding']
 
     #: Cached output:
     #:
@@ -113,6 +132,12 @@ class ClipsToMovie(Job):
         self.output_video_folder = unicode(kwargs.get('output_video_folder', self.get_output_video_folder()))
         self.output_video_file = kwargs.get('output_video_file', self.get_output_video_file())
         self.is_test = kwargs.get('is_visual_test', False)
+        self.render_nb_processes = int(kwargs.get('render_nb_processes', 1))
+
+        self.video_encoding_profile = unicode(kwargs.get('video_encoding_profile', 'default'))
+        encoding_overrides = dict((k[len('video_encoding_'):], v) for k, v in kwargs.items()
+                                  if k.startswith('video_encoding_') and k != 'video_encoding_profile')
+        self.video_encoding = get_encoding_settings(self.video_encoding_profile, encoding_overrides)
 
         self.video_intro_images_folder = None  # not cached, hence not created automatically
         if 'video_intro_images_folder' in kwargs:
@@ -210,23 +235,26 @@ class ClipsToMovie(Job):
         if audio_clip is None:
             audio_clip = AudioFileClip(input_video)
 
-        createFinalVideo(slide_clip=slide_clip,
-                         speaker_clip=speaker_clip,
-                         audio_clip=audio_clip,
-                         video_background_image=video_background_image,
-                         intro_image_and_durations=intro_images_and_durations,
-                         credit_images_and_durations=credit_images_and_durations,
-                         fps=30,
-                         talk_title=meta['talk_title'] if meta is not None else 'title',
-                         speaker_name=meta['speaker_name'] if meta is not None else 'name',
-                         talk_date=meta['talk_date'] if meta is not None else 'today',
-                         first_segment_duration=10,
-                         pauses=pauses,
-                         output_file_name=output_video_no_container,
-                         codecFormat='libx264',
-                         container=self.get_container(),
-                         flagWrite=True,
-                         is_test=self.is_test)
+        with limited_resource('video_encoding'):
+            createFinalVideo(slide_clip=slide_clip,
+                             speaker_clip=speaker_clip,
+                             audio_clip=audio_clip,
+                             video_background_image=video_background_image,
+                             intro_image_and_durations=intro_images_and_durations,
+                             credit_images_and_durations=credit_images_and_durations,
+                             fps=self.video_encoding['fps'],
+                             talk_title=meta['talk_title'] if meta is not None else 'title',
+                             speaker_name=meta['speaker_name'] if meta is not None else 'name',
+                             talk_date=meta['talk_date'] if meta is not None else 'today',
+                             first_segment_duration=10,
+                             pauses=pauses,
+                             output_file_name=output_video_no_container,
+                             codecFormat=self.video_encoding['codec'],
+                             container=self.get_container(),
+                             flagWrite=True,
+                             is_test=self.is_test,
+                             nb_render_processes=self.render_nb_processes,
+                             encoding=self.video_encoding)
 
         # stop time
         stop = datetime.datetime.now()
@@ -2,11 +2,14 @@
 Dummy clip
 ==========
 
-This file contains one unique Job for creating a dummy mmoviePy clip.
+This file contains the Jobs for creating a dummy mmoviePy clip, and the clips of the original video.
 
 .. autosummary::
 
   RandomImageClipJob
+  SourceVideoClipJob
+  OriginalVideoClipJob
+  ProcessLocalVideoReader
 
 """
 
@@ -75,6 +78,91 @@ class RandomImageClipJob(Job):
         return clip
 
 
+class ProcessLocalVideoReader(object):
+    """Video reader of a clip, reopening the video file in each process using it.
+
+    The processes forked from the process that opened the video (eg. for rendering the video by chunks, see
+    :py:mod:`rendering <livius.video.editing.rendering>`) inherit the reader and its ffmpeg process. Each
+    process hence opens its own reader on its first access. The inherited readers are kept untouched, as
+    closing them would terminate the ffmpeg process of the parent.
+
+    :param reader: the reader of the clip (``FFMPEG_VideoReader``) in the current process
+    """
+
+    def __init__(self, reader):
+        self.readers = {os.getpid(): reader}
+        self.filename = reader.filename
+        self.pix_fmt = reader.pix_fmt
+
+    def get_reader(self):
+        """Returns the reader of the current process"""
+        pid = os.getpid()
+        if pid not in self.readers:
+            from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader
+            self.readers[pid] = FFMPEG_VideoReader(self.filename, pix_fmt=self.pix_fmt)
+        return self.readers[pid]
+
+    def get_frame(self, t):
+        return self.get_reader().get_frame(t)
+
+    def __getattr__(self, name):
+        if name in ('readers', 'filename', 'pix_fmt'):
+            raise AttributeError(name)
+        return getattr(self.get_reader(), name)
+
+
+class SourceVideoClipJob(Job):
+    """
+    Opens the video file once for all the clips derived from the original video.
+
+    The slide and speaker clips are derived from the clip returned by this Job. As they share the same
+    reader, each frame of the video is decoded once per output frame even though it is used by both clips (the reader
+    keeps the last decoded frame).
+
+    .. rubric:: Runtime parameters
+
+    * ``video_filename`` and ``video_location`` the video file
+
+    .. rubric:: Workflow inputs
+
+    None
+
+    .. rubric:: Workflow outputs
+
+    MoviePy VideoFileClip of the original video, the same object being returned on each call. The video
+    file is reopened by each process using the clip (see :py:class:`ProcessLocalVideoReader`).
+    """
+
+    #: name of the job in the workflow
+    name = 'source_video_clip'
+
+    #: Nothing to cache, the generated output is a moviepy object
+    #: that is accessed lazily.
+    attributes_to_serialize = []
+
+    def __init__(self, *args, **kwargs):
+        super(SourceVideoClipJob, self).__init__(*args, **kwargs)
+
+        assert('video_location' in kwargs and self.video_location is not None)
+        assert('video_filename' in kwargs and self.video_filename is not None)
+
+        self.clip = None
+
+    def run(self, *args, **kwargs):
+        pass
+
+    def get_outputs(self):
+        super(SourceVideoClipJob, self).get_outputs()
+
+        # the clip is shared by the Jobs run concurrently, which should not open the video twice
+        with self._outputs_lock:
+            if self.clip is None:
+                clip = VideoFileClip(os.path.join(self.video_location, self.video_filename))
+                clip.reader = ProcessLocalVideoReader(clip.reader)
+                self.clip = clip
+        return self.clip
+
+
 class OriginalVideoClipJob(Job):
     """
     Creates a moviePy clip containing the original video.
@@ -83,7 +171,7 @@ class OriginalVideoClipJob(Job):
 
     .. rubric:: Workflow inputs
 
-    None
+    The clip of the original video (:py:class:`SourceVideoClipJob`), shared with the other clips.
 
     .. rubric:: Workflow outputs
 
@@ -101,6 +189,8 @@ class OriginalVideoClipJob(Job):
     #: that is accessed lazily.
     attributes_to_serialize = []
 
+    parents = [SourceVideoClipJob]
+
     def __init__(self, *args, **kwargs):
         """
         :param tuple original_video_clip_size: indicates the size of the video. Default to
@@ -120,7 +210,7 @@ class OriginalVideoClipJob(Job):
 
     def get_outputs(self):
         super(OriginalVideoClipJob, self).get_outputs()
-        clip = VideoFileClip(os.path.join(self.video_location, self.video_filename))
+        clip = self.source_video_clip.get_outputs()
         if(self.frame_size is not None):
             clip = clip.resize(self.frame_size)
         return clip
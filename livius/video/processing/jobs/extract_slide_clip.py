@@ -9,6 +9,7 @@ callable object suitable for MoviePy.
 
 .. autosummary::
 
+  SlideWarper
   WarpSlideJob
   EnhanceContrastJob
   ExtractSlideClipJob
@@ -19,15 +20,96 @@ from ..job import Job
 
 import cv2
 import numpy as np
-import os
-
-from moviepy.editor import VideoFileClip
 
 from .histogram_computation import SelectSlide
 from .contrast_enhancement_boundaries import ContrastEnhancementBoundaries
+from .dummy_clip import SourceVideoClipJob
 
 from ....util.tools import get_transformation_points_from_normalized_rect, \
     get_polygon_outer_bounding_box
+from ....util.histogram import HistogramStretching
+
+
+class SlideWarper(object):
+    """Callable object for warping the frame into perspective and cropping the slides.
+
+    The perspective transformation depends only on the slide location and on the size of the frames: it is
+    computed once per frame size.
+
+    :param slide_rect: the location of the slides in normalized coordinates ``[x, y, width, height]``
+    :param desired_layout: the size ``(width, height)`` of the warped slides
+    :param str method: ``'perspective'`` for warping with :py:func:`cv2.warpPerspective`, ``'remap'`` for
+      warping with :py:func:`cv2.remap` and a precomputed grid of the source location of each output pixel.
+    :param bool reuse_output: if ``True``, the slides are warped in the same buffer on each call, the returned
+      image being valid until the next call only.
+    """
+
+    #: The available warping methods
+    methods = ['perspective', 'remap']
+
+    def __init__(self, slide_rect, desired_layout, method='perspective', reuse_output=False):
+        if method not in self.methods:
+            raise RuntimeError('Unknown slide warping method %s (should be one of %s)' % (method, ', '.join(self.methods)))
+
+        self.slide_rect = slide_rect
+
+        # @note(Stephan): Convert to tuple (List is for JSON storage)
+        self.desired_layout = tuple(desired_layout)
+        self.method = method
+        self.reuse_output = reuse_output
+
+        # transformations indexed by the size of the frames
+        self.transformations = {}
+        self.output = None
+
+    def get_transformation(self, image_shape):
+        """Returns the perspective transformation from the frames of shape ``image_shape`` to the slides.
+
+        For the ``'remap'`` method, the returned value is the pair of maps given to :py:func:`cv2.remap`.
+        """
+        frame_size = tuple(image_shape[:2])
+        transformation = self.transformations.get(frame_size, None)
+        if transformation is not None:
+            return transformation
+
+        # Extract Slides
+        slideShow = np.array([[0, 0],
+                              [self.desired_layout[0] - 1, 0],
+                              [self.desired_layout[0] - 1, self.desired_layout[1] - 1],
+                              [0, self.desired_layout[1] - 1]],
+                             np.float32)
+
+        # only the shape of the image is used
+        slide_coordinates = get_transformation_points_from_normalized_rect(self.slide_rect,
+                                                                           np.empty(frame_size, dtype=np.uint8))
+        transformation = cv2.getPerspectiveTransform(slide_coordinates, slideShow)
+
+        if self.method == 'remap':
+            # location in the frame of each pixel of the slides
+            width, height = self.desired_layout
+            grid = np.mgrid[0:height, 0:width][::-1].transpose(1, 2, 0).astype(np.float32)
+            source_points = cv2.perspectiveTransform(grid.reshape(-1, 1, 2), np.linalg.inv(transformation))
+            transformation = cv2.convertMaps(source_points.reshape(height, width, 2), None, cv2.CV_16SC2)
+
+        self.transformations[frame_size] = transformation
+        return transformation
+
+    def __call__(self, image):
+        """Cut out the slides from the video and warps them into perspective."""
+        transformation = self.get_transformation(image.shape)
+
+        output = None
+        if self.reuse_output:
+            output_shape = (self.desired_layout[1], self.desired_layout[0]) + image.shape[2:]
+            if self.output is None or self.output.shape != output_shape or self.output.dtype != image.dtype:
+                self.output = np.empty(output_shape, dtype=image.dtype)
+            output = self.output
+
+        if self.method == 'remap':
+            map1, map2 = transformation
+            return cv2.remap(image, map1, map2, cv2.INTER_LINEAR, dst=output)
+
+        return cv2.warpPerspective(image, transformation, self.desired_layout, dst=output)
 
 
 class WarpSlideJob(Job):
@@ -37,6 +119,8 @@ class WarpSlideJob(Job):
     .. rubric:: Runtime parameters
 
     * ``slide_clip_desired_format`` the output size of the slide images for the composite video.
+    * ``slide_warp_method`` the warping method of :py:class:`SlideWarper` (not cached). Defaults to
+      ``perspective``.
 
     .. rubric:: Workflow inputs
 
@@ -51,7 +135,8 @@ class WarpSlideJob(Job):
 
         img -> img
 
-    which applies the desired slide transformation.
+    which applies the desired slide transformation (see :py:class:`SlideWarper`). The returned
+    image is overwritten by the next call.
     """
 
     #: name of the job in the workflow
@@ -71,6 +156,7 @@ class WarpSlideJob(Job):
         super(WarpSlideJob, self).__init__(*args, **kwargs)
 
         assert('slide_clip_desired_format' in kwargs)
+        self.slide_warp_method = kwargs.get('slide_warp_method', 'perspective')
 
     def run(self, *args, **kwargs):
         pass
@@ -81,33 +167,11 @@ class WarpSlideJob(Job):
         slide_location = self.select_slides.get_outputs()
         slide_rect = get_polygon_outer_bounding_box(slide_location)
 
-        class Warper(object):
-
-            """Callable object for warping the frame into perspective and cropping the slides."""
-
-            def __init__(self, slide_rect, desiredLayout):
-                self.slide_rect = slide_rect
-
-                # @note(Stephan): Convert to tuple (List is for JSON storage)
-                self.desiredLayout = tuple(desiredLayout)
-
-            def __call__(self, image):
-                """Cut out the slides from the video and warps them into perspective."""
-                # Extract Slides
-                slideShow = np.array([[0, 0],
-                                      [self.desiredLayout[0] - 1, 0],
-                                      [self.desiredLayout[0] - 1, self.desiredLayout[1] - 1],
-                                      [0, self.desiredLayout[1] - 1]],
-                                     np.float32)
-
-                slide_coordinates = get_transformation_points_from_normalized_rect(slide_rect, image)
-                retval = cv2.getPerspectiveTransform(slide_coordinates, slideShow)
-                warp = cv2.warpPerspective(image, retval, self.desiredLayout)
-
-                # Return slide image
-                return warp
-
-        return Warper(slide_rect, self.slide_clip_desired_format)
+        # the warped slides are consumed by the contrast enhancement before the next frame
+        return SlideWarper(slide_rect,
+                           self.slide_clip_desired_format,
+                           method=self.slide_warp_method,
+                           reuse_output=True)
 
 
 class EnhanceContrastJob(Job):
@@ -127,7 +191,8 @@ class EnhanceContrastJob(Job):
 
         img, t -> img
 
-    which enhances the contrast of the given image at time t.
+    which enhances the contrast of the given image at time t. The returned image is overwritten
+    by the next call.
     """
 
     #: name of the job in the workflow
@@ -157,6 +222,11 @@ class EnhanceContrastJob(Job):
                 self.get_min_bounds = get_min_bounds
                 self.get_max_bounds = get_max_bounds
 
+                # the mapping of the colors depends only on the boundaries: it is applied
+                # with lookup tables, kept for the recent boundaries. The frames are composed
+                # before the next one is requested, which allows reusing the output buffer.
+                self.histogram_stretching = HistogramStretching(reuse_output=True)
+
             def __call__(self, image, t):
                 """Perform contrast enhancement by putting the colors into their full range."""
                 # Retrieve histogram boundaries for this frame
@@ -169,11 +239,7 @@ class EnhanceContrastJob(Job):
                 # those two boundaries define a cube in which we strech the R, G, B.
 
                 # Perform the contrast enhancement
-                contrast_enhanced = (np.maximum(image.astype(np.float32) - min_val, 0)) * (255.0 / (max_val - min_val))
-                contrast_enhanced = np.minimum(contrast_enhanced, 255.0)
-                im_rgb = contrast_enhanced.astype(np.uint8)
-
-                return im_rgb
+                return self.histogram_stretching(image, min_val, max_val)
 
         return ContrastEnhancer(get_min_bounds, get_max_bounds)
 
@@ -188,6 +254,9 @@ class ExtractSlideClipJob(Job):
 
     * A function for warping the Slides into perspective (:py:class:`WarpSlideJob`)
     * A function for enhancing the contrast of the warped Slides (:py:class:`EnhanceContrastJob`)
+    * The clip of the original video (:py:class:`SourceVideoClipJob
+      <livius.video.processing.jobs.dummy_clip.SourceVideoClipJob>`), shared with the speaker clip so that
+      each frame is decoded once
 
     .. rubric:: Workflow outputs
 
@@ -200,7 +269,7 @@ class ExtractSlideClipJob(Job):
     #: name of the job in the workflow
     name = 'extract_slide_clip'
     attributes_to_serialize = ['video_filename']
-    parents = [WarpSlideJob, EnhanceContrastJob]
+    parents = [WarpSlideJob, EnhanceContrastJob, SourceVideoClipJob]
 
     def __init__(self, *args, **kwargs):
         super(ExtractSlideClipJob, self).__init__(*args, **kwargs)
@@ -217,7 +286,7 @@ class ExtractSlideClipJob(Job):
         enhance_contrast = self.enhance_contrast.get_outputs()
 
         # not doing the cut here but rather in the final video composition
-        clip = VideoFileClip(os.path.join(self.video_location, self.video_filename))
+        clip = self.source_video_clip.get_outputs()
 
         def apply_effects(get_frame, t):
             """Function that chains together all the post processing effects."""
@@ -4,7 +4,8 @@ FFMpeg To Thumbnails
 
 This module defines the FFMpeg job that transforms a video file into a sequence of thumbnail images.
 
-Those thumbnails are more suitable for analysis.
+Those thumbnails are more suitable for analysis. By default, the thumbnails are not written to disk but
+decoded on the fly (see :py:mod:`livius.video.processing.frame_source`).
 
 .. autosummary::
 
@@ -14,32 +15,34 @@ Those thumbnails are more suitable for analysis.
 """
 
 import os
-import subprocess
-import time
 from ..job import Job
+from ..frame_source import FFMpegFrameSource, MemmapFrameSource, write_memmap_frames, get_video_information
+from ....util.ffmpeg_runner import run_ffmpeg, ProgressLogger
 
 
-def extract_thumbnails(video_file_name, output_width, output_folder):
+def extract_thumbnails(video_file_name, output_width, output_folder, duration=None, timeout=None):
     """Extract the thumbnails using FFMpeg.
 
+    The progress is logged (see :py:func:`run_ffmpeg <livius.util.ffmpeg_runner.run_ffmpeg>`).
+
     :param video_file_name: name of the video file to process
     :param output_width: width of the resized images
     :param output_folder: folder where the thumbnails are stored
-
+    :param duration: the duration of the video in seconds, for estimating the remaining time
+    :param timeout: the maximal duration of the extraction in seconds
+    :raises RuntimeError: if ffmpeg fails or does not complete before the timeout
     """
-    args = ['ffmpeg',
+    args = ['ffmpeg', '-v', 'error',
             '-i', os.path.abspath(video_file_name),
             '-r', '1',
             '-vf', 'scale=%d:-1' % output_width,
             '-f', 'image2', '%s/frame-%%05d.png' % os.path.abspath(output_folder)]
-    proc = subprocess.Popen(args)
 
-    return_code = proc.poll()
-    while return_code is None:
-        time.sleep(1)
-        return_code = proc.poll()
-
-    return
+    return run_ffmpeg(args,
+                      progress_callback=ProgressLogger('thumbnails of %s' % os.path.basename(video_file_name)),
+                      duration=duration,
+                      timeout=timeout,
+                      description='thumbnails of %s' % os.path.basename(video_file_name))
 
 
 class FFMpegThumbnailsJob(Job):
@@ -53,7 +56,16 @@ class FFMpegThumbnailsJob(Job):
 
     .. rubric:: Workflow output
 
-    * A list of absolute filenames that specify the generated thumbnails. This list is sorted.
+    * if ``thumbnails_format`` is ``'stream'`` (default), a
+      :py:class:`FFMpegFrameSource <livius.video.processing.frame_source.FFMpegFrameSource>` decoding the
+      thumbnails from the video.
+    * if ``thumbnails_format`` is ``'png'``, a list of absolute filenames that specify the generated
+      thumbnails. This list is sorted. The PNG files are useful for debugging, but encoding and decoding them
+      is costly.
+    * if ``thumbnails_format`` is ``'raw'``, a
+      :py:class:`MemmapFrameSource <livius.video.processing.frame_source.MemmapFrameSource>` mapping in memory
+      the thumbnails decoded once into a single file. This avoids decoding the video for each analysis, and
+      the thousands of small files of the ``'png'`` format (eg. on network filesystems).
 
     .. note::
 
@@ -70,14 +82,28 @@ class FFMpegThumbnailsJob(Job):
     #: * ``video_width`` width of the generated thumbnails
     #: * ``video_fps`` framerate of the thumbnails
     #: * ``thumbnails_location`` location of the thumbnails relative to the thumbnail root.
+    #: * ``thumbnails_format`` one of ``'stream'``, ``'png'`` or ``'raw'``
+    #: * ``video_file_size`` size of the video file in bytes: the thumbnails are extracted again if the
+    #:   recording changes (eg. if it is extended)
     attributes_to_serialize = ['video_filename',
                                'video_fps',
                                'video_width',
-                               'thumbnails_location']
+                               'thumbnails_location',
+                               'thumbnails_format',
+                               'video_file_size']
     #: Cached outputs:
     #:
-    #: * ``thumbnail_files`` list of generated files, relative to the thumbnail root
-    outputs_to_cache = ['thumbnail_files']
+    #: * ``thumbnail_files`` list of generated files, relative to the thumbnail root (``'png'`` and ``'raw'``
+    #:   formats only)
+    #: * ``stream_parameters`` size and number of the frames (``'stream'`` and ``'raw'`` formats only)
+    outputs_to_cache = ['thumbnail_files',
+                        'stream_parameters']
+
+    #: The available formats for the thumbnails
+    thumbnails_formats = ['stream', 'png', 'raw']
+
+    #: Name of the raw file of the thumbnails (``'raw'`` format)
+    raw_thumbnails_filename = 'frames.raw'
 
     def get_thumbnail_root(self):
         """Indicates the root where files are stored. Currently in the parent folder of the json files"""
@@ -103,6 +129,13 @@ class FFMpegThumbnailsJob(Job):
           Default given by :py:func:`get_thumbnail_location`.
         :param int video_width: the width of the generated thumbnails. Defaults to `640`.
         :param int video_fps: how many frames per second to extract. Default to `1`.
+        :param str thumbnails_format: ``'stream'`` (default) for decoding the thumbnails on the fly, ``'png'``
+          for writing the thumbnails to PNG files, or ``'raw'`` for writing the thumbnails to a single
+          memory-mapped file.
+        :param float ffmpeg_timeout: the maximal duration of the extraction of the PNG files in seconds, and
+          for the ``'stream'`` and ``'raw'`` formats the maximal time spent waiting for each frame decoded by
+          ffmpeg (see :py:class:`FFMpegFrameSource <livius.video.processing.frame_source.FFMpegFrameSource>`).
+          This parameter is not cached, and defaults to no limit.
         """
         super(FFMpegThumbnailsJob, self).__init__(*args, **kwargs)
 
@@ -120,6 +153,8 @@ class FFMpegThumbnailsJob(Job):
             raise RuntimeError("The video file %s does not exist" %
                                os.path.abspath(os.path.join(self.video_location, self.video_filename)))
 
+        self.video_file_size = os.path.getsize(self._get_video_file())
+
         # Put in default values if they are not passed in the kwargs
         self.video_width = kwargs.get('video_width', 640)
         self.video_fps = kwargs.get('video_fps', 1)
@@ -132,21 +167,55 @@ class FFMpegThumbnailsJob(Job):
 
         self.thumbnails_location = unicode(self.thumbnails_location)  # same issue as for the video filename
 
+        self.thumbnails_format = unicode(kwargs.get('thumbnails_format', 'stream'))
+        if self.thumbnails_format not in self.thumbnails_formats:
+            raise RuntimeError("Unsupported thumbnails format %s" % self.thumbnails_format)
+
+        self.ffmpeg_timeout = float(kwargs['ffmpeg_timeout']) if kwargs.get('ffmpeg_timeout', None) else None
+
+    def _get_video_file(self):
+        return os.path.abspath(os.path.join(self.video_location, self.video_filename))
+
     def run(self, *args, **kwargs):
 
         if self.is_up_to_date():
             return True
 
+        if self.thumbnails_format in ('stream', 'raw'):
+            frame_source = FFMpegFrameSource.from_video(self._get_video_file(),
+                                                        width=int(self.video_width),
+                                                        fps=self.video_fps,
+                                                        timeout=self.ffmpeg_timeout)
+            self.thumbnail_files = []
+            self.stream_parameters = {'width': frame_source.width,
+                                      'height': frame_source.height,
+                                      'nb_frames': frame_source.nb_frames}
+
+        if self.thumbnails_format == 'stream':
+            return
+
         thumb_final_directory = os.path.join(self.thumbnail_root, self.thumbnails_location)
         if not os.path.exists(thumb_final_directory):
             os.makedirs(thumb_final_directory)
 
-        extract_thumbnails(video_file_name=os.path.abspath(os.path.join(self.video_location, self.video_filename)),
+        if self.thumbnails_format == 'raw':
+            # the video is decoded once into the raw file
+            self.thumbnail_files = [os.path.join(self.thumbnails_location, self.raw_thumbnails_filename)]
+            write_memmap_frames(os.path.join(self.thumbnail_root, self.thumbnail_files[0]),
+                                frame_source,
+                                fps=frame_source.fps)
+            return
+
+        _, _, duration = get_video_information(self._get_video_file())
+        extract_thumbnails(video_file_name=self._get_video_file(),
                            output_width=self.video_width,
-                           output_folder=thumb_final_directory)
+                           output_folder=thumb_final_directory,
+                           duration=duration,
+                           timeout=self.ffmpeg_timeout)
 
         # save the output files
         self.thumbnail_files = self._get_files()
+        self.stream_parameters = {}
 
     def _get_files(self):
         """Returns the list of thumbnails, relative to the thumbnail root"""
@@ -161,8 +230,21 @@ class FFMpegThumbnailsJob(Job):
         return possible_output
 
     def get_outputs(self):
-        """Returns the list of thumbnail files (absolute paths)"""
+        """Returns the frame source of the thumbnails, or the list of thumbnail files (absolute paths)
+        for the ``'png'`` format."""
         super(FFMpegThumbnailsJob, self).get_outputs()
+
+        if self.thumbnails_format == 'stream':
+            return FFMpegFrameSource(self._get_video_file(),
+                                     width=self.stream_parameters['width'],
+                                     height=self.stream_parameters['height'],
+                                     fps=self.video_fps,
+                                     nb_frames=self.stream_parameters['nb_frames'],
+                                     timeout=self.ffmpeg_timeout)
+
+        if self.thumbnails_format == 'raw':
+            return MemmapFrameSource(os.path.join(self.thumbnail_root, self.thumbnail_files[0]))
+
         return [os.path.abspath(os.path.join(self.thumbnail_root, i)) for i in self._get_files()]
 
 
@@ -173,7 +255,7 @@ class NumberOfFilesJob(Job):
 
     .. rubric:: Workflow input
 
-    The output of :py:class:`FFMpegThumbnailsJob`
+    The output of :py:class:`FFMpegThumbnailsJob` (list of files or frame source)
 
     .. rubric:: Workflow output
 
@@ -0,0 +1,511 @@
+"""
+Frame Analysis
+==============
+
+This module provides a Job computing all the per-frame features of the thumbnails in one pass: each
+frame is read (or decoded) once, and its color conversions are shared between the features.
+
+The features computed by default are:
+
+* the histograms of the LAB difference images (see
+  :py:class:`HistogramsLABDiff <livius.video.processing.jobs.histogram_computation.HistogramsLABDiff>`)
+* the boundaries for the contrast enhancement of the slides (see
+  :py:class:`ContrastEnhancementBoundaries <livius.video.processing.jobs.contrast_enhancement_boundaries.ContrastEnhancementBoundaries>`)
+
+Those are exposed to the downstream Jobs by :py:class:`HistogramsLABDiffFromAnalysis` and
+:py:class:`ContrastEnhancementBoundariesFromAnalysis`, that have the same outputs as the Jobs they replace
+in the workflow. Their names differ from those of the replaced Jobs, of which they do not share the state files.
+
+Other features may be added with :py:func:`FrameAnalysisJob.register_feature`.
+
+.. autosummary::
+
+  FrameAnalysisJob
+  HistogramsLABDiffFromAnalysis
+  ContrastEnhancementBoundariesFromAnalysis
+  FrameFeature
+  FrameConversions
+  LABDiffHistogramsFeature
+  SlideContrastBoundariesFeature
+
+"""
+
+import itertools
+
+import cv2
+import numpy as np
+
+from ..job import Job
+from ..frame_source import as_frame_source
+from ..checkpoint import FrameCheckpoint, default_checkpoint_interval
+from ..incremental import PreviousFrameOutputs
+from ..streaming import get_range_reader
+from ....util.tools import get_polygon_outer_bounding_box
+from ....util.parallel import get_nb_workers, get_chunk_size, process_pool
+from .ffmpeg_to_thumbnails import FFMpegThumbnailsJob
+from .histogram_computation import GenerateHistogramAreas, LABDifference, AreaHistograms, \
+    get_area_histograms_functor
+from .contrast_enhancement_boundaries import get_min_max_boundary
+from .select_polygon import SelectSlide
+
+
+class FrameConversions(object):
+    """Color conversions of one frame, computed on demand and shared by the features.
+
+    :param frame: the frame in BGR
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._conversions = {}
+
+    def get(self, code):
+        """Returns the frame converted with the OpenCV color conversion ``code`` (eg. ``cv2.COLOR_BGR2LAB``)"""
+        if code not in self._conversions:
+            self._conversions[code] = cv2.cvtColor(self.frame, code)
+        return self._conversions[code]
+
+    @property
+    def lab(self):
+        """The frame in the LAB color space"""
+        return self.get(cv2.COLOR_BGR2LAB)
+
+    @property
+    def gray(self):
+        """The frame in grayscale"""
+        return self.get(cv2.COLOR_BGR2GRAY)
+
+
+class FrameFeature(object):
+    """Base class of the features computed by :py:class:`FrameAnalysisJob` on each frame.
+
+    :param job: the :py:class:`FrameAnalysisJob` instance, giving access to the parameters and inputs
+    :param nb_frames: the number of frames
+    """
+
+    #: Name of the feature, used as key in the outputs of :py:class:`FrameAnalysisJob`
+    name = None
+
+    #: ``True`` if the feature implements :py:func:`get_checkpoint` and :py:func:`restore_checkpoint`.
+    #: The checkpoints and the processing of the frames by several processes are disabled if one of the
+    #: features of the Job does not.
+    supports_checkpoints = False
+
+    #: ``True`` if the feature implements :py:func:`reuse_frames`. All the frames are processed by the
+    #: features that do not.
+    supports_reuse = False
+
+    #: Number of preceding frames on which the result of a frame depends (eg. ``1`` for the difference of
+    #: two consecutive frames). Those frames are read before the first processed frame.
+    nb_preceding_frames = 0
+
+    #: Indices of the frames on which the results of all the frames depend (eg. ``[0]`` for the differences
+    #: with the first frame). Those frames are given to :py:func:`resume_frame` before the first processed
+    #: frame, if they precede it.
+    reference_frames = []
+
+    def __init__(self, job, nb_frames):
+        self.job = job
+        self.nb_frames = nb_frames
+
+    def process_frame(self, index, conversions):
+        """Processes the frame ``index`` given by its :py:class:`FrameConversions`."""
+        raise NotImplementedError
+
+    def get_result(self):
+        """Returns the result of the feature after all the frames were processed."""
+        raise NotImplementedError
+
+    def get_checkpoint(self, start, stop):
+        """Returns the values of the frames ``start`` to ``stop`` (excluded) to store in a checkpoint, once the
+        ``stop`` first frames were processed. The frames before ``start`` are stored by the previous checkpoints."""
+        raise NotImplementedError
+
+    def restore_checkpoint(self, values, start, stop):
+        """Restores the values returned by :py:func:`get_checkpoint` for the frames ``start`` to ``stop``
+        (excluded), from a checkpoint or from another process."""
+        raise NotImplementedError
+
+    def reuse_frames(self, previous_result, reusable):
+        """Copies the results of the frames processed by the previous run of the Job.
+
+        :param previous_result: the result of this feature in the previous run
+        :param dict reusable: the frames ``{index: previous_index}`` whose results are reused (see
+          :py:func:`get_reusable_frames <livius.video.processing.incremental.PreviousFrameOutputs.get_reusable_frames>`)
+        """
+        raise NotImplementedError
+
+    def resume_frame(self, index, conversions):
+        """Called instead of :py:func:`process_frame` on the frames that are read but not processed (the frames
+        already processed before a checkpoint or by the previous run, or the :py:attr:`reference_frames`).
+        Does nothing by default."""
+        pass
+
+
+class LABDiffHistogramsFeature(FrameFeature):
+    """Histograms of the LAB difference images on the areas given by
+    :py:class:`GenerateHistogramAreas <livius.video.processing.jobs.histogram_computation.GenerateHistogramAreas>`.
+    The differences are computed with the first frame.
+
+    The result is a dictionary containing the ``histograms`` and ``area_names``, as the outputs
+    ``histograms_labdiff`` and ``histogram_area_names`` of
+    :py:class:`HistogramsLABDiff <livius.video.processing.jobs.histogram_computation.HistogramsLABDiff>`.
+    """
+
+    name = 'histograms_labdiff'
+    supports_checkpoints = True
+    supports_reuse = True
+    reference_frames = [0]
+
+    def __init__(self, job, nb_frames):
+        super(LABDiffHistogramsFeature, self).__init__(job, nb_frames)
+
+        self.rectangle_locations = job.rectangle_locations
+        self.area_names = sorted(set(name for name, _ in self.rectangle_locations))
+        self.area_histograms = None
+        self.lab_difference = None
+        self.histograms = np.zeros((nb_frames, len(self.area_names), 256), dtype=np.float32)
+        self.lab_reference = None
+
+    def process_frame(self, index, conversions):
+        # the first frame is the reference of the differences
+        if index == 0:
+            self.resume_frame(index, conversions)
+            return
+
+        if self.area_histograms is None:
+            self.area_histograms = AreaHistograms(self.rectangle_locations, conversions.frame.shape)
+            self.lab_difference = LABDifference(conversions.frame.shape)
+
+        im_diff_lab = self.lab_difference.compute(conversions.lab, self.lab_reference)
+        self.area_histograms.accumulate(im_diff_lab, self.histograms[index])
+
+    def resume_frame(self, index, conversions):
+        # only the reference is converted
+        if index == 0:
+            self.lab_reference = conversions.lab
+
+    def get_result(self):
+        return {'histograms': self.histograms,
+                'area_names': self.area_names}
+
+    def get_checkpoint(self, start, stop):
+        return {'histograms': self.histograms[start:stop]}
+
+    def restore_checkpoint(self, values, start, stop):
+        self.histograms[start:stop] = values['histograms'][:stop - start]
+
+    def reuse_frames(self, previous_result, reusable):
+        indices = sorted(reusable.keys())
+        self.histograms[indices] = previous_result['histograms'][[reusable[index] for index in indices]]
+
+
+class SlideContrastBoundariesFeature(FrameFeature):
+    """Boundaries of the histograms of the slide area, for the contrast enhancement.
+
+    The result is a dictionary containing the ``min_bounds`` and ``max_bounds`` lists, as
+    computed by :py:class:`ContrastEnhancementBoundaries
+    <livius.video.processing.jobs.contrast_enhancement_boundaries.ContrastEnhancementBoundaries>`.
+    """
+
+    name = 'contrast_enhancement_boundaries'
+    supports_checkpoints = True
+    supports_reuse = True
+
+    def __init__(self, job, nb_frames):
+        super(SlideContrastBoundariesFeature, self).__init__(job, nb_frames)
+        self.slide_crop_rect = get_polygon_outer_bounding_box(job.slide_location)
+        self.percentile = job.histogram_contrast_enhancement_percentile
+        self.min_bounds = [None] * nb_frames
+        self.max_bounds = [None] * nb_frames
+
+    def process_frame(self, index, conversions):
+        min_bound, max_bound = get_min_max_boundary(conversions.gray, self.slide_crop_rect, self.percentile)
+        self.min_bounds[index] = min_bound
+        self.max_bounds[index] = max_bound
+
+    def get_result(self):
+        return {'min_bounds': self.min_bounds,
+                'max_bounds': self.max_bounds}
+
+    def get_checkpoint(self, start, stop):
+        return {'min_bounds': self.min_bounds[start:stop],
+                'max_bounds': self.max_bounds[start:stop]}
+
+    def restore_checkpoint(self, values, start, stop):
+        self.min_bounds[start:stop] = values['min_bounds'][:stop - start]
+        self.max_bounds[start:stop] = values['max_bounds'][:stop - start]
+
+    def reuse_frames(self, previous_result, reusable):
+        for index, previous_index in reusable.items():
+            self.min_bounds[index] = previous_result['min_bounds'][previous_index]
+            self.max_bounds[index] = previous_result['max_bounds'][previous_index]
+
+
+# the Jobs being run by several processes, indexed by the key given to the workers
+_frame_analyses = {}
+
+
+def _process_frame_range(args):
+    """Processes a range of frames in a worker, and returns the values of the features for those frames"""
+    analysis_key, start, stop = args
+    job, frames, to_process = _frame_analyses[analysis_key]
+
+    features = [feature_class(job, len(frames)) for feature_class in job.feature_classes]
+    job._process_frames(features, frames, start, stop, to_process)
+    return dict((feature.name, feature.get_checkpoint(start, stop)) for feature in features)
+
+
+class FrameAnalysisJob(Job):
+    """
+    Computes all the per-frame features in one pass over the thumbnails.
+
+    .. rubric:: Runtime parameters
+
+    * ``histogram_contrast_enhancement_percentile`` the percentile (in `[0, 1]`) of the
+      histogram that defines the lower or upper bound of the slide contrast. Defaults to `0.01 (1%)`
+    * ``checkpoint_interval`` the number of frames between two checkpoints of the features (not cached,
+      see :py:mod:`livius.video.processing.checkpoint`). Defaults to 600.
+    * ``nb_processes`` the number of processes analysing the frames (not cached). Defaults to the number
+      of CPUs (see :py:mod:`livius.util.parallel`).
+
+    .. rubric:: Workflow inputs
+
+    * The areas on which the LAB difference histograms are computed (:py:class:`GenerateHistogramAreas
+      <livius.video.processing.jobs.histogram_computation.GenerateHistogramAreas>`)
+    * A list of images (specified by filename) or a frame source
+    * The location of the slides
+
+    .. rubric:: Workflow outputs
+
+    A dictionary containing the result of each feature, indexed by the name of the feature.
+
+    .. rubric:: Complexity
+
+    Linear in the number of thumbnails. Reads (or decodes) each thumbnail image once, and converts it once
+    to each needed color space. The frames are split in ranges analysed by a pool of processes, each
+    range being read from its start (the decoding of a video seeks to the range) after the reference frames. When the Job is run again, only the new or changed frames are processed
+    by the features supporting it (see :py:mod:`livius.video.processing.incremental`).
+    """
+
+    #: Name of the job in the workflow
+    name = 'frame_analysis'
+
+    #: The LAB differences are computed without overflow (version 1). The keys of the frames are stored
+    #: with the features (version 2). The LAB differences are computed with the first frame again (version 3).
+    #: The LAB distances are saturated to the last bin (version 4).
+    version = 4
+
+    parents = [GenerateHistogramAreas, FFMpegThumbnailsJob, SelectSlide]
+
+    #: Cached inputs:
+    #:
+    #: * ``histogram_contrast_enhancement_percentile`` the percentile to keep for computing the boundaries from the histograms
+    #: * ``features`` the names of the computed features
+    attributes_to_serialize = ['histogram_contrast_enhancement_percentile',
+                               'features']
+
+    #: Cached outputs:
+    #:
+    #: * ``frame_features`` the results of the features. The arrays are stored in sidecar files.
+    #: * ``frame_keys`` and ``frame_reuse_key`` identify the frames and the configuration of the features,
+    #:   for reusing them in the next runs (see :py:mod:`livius.video.processing.incremental`)
+    outputs_to_cache = ['frame_features',
+                        'frame_keys',
+                        'frame_reuse_key']
+
+    #: The classes of the features computed by this Job, see :py:func:`register_feature`.
+    feature_classes = [LABDiffHistogramsFeature, SlideContrastBoundariesFeature]
+
+    @classmethod
+    def register_feature(cls, feature_class):
+        """Adds a feature (subclass of :py:class:`FrameFeature`) to the features computed on each frame."""
+        if not issubclass(feature_class, FrameFeature):
+            raise RuntimeError("%r is not a frame feature" % feature_class)
+
+        if feature_class.name in [f.name for f in cls.feature_classes]:
+            raise RuntimeError("A feature with the name %s is already registered" % feature_class.name)
+
+        # not modifying the list of the base class
+        cls.feature_classes = cls.feature_classes + [feature_class]
+
+    def __init__(self, *args, **kwargs):
+        super(FrameAnalysisJob, self).__init__(*args, **kwargs)
+
+        self.histogram_contrast_enhancement_percentile = float(kwargs['histogram_contrast_enhancement_percentile']) if 'histogram_contrast_enhancement_percentile' in kwargs else 0.01
+        self.features = [f.name for f in self.feature_classes]
+        self.checkpoint_interval = int(kwargs.get('checkpoint_interval', default_checkpoint_interval))
+        self.nb_processes = kwargs.get('nb_processes', None)
+
+    def run(self, *args, **kwargs):
+        assert(len(args) >= 3)
+
+        self.rectangle_locations = args[0]
+        frames = as_frame_source(args[1])
+        self.slide_location = args[2]
+
+        nb_frames = len(frames)
+        features = [feature_class(self, nb_frames) for feature_class in self.feature_classes]
+
+        # the results of the frames already processed by the previous run are reused
+        previous = PreviousFrameOutputs(self, frames.get_frame_keys(), inputs=[self.rectangle_locations,
+                                                                               self.slide_location])
+        self.frame_keys, self.frame_reuse_key = previous.frame_keys, previous.reuse_key
+        previous_features = previous.get('frame_features') if previous.state is not None else {}
+
+        reused_frames = {}
+        for feature in features:
+            reusable = {}
+            if feature.supports_reuse and feature.name in previous_features:
+                reusable = previous.get_reusable_frames(feature.nb_preceding_frames, feature.reference_frames)
+                if reusable:
+                    feature.reuse_frames(previous_features[feature.name], reusable)
+            reused_frames[feature.name] = reusable
+        previous = previous_features = None
+
+        # resuming after the last frame of the checkpoint, if any
+        supports_ranges = all(f.supports_checkpoints for f in features)
+        checkpoint = FrameCheckpoint(self, self.checkpoint_interval if supports_ranges else 0)
+        nb_frames_done, checkpoint_values = checkpoint.load()
+        if checkpoint_values is not None:
+            for feature in features:
+                feature.restore_checkpoint(checkpoint_values[feature.name], 0, nb_frames_done)
+
+        to_process = dict((feature.name, set(index for index in xrange(nb_frames_done, nb_frames)
+                                             if index not in reused_frames[feature.name]))
+                          for feature in features)
+
+        def get_checkpoint(start, stop):
+            return dict((feature.name, feature.get_checkpoint(start, stop)) for feature in features)
+
+        # the ranges of frames processed by each worker
+        nb_workers = get_nb_workers(self.nb_processes) if supports_ranges else 1
+        range_size = get_chunk_size(nb_frames - nb_frames_done, nb_workers)
+        if checkpoint.enabled:
+            range_size = min(range_size, checkpoint.interval)
+        frame_ranges = [(start, min(start + range_size, nb_frames))
+                        for start in xrange(nb_frames_done, nb_frames, range_size)
+                        if any(index in to_process[feature.name]
+                               for feature in features
+                               for index in xrange(start, min(start + range_size, nb_frames)))]
+
+        if nb_workers > 1 and len(frame_ranges) > 1:
+            # the workers, forked with the pool, access the Job and the frames from _frame_analyses
+            analysis_key = id(self)
+            _frame_analyses[analysis_key] = (self, frames, to_process)
+            try:
+                with process_pool(nb_workers) as pool:
+                    for (start, stop), values in itertools.izip(
+                            frame_ranges,
+                            pool.imap(_process_frame_range,
+                                      [(analysis_key, start, stop) for start, stop in frame_ranges])):
+                        for feature in features:
+                            feature.restore_checkpoint(values[feature.name], start, stop)
+                        checkpoint.update(stop, get_checkpoint)
+            finally:
+                del _frame_analyses[analysis_key]
+
+        else:
+            self._process_frames(features, frames, nb_frames_done, nb_frames, to_process, checkpoint, get_checkpoint)
+
+        checkpoint.remove()
+
+        self.frame_features = dict((feature.name, feature.get_result()) for feature in features)
+
+    @staticmethod
+    def _process_frames(features, frames, start, stop, to_process, checkpoint=None, get_checkpoint=None):
+        """Processes the frames ``start`` to ``stop`` (excluded) that are in ``to_process`` (the frames to process
+        by each feature). The reading starts with the frames preceding the first processed frame, some features
+        depending on the previous frames, and the reference frames preceding the reading are read beforehand."""
+        to_process = dict((name, set(index for index in indices if start <= index < stop))
+                          for name, indices in to_process.items())
+        first_indices = [min(to_process[feature.name]) - feature.nb_preceding_frames
+                         for feature in features if to_process[feature.name]]
+        if not first_indices:
+            return
+
+        first_index = max(min(first_indices), 0)
+
+        reference_frames = sorted(set(index for feature in features if to_process[feature.name]
+                                      for index in feature.reference_frames if index < first_index))
+        for index in reference_frames:
+            conversions = FrameConversions(frames.get_frame(index))
+            for feature in features:
+                if index in feature.reference_frames:
+                    feature.resume_frame(index, conversions)
+
+        for index, frame in enumerate(frames.iter_from(first_index), first_index):
+            if index >= stop:
+                break
+
+            conversions = FrameConversions(frame)
+            for feature in features:
+                if index in to_process[feature.name]:
+                    feature.process_frame(index, conversions)
+                else:
+                    feature.resume_frame(index, conversions)
+
+            if checkpoint is not None:
+                checkpoint.update(index + 1, get_checkpoint)
+
+    def get_outputs(self):
+        super(FrameAnalysisJob, self).get_outputs()
+
+        if self.frame_features is None:
+            raise RuntimeError('The features of the frames have not been computed yet.')
+
+        return self.frame_features
+
+
+class HistogramsLABDiffFromAnalysis(Job):
+    """Provides the histograms of the LAB difference images computed by :py:class:`FrameAnalysisJob`.
+
+    This Job replaces :py:class:`HistogramsLABDiff
+    <livius.video.processing.jobs.histogram_computation.HistogramsLABDiff>` in a workflow: it has the same
+    output.
+    """
+
+    #: Name of the job in the workflow, distinct from the name of the replaced Job (of which the state
+    #: contains the histograms)
+    name = 'histogram_imlabdiff_from_analysis'
+
+    parents = [FrameAnalysisJob]
+
+    def run(self, *args, **kwargs):
+        pass
+
+    def get_outputs(self):
+        super(HistogramsLABDiffFromAnalysis, self).get_outputs()
+
+        histograms_labdiff = self.frame_analysis.get_outputs()[LABDiffHistogramsFeature.name]
+        return get_area_histograms_functor(histograms_labdiff['histograms'], histograms_labdiff['area_names'],
+                                           self.frame_analysis.frame_keys, self.frame_analysis.frame_reuse_key,
+                                           reader=get_range_reader(histograms_labdiff['histograms']))
+
+    def get_output_reader(self):
+        histograms_labdiff = self.frame_analysis.get_outputs()[LABDiffHistogramsFeature.name]
+        return get_range_reader(histograms_labdiff['histograms'])
+
+
+class ContrastEnhancementBoundariesFromAnalysis(Job):
+    """Provides the boundaries of the slide contrast enhancement computed by :py:class:`FrameAnalysisJob`.
+
+    This Job replaces :py:class:`ContrastEnhancementBoundaries
+    <livius.video.processing.jobs.contrast_enhancement_boundaries.ContrastEnhancementBoundaries>` in a
+    workflow: it has the same outputs.
+    """
+
+    #: Name of the job in the workflow, distinct from the name of the replaced Job (of which the state
+    #: contains the boundaries)
+    name = 'contrast_enhancement_boundaries_from_analysis'
+
+    parents = [FrameAnalysisJob]
+
+    def run(self, *args, **kwargs):
+        pass
+
+    def get_outputs(self):
+        super(ContrastEnhancementBoundariesFromAnalysis, self).get_outputs()
+
+        boundaries = self.frame_analysis.get_outputs()[SlideContrastBoundariesFeature.name]
+        return boundaries['min_bounds'], boundaries['max_bounds']
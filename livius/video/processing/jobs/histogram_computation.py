@@ -12,27 +12,134 @@ It also provides a Job for gathering all user input (slide location, speaker loc
   HistogramsLABDiff
   NumberOfVerticalStripesForSpeaker
   GenerateHistogramAreas
+  LABDifference
+  AreaHistograms
+  get_area_histograms_functor
 
 """
 
 from ..job import Job
 import cv2
 import numpy as np
-import functools
 
 from ....util.tools import get_polygon_outer_bounding_box, crop_image_from_normalized_coordinates, \
                            sort_dictionary_by_integer_key
-from ....util.functor import Functor
+from ....util.functor import ArrayFunctor
+from ..frame_source import as_frame_source
+from ..checkpoint import FrameCheckpoint, default_checkpoint_interval
+from ..incremental import PreviousFrameOutputs
+from ..streaming import get_range_reader
 from .select_polygon import SelectPolygonJob, SelectSlide, SelectSpeaker
 
 
+class LABDifference(object):
+    """Computes the Euclidean distances between two images in the LAB color space.
+
+    The differences are computed without overflow of the ``uint8`` images: the absolute differences
+    are squared with a lookup table into ``int32`` values. The distances (up to :math:`255 \sqrt{3}`) are
+    saturated to 255, the last bin of the histograms. The buffers are allocated once for the given image
+    shape and reused at each call.
+
+    :param image_shape: the shape of the (3 channels) images
+    """
+
+    #: Squares of the absolute differences of two ``uint8`` values
+    squares_table = np.arange(256, dtype=np.int32) ** 2
+
+    def __init__(self, image_shape):
+        self._absolute_difference = np.empty(image_shape, dtype=np.uint8)
+        self._squared_difference = np.empty(image_shape, dtype=np.int32)
+        self._squared_distance = np.empty(image_shape[:2], dtype=np.int32)
+        self._distance = np.empty(image_shape[:2], dtype=np.float32)
+
+    def compute(self, imlab_t, imlab_tm1):
+        """Returns the image of the distances between the two ``uint8`` LAB images, saturated to 255.
+
+        The largest changes are hence counted in the last bin of the histograms (see :py:class:`AreaHistograms`),
+        instead of wrapping around to the first bins. The returned array is overwritten by the next call.
+        """
+        cv2.absdiff(imlab_t, imlab_tm1, self._absolute_difference)
+        np.take(self.squares_table, self._absolute_difference, out=self._squared_difference, mode='clip')
+        self._squared_difference.sum(axis=2, out=self._squared_distance)
+        np.sqrt(self._squared_distance, out=self._distance, dtype=np.float32)
+        np.minimum(self._distance, 255, out=self._distance)
+        return self._distance
+
+
+class AreaHistograms(object):
+    """Computes the 256 bins histograms of several areas of images in one pass.
+
+    The pixels of all the areas are gathered with precomputed indices, and their values are offset
+    by ``256 * area_index`` so that all the histograms are computed by a single ``np.bincount``. The values
+    are cast to ``uint8`` prior to the computation, and should be in ``[0, 255]``.
+
+    :param rectangle_locations: list of tuples `(name, rectangle)` (see :py:class:`HistogramsLABDiff`). The
+      histograms of the rectangles having the same name are merged, and a pixel in several rectangles
+      is counted once per rectangle.
+    :param image_shape: the shape of the images
+    """
+
+    def __init__(self, rectangle_locations, image_shape):
+        #: The names of the areas, indexing the histograms
+        self.area_names = sorted(set(name for name, _ in rectangle_locations))
+
+        height, width = image_shape[:2]
+        pixel_index_image = np.arange(height * width).reshape(height, width)
+
+        pixel_indices = []
+        bin_offsets = []
+        for name, rect in rectangle_locations:
+            indices = crop_image_from_normalized_coordinates(pixel_index_image, rect).ravel()
+            pixel_indices.append(indices)
+            bin_offsets.append(np.repeat(self.area_names.index(name) * 256, len(indices)))
+
+        self.pixel_indices = np.concatenate(pixel_indices)
+        self.bin_offsets = np.concatenate(bin_offsets)
+
+        #: Shape of the histograms of one image
+        self.shape = (len(self.area_names), 256)
+
+    def accumulate(self, image, out):
+        """Adds the histograms of the areas of ``image`` to ``out``, an array of shape :py:attr:`shape`."""
+        values = np.take(image, self.pixel_indices).astype(np.uint8)
+        bins = self.bin_offsets + values
+        out += np.bincount(bins, minlength=out.size).reshape(self.shape)
+
+
+def get_area_histograms_functor(histograms, area_names, frame_keys=None, frame_reuse_key=None, reader=None):
+    """Returns the function::
+
+        area_name, frame_index -> histogram
+
+    from the histograms of shape ``(nb_frames, nb_areas, 256)``. This is an :py:class:`ArrayFunctor
+    <livius.util.functor.ArrayFunctor>` on the ``(nb_areas, nb_frames, 256)`` transposed view of ``histograms``:
+    the returned histograms are views (no copy is performed), and the histograms of a range of frames are
+    given by ``get_histogram(area_name, slice(start, stop))`` or ``get_histogram.get_range(area_name, start, stop)``.
+
+    The ``frame_keys`` and ``frame_reuse_key`` of the histograms (see :py:mod:`livius.video.processing.incremental`)
+    are available as attributes of the returned function, for the incremental processing of the downstream Jobs.
+    The ``reader`` over the frames of ``histograms`` (see :py:mod:`livius.video.processing.streaming`) is available
+    likewise, for processing the histograms by chunks of frames.
+    """
+    functor = ArrayFunctor(np.asarray(histograms, dtype=np.float32).transpose(1, 0, 2), area_names)
+    functor.frame_keys = frame_keys
+    functor.frame_reuse_key = frame_reuse_key
+    functor.reader = reader
+    return functor
+
+
 class HistogramsLABDiff(Job):
     """
-    Computes the histograms on the difference image of two consecutive frames.
+    Computes the histograms on the difference image of each frame with the first frame.
 
     The difference image
-    is expressed in the LAB color space using an Euclidean metric. The histograms are computed on
-    several areas of the image plane.
+    is expressed in the LAB color space using an Euclidean metric (see :py:class:`LABDifference`). The
+    histograms are computed on several areas of the image plane.
+
+    .. note::
+
+      The first frame is the reference of the differences of all the frames, as in the original
+      implementation on which the defaults of the segment computation (eg. the tolerance) were tuned.
 
     .. rubric:: Workflow inputs
 
@@ -48,7 +155,13 @@ class HistogramsLABDiff(Job):
       is defined by several disconnected polygons). See :py:class:`GenerateHistogramAreas` for a possible
       input
 
-    * A list of images specified by filename, on which the histograms will be computed
+    * A list of images specified by filename or a frame source
+      (see :py:mod:`livius.video.processing.frame_source`), on which the histograms will be computed
+
+    .. rubric:: Runtime parameters
+
+    * ``checkpoint_interval`` the number of frames between two checkpoints of the histograms (not cached,
+      see :py:mod:`livius.video.processing.checkpoint`). Defaults to 600.
 
     .. rubric:: Workflow outputs
 
@@ -60,29 +173,46 @@ class HistogramsLABDiff(Job):
 
     .. rubric:: Complexity
 
-    Linear in the number of thumbnails. Reads each thumbnail image once.
+    Linear in the number of thumbnails. Reads (or decodes) each thumbnail image once. When the Job
+    is run again, only the histograms of the new or changed frames are computed (see
+    :py:mod:`livius.video.processing.incremental`).
     """
 
     #: Name of the job in the workflow
     name = 'histogram_imlabdiff'
 
+    #: The differences are computed without overflow (version 1). The keys of the frames are stored with
+    #: the histograms (version 2). The differences are computed with the first frame again (version 3). The
+    #: distances are saturated to the last bin (version 4).
+    version = 4
+
     #: Cached outputs:
     #:
-    #: * ``histograms_labdiff`` histogram of the difference image of two consecutive images in the video
-    #:   sequence (computed in LAB space)
-    outputs_to_cache = ['histograms_labdiff']
+    #: * ``histograms_labdiff`` histogram of the difference image of each image with the first image of the
+    #:   video sequence (computed in LAB space). This is stored as one ``(nb_frames, nb_areas, 256)`` array
+    #:   in a sidecar file of the JSON state.
+    #: * ``histogram_area_names`` the names of the areas, in the order of the second dimension of
+    #:   ``histograms_labdiff``
+    #: * ``frame_keys`` and ``frame_reuse_key`` identify the frames and the configuration of the histograms,
+    #:   for reusing them in the next runs (see :py:mod:`livius.video.processing.incremental`)
+    outputs_to_cache = ['histograms_labdiff',
+                        'histogram_area_names',
+                        'frame_keys',
+                        'frame_reuse_key']
 
     def __init__(self,
                  *args,
                  **kwargs):
         super(HistogramsLABDiff, self).__init__(*args, **kwargs)
 
+        self.checkpoint_interval = int(kwargs.get('checkpoint_interval', default_checkpoint_interval))
+
     def load_state(self):
         """
-        Sort the histograms by ``frame_index`` in order to be able to compare states.
+        Converts the states stored with one entry per area (previous format) into one array.
 
-        This is necessary because the json module can load and store dictionaries
-        out of order.
+        For the states having a dictionary per area, the histograms are sorted by ``frame_index``
+        as the json module can load and store dictionaries out of order.
         """
         state = super(HistogramsLABDiff, self).load_state()
 
@@ -91,10 +221,23 @@ class HistogramsLABDiff(Job):
 
         histograms_labdiff = state['histograms_labdiff']
 
-        for area in histograms_labdiff.keys():
-            histograms_labdiff[area] = sort_dictionary_by_integer_key(histograms_labdiff[area])
+        if isinstance(histograms_labdiff, dict):
+            area_names = sorted(histograms_labdiff.keys())
+
+            per_area = []
+            for area in area_names:
+                histograms = histograms_labdiff[area]
+                if isinstance(histograms, dict):
+                    histograms = sort_dictionary_by_integer_key(histograms)
+                    dense = np.zeros((max(histograms.keys()) + 1, 256), dtype=np.float32)
+                    for frame_index, histogram in histograms.items():
+                        dense[frame_index] = np.ravel(histogram)
+                    histograms = dense
+                per_area.append(np.asarray(histograms, dtype=np.float32))
+
+            state['histograms_labdiff'] = np.stack(per_area, axis=1)
+            state['histogram_area_names'] = area_names
 
-        state['histograms_labdiff'] = histograms_labdiff
         return state
 
     def run(self, *args, **kwargs):
@@ -102,54 +245,77 @@ class HistogramsLABDiff(Job):
 
         self.rectangle_locations = args[0]
 
-        image_list = args[1]
+        frames = as_frame_source(args[1])
+        nb_frames = len(frames)
 
-        # init
-        self.histograms_labdiff = {}
+        self.histogram_area_names = sorted(set(name for name, _ in self.rectangle_locations))
 
-        rectangle_names = zip(*self.rectangle_locations)[0]
-        unique_rectangle_names = list(set(rectangle_names))
+        # init: one row per frame, the first one being the reference remains empty
+        self.histograms_labdiff = np.zeros((nb_frames, len(self.histogram_area_names), 256), dtype=np.float32)
 
-        for name in unique_rectangle_names:
-            element = self.histograms_labdiff.get(name, {})
-            self.histograms_labdiff[name] = element
+        # the histograms of the frames already processed by the previous run are reused. Those depend
+        # on the frame and the first one.
+        previous = PreviousFrameOutputs(self, frames.get_frame_keys(), inputs=self.rectangle_locations)
+        self.frame_keys, self.frame_reuse_key = previous.frame_keys, previous.reuse_key
 
-        # perform the computation
-        im_index_tm1 = cv2.imread(image_list[0])
-        imlab_index_tm1 = cv2.cvtColor(im_index_tm1, cv2.COLOR_BGR2LAB)
+        reusable = previous.get_reusable_frames(reference_frames=[0])
+        if reusable:
+            indices = sorted(reusable.keys())
+            self.histograms_labdiff[indices] = previous.get('histograms_labdiff')[[reusable[i] for i in indices]]
+        previous = None
+
+        # resuming after the last frame of the checkpoint, if any
+        checkpoint = FrameCheckpoint(self, self.checkpoint_interval)
+        nb_frames_done, checkpoint_values = checkpoint.load()
+        if checkpoint_values is not None:
+            self.histograms_labdiff[:nb_frames_done] = checkpoint_values['histograms_labdiff'][:nb_frames_done]
 
-        for index, filename in enumerate(image_list[1:], 1):
-            im_index_t = cv2.imread(filename)
-            imlab_index_t = cv2.cvtColor(im_index_t, cv2.COLOR_BGR2LAB)
+        to_compute = [index for index in xrange(max(nb_frames_done, 1), nb_frames) if index not in reusable]
+        if to_compute:
+            self._compute_histograms(frames, set(to_compute), checkpoint)
 
-            # color diff
-            im_diff = (imlab_index_t - imlab_index_tm1) ** 2
-            im_diff_lab = np.sqrt(np.sum(im_diff, axis=2))
+        checkpoint.remove()
 
-            # Compute histogram for every area
-            for name, rect in self.rectangle_locations:
-                cropped = crop_image_from_normalized_coordinates(im_diff_lab, rect)
-                histogram = cv2.calcHist([cropped.astype(np.uint8)], [0], None, [256], [0, 256])
+    def _compute_histograms(self, frames, to_compute, checkpoint):
+        """Computes the histograms of the frames ``to_compute``, reading the frames from the first frame
+        to compute. The first frame, reference of the differences, is read beforehand."""
+        first_index = min(to_compute)
 
-                # Merge histograms if necessary
-                histogram_to_merge = self.histograms_labdiff[name].get(index, None)
-                if histogram_to_merge is not None:
-                    histogram += histogram_to_merge
+        # perform the computation
+        im_reference = frames.get_frame(0)
 
-                self.histograms_labdiff[name][index] = histogram
+        area_histograms = AreaHistograms(self.rectangle_locations, im_reference.shape)
+        lab_difference = LABDifference(im_reference.shape)
+        imlab_reference = cv2.cvtColor(im_reference, cv2.COLOR_BGR2LAB)
 
-            # @note(Stephan):
-            # The histograms are stored as a python list in order to serialize them via JSON.
-            for name in unique_rectangle_names:
-                histogram_np_array = self.histograms_labdiff[name][index]
-                self.histograms_labdiff[name][index] = histogram_np_array.tolist()
+        for index, im_index_t in enumerate(frames.iter_from(first_index), first_index):
+            if index in to_compute:
+                imlab_index_t = cv2.cvtColor(im_index_t, cv2.COLOR_BGR2LAB)
+
+                # color diff
+                im_diff_lab = lab_difference.compute(imlab_index_t, imlab_reference)
+
+                # Compute histogram for every area
+                area_histograms.accumulate(im_diff_lab, self.histograms_labdiff[index])
+
+            checkpoint.update(index + 1,
+                              lambda start, stop: {'histograms_labdiff': self.histograms_labdiff[start:stop]})
 
     def get_outputs(self):
         super(HistogramsLABDiff, self).get_outputs()
         if self.histograms_labdiff is None:
             raise RuntimeError('The points have not been selected yet')
 
-        return Functor(self.histograms_labdiff, transform=functools.partial(np.array, dtype=np.float32))
+        return get_area_histograms_functor(self.histograms_labdiff, self.histogram_area_names,
+                                           self.frame_keys, self.frame_reuse_key,
+                                           reader=self.get_output_reader())
+
+    def get_output_reader(self):
+        with self._outputs_lock:
+            if not self.is_output_cached():
+                self.cache_output()
+
+        return get_range_reader(self.histograms_labdiff)
 
 
 class NumberOfVerticalStripesForSpeaker(Job):
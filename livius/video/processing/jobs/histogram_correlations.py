@@ -6,19 +6,54 @@ This module provides the Job for computation of the Histogram correlations that
 determine the stable segments of the video.
 """
 
-from ..job import Job
+import numpy as np
 
-import cv2
+from ..job import Job
+from ..incremental import PreviousFrameOutputs
+from ..streaming import default_chunk_size
 
 from ....util.functor import Functor
+from ....util.histogram import compare_consecutive_histograms, histogram_comparison_methods
 from ....util.tools import sort_dictionary_by_integer_key
 
 
+def _get_area_histograms(get_histogram, area_name, start, stop):
+    """Returns the histograms of the frames ``start`` to ``stop`` (excluded) of an area in one array"""
+    if hasattr(get_histogram, 'get_range'):
+        return get_histogram.get_range(area_name, start, stop)
+
+    return np.array([get_histogram(area_name, frame_index) for frame_index in xrange(start, stop)])
+
+
+def _get_frame_ranges(indices):
+    """Returns the ranges ``(start, stop)`` of consecutive frames covering the sorted ``indices``"""
+    ranges = []
+    for index in indices:
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    return [tuple(frame_range) for frame_range in ranges]
+
+
 class HistogramCorrelationJob(Job):
     """
     Computates the histogram correlations between two consecutive frames
     on specific areas.
 
+    The comparisons of the histograms of all the frames and all the areas are computed
+    at once (see :py:func:`compare_consecutive_histograms <livius.util.histogram.compare_consecutive_histograms>`).
+
+    .. rubric:: Runtime parameters
+
+    * ``histogram_comparison_methods`` the methods used for comparing the histograms of consecutive frames,
+      in addition to the correlation (``correl``). This is a list or a string of comma separated values among
+      :py:data:`histogram_comparison_methods <livius.util.histogram.histogram_comparison_methods>`. Defaults to
+      the correlation only.
+    * ``histogram_correlation_chunk_size`` the number of frames of which the histograms are compared at once,
+      when the histograms are streamed from their parent Job (see :py:mod:`livius.video.processing.streaming`).
+      Defaults to :py:data:`default_chunk_size <livius.video.processing.streaming.default_chunk_size>`.
+
     .. rubric:: Workflow inputs
 
     The inputs of the parents are:
@@ -31,7 +66,8 @@ class HistogramCorrelationJob(Job):
       implementation example.
 
     * The number of thumbnails
-    * The number of vertical stripes
+    * The number of vertical stripes of the speaker area (see
+      :py:class:`.histogram_computation.NumberOfVerticalStripesForSpeaker`)
 
     .. rubric:: Workflow outputs
 
@@ -39,22 +75,66 @@ class HistogramCorrelationJob(Job):
 
         frame_index -> HistogramCorrelation
 
+    All the comparisons are available to the downstream Jobs as the attribute ``area_comparisons`` of
+    this function: a dictionary indexed by the comparison method and the area name, giving an array of
+    one value per frame (see :py:func:`get_area_comparisons`). The names of the vertical stripes of the speaker
+    area are given by its attribute ``speaker_area_names`` (see :py:func:`get_speaker_correlations`).
+
+    .. rubric:: Complexity
+
+    Linear in the number of frames, with one pass over the histograms of all the frames per comparison method.
+    When the function giving the histograms has a ``reader`` (see :py:func:`get_area_histograms_functor
+    <.histogram_computation.get_area_histograms_functor>`), the histograms are read by chunks of frames,
+    and the memory used by the histograms does not depend on the number of frames.
+
+    When the histograms give the keys of the frames, only the comparisons of the new or changed frames are
+    computed when the Job is run again (see :py:mod:`livius.video.processing.incremental`): the comparisons
+    of the other frames are copied from the previous run.
     """
 
     #: Name of the job in the workflow
     name = 'histogram_correlation'
 
+    #: Cached inputs:
     #:
-    attributes_to_serialize = []
+    #: * ``histogram_comparison_methods`` the methods used for comparing the histograms
+    attributes_to_serialize = ['histogram_comparison_methods']
 
     #: Cached output:
     #:
     #: * ``histogram_correlations`` the correlation on the histogram of two consecutive frames
-    outputs_to_cache = ['histogram_correlations']
+    #: * ``area_comparisons`` the comparisons of the histograms of two consecutive frames, per method and
+    #:   area. Each is an array of one value per frame, the comparisons being undefined (``NaN``) for the
+    #:   first two frames.
+    #: * ``speaker_area_names`` the names of the vertical stripes of the speaker area
+    #: * ``frame_keys`` and ``frame_reuse_key`` identify the frames and the histograms, for reusing
+    #:   the comparisons in the next runs
+    outputs_to_cache = ['histogram_correlations',
+                        'area_comparisons',
+                        'speaker_area_names',
+                        'frame_keys',
+                        'frame_reuse_key']
+
+    #: The keys of the frames are stored with the comparisons
+    version = 3
 
     def __init__(self, *args, **kwargs):
         super(HistogramCorrelationJob, self).__init__(*args, **kwargs)
 
+        methods = kwargs.get('histogram_comparison_methods', [])
+        if isinstance(methods, basestring):
+            methods = [method.strip() for method in methods.split(',') if method.strip()]
+
+        for method in methods:
+            if method not in histogram_comparison_methods:
+                raise RuntimeError('Unknown histogram comparison method %s (should be one of %s)' %
+                                   (method, ', '.join(histogram_comparison_methods)))
+
+        # the correlation is always computed
+        self.histogram_comparison_methods = ['correl'] + sorted(set(methods) - set(['correl']))
+
+        self.chunk_size = int(kwargs.get('histogram_correlation_chunk_size', default_chunk_size))
+
     def load_state(self):
         state = super(HistogramCorrelationJob, self).load_state()
 
@@ -76,35 +156,78 @@ class HistogramCorrelationJob(Job):
         # Second parent is the NumberOfFiles
         number_of_files = args[1]
 
-        # init
-        self.histogram_correlations = {}
-
-        # @todo(Stephan): We need the number of vertical stripes
-        nb_vertical_stripes = 10
-        speaker_area_names = ['speaker_%.2d' % i for i in range(nb_vertical_stripes)]
-
-        def get_speaker_histogram_plane(frame_index):
-            return map(lambda area_name: get_histogram(area_name, frame_index), speaker_area_names)
-
-        previous_slide_histogram = get_histogram('slides', 1)
-        previous_speaker_histogram_plane = get_speaker_histogram_plane(1)
-
-        for frame_index in range(2, number_of_files):
-
-            slide_histogram = get_histogram('slides', frame_index)
-            speaker_histogram_plane = get_speaker_histogram_plane(frame_index)
-
-            if previous_slide_histogram is not None:
-                self.histogram_correlations[frame_index] = \
-                    cv2.compareHist(slide_histogram, previous_slide_histogram, cv2.cv.CV_COMP_CORREL)
-
-            if previous_speaker_histogram_plane is not None:
-                # @todo(Stephan): Compute the energy here?
-                # Maybe create a new Job and a common subclass (cf. GenerateHistogramAreas)
-                pass
-
-            previous_slide_histogram = slide_histogram
-            previous_speaker_histogram_plane = speaker_histogram_plane
+        # Third parent is the number of vertical stripes of the speaker area
+        nb_vertical_stripes = int(args[2])
+        self.speaker_area_names = ['speaker_%.2d' % i for i in range(nb_vertical_stripes)]
+        area_names = ['slides'] + self.speaker_area_names
+
+        # @note(Stephan): The first correlation can be computed at frame_index 2, the histogram
+        # of the first frame being empty
+        first_index = 2
+
+        comparisons = dict((method, np.full((len(area_names), max(number_of_files, first_index)), np.nan))
+                           for method in self.histogram_comparison_methods)
+
+        # the comparison of a frame depends on the histograms of this frame and of the previous one, the
+        # histograms being differences with the first frame. The frames are identified only if the histograms are.
+        frame_reuse_key = getattr(get_histogram, 'frame_reuse_key', None)
+        frame_keys = getattr(get_histogram, 'frame_keys', None) if frame_reuse_key is not None else None
+        previous = PreviousFrameOutputs(self, frame_keys, inputs=[frame_reuse_key, area_names])
+        # no key (nothing reused in the next run) if the histograms have none, the outputs being cached
+        self.frame_keys = previous.frame_keys if previous.frame_keys is not None else []
+        self.frame_reuse_key = previous.reuse_key
+
+        reusable = previous.get_reusable_frames(nb_preceding_frames=1, reference_frames=[0])
+        reused_indices = sorted(index for index in reusable if first_index <= index < number_of_files)
+        if reused_indices:
+            previous_indices = [reusable[index] for index in reused_indices]
+            previous_comparisons = previous.get('area_comparisons')
+            for method in self.histogram_comparison_methods:
+                for area_index, area_name in enumerate(area_names):
+                    comparisons[method][area_index, reused_indices] = \
+                        np.asarray(previous_comparisons[method][area_name])[previous_indices]
+        previous = None
+
+        to_compute = [index for index in xrange(first_index, number_of_files) if index not in reusable]
+
+        reader = getattr(get_histogram, 'reader', None)
+        for start, stop in _get_frame_ranges(to_compute):
+            if reader is not None and hasattr(get_histogram, 'labels'):
+                # streaming: the chunks overlap by one frame for comparing all the consecutive frames
+                area_indices = [get_histogram.labels.index(area_name) for area_name in area_names]
+                for chunk_start, chunk in reader.iter_chunks(self.chunk_size, overlap=1, start=start - 1, stop=stop):
+                    histograms = np.asarray(chunk[:, area_indices], dtype=np.float32).transpose(1, 0, 2)
+                    for method in self.histogram_comparison_methods:
+                        comparisons[method][:, chunk_start + 1:chunk_start + len(chunk)] = \
+                            compare_consecutive_histograms(histograms, method)
+
+            else:
+                histograms = np.stack([_get_area_histograms(get_histogram, area_name, start - 1, stop)
+                                       for area_name in area_names])
+                for method in self.histogram_comparison_methods:
+                    comparisons[method][:, start:stop] = compare_consecutive_histograms(histograms, method)
+
+        self.area_comparisons = dict((method, dict(zip(area_names, comparisons[method])))
+                                     for method in self.histogram_comparison_methods)
+
+        slide_correlations = self.area_comparisons['correl']['slides']
+        self.histogram_correlations = dict((frame_index, float(slide_correlations[frame_index]))
+                                           for frame_index in range(first_index, number_of_files))
+
+    def get_area_comparisons(self, method='correl'):
+        """Returns the comparisons of the histograms of consecutive frames as a dictionary indexed by the name of
+        the areas, for the given ``method`` of ``histogram_comparison_methods``."""
+        with self._outputs_lock:
+            if not self.is_output_cached():
+                self.cache_output()
+
+        return self.area_comparisons[method]
+
+    def get_speaker_correlations(self):
+        """Returns the correlations of the histograms of the vertical stripes of the speaker area as an array
+        of shape ``(nb_vertical_stripes, nb_frames)``."""
+        area_comparisons = self.get_area_comparisons('correl')
+        return np.array([area_comparisons[area_name] for area_name in self.speaker_area_names])
 
     def get_outputs(self):
         super(HistogramCorrelationJob, self).get_outputs()
@@ -112,4 +235,7 @@ class HistogramCorrelationJob(Job):
         if self.histogram_correlations is None:
             raise RuntimeError('The Correlations between the histograms have not been computed yet.')
 
-        return Functor(self.histogram_correlations)
+        functor = Functor(self.histogram_correlations)
+        functor.area_comparisons = self.area_comparisons
+        functor.speaker_area_names = self.speaker_area_names
+        return functor
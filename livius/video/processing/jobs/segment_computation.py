@@ -11,15 +11,94 @@ Once the stable segments have been detected, it is possible to apply a contrast
 enhancement on those parts using a simple histogram streching (see :py:class:`` for
 more details).
 
+The segments are found on the array of the correlations with a run-length encoding of the
+stable entries (see :py:func:`get_stable_segments`), for one or several tolerances at once.
+
 .. autosummary::
 
   SegmentComputationJob
+  get_stable_segments
+  get_correlations_array
 
 """
 
+import numpy as np
+
 from ..job import Job
 
 
+def get_correlations_array(get_histogram_correlation, number_of_files, first_index=2):
+    """Returns the correlations of the frames ``first_index`` to ``number_of_files - 1`` in an array.
+
+    :param get_histogram_correlation: the function ``frame_index -> correlation``. If this is a
+      :py:class:`Functor <livius.util.functor.Functor>` over a dictionary, the values are read directly
+      from the dictionary.
+    """
+    indices = xrange(first_index, number_of_files)
+
+    data = getattr(get_histogram_correlation, 'data', None)
+    if isinstance(data, dict) and getattr(get_histogram_correlation, 'transform', None) is None:
+        return np.array([data[i] for i in indices], dtype=np.float64)
+
+    return np.array([get_histogram_correlation(i) for i in indices], dtype=np.float64)
+
+
+def get_stable_segments(correlations,
+                        tolerances,
+                        min_length_in_seconds,
+                        seconds_per_correlation_entry=1,
+                        first_index=2):
+    """Returns the stable segments for each of the ``tolerances``.
+
+    An entry is stable if its correlation is at least ``1 - tolerance`` (an undefined correlation is not stable).
+    Each run of stable entries gives a segment, starting where the previous run of unstable entries ends (or
+    at time ``0`` for the first one) and ending after the last stable entry. The segments shorter than
+    ``min_length_in_seconds`` are dropped.
+
+    :param correlations: the correlations of consecutive frames, the first one being the correlation of the
+      frame ``first_index``
+    :param tolerances: the tolerances (a list or a single value)
+    :returns: a list containing the segments ``[t_start, t_end]`` of each tolerance
+    """
+    correlations = np.asarray(correlations, dtype=np.float64)
+    tolerances = np.atleast_1d(np.asarray(tolerances, dtype=np.float64))
+    nb_entries = len(correlations)
+
+    if nb_entries == 0:
+        return [[] for _ in tolerances]
+
+    # one row per tolerance
+    with np.errstate(invalid='ignore'):
+        stable = correlations[np.newaxis, :] >= (1.0 - tolerances)[:, np.newaxis]
+
+    # run-length encoding: the transitions are +1 at the start and -1 after the end of each stable run
+    padded = np.zeros((len(tolerances), nb_entries + 2), dtype=np.int8)
+    padded[:, 1:-1] = stable
+    transitions = np.diff(padded, axis=1)
+    run_rows, run_starts = np.nonzero(transitions == 1)
+    _, run_ends = np.nonzero(transitions == -1)
+
+    segments_per_tolerance = []
+    for row in xrange(len(tolerances)):
+        in_row = run_rows == row
+        starts, ends = run_starts[in_row], run_ends[in_row]
+
+        if not stable[row, 0]:
+            # the first segment is empty and ends at the first entry
+            starts = np.concatenate(([0], starts))
+            ends = np.concatenate(([0], ends))
+
+        t_starts = (starts + first_index) * float(seconds_per_correlation_entry)
+        t_ends = (ends + first_index) * float(seconds_per_correlation_entry)
+        t_starts[0] = 0.0
+
+        kept = (t_ends - t_starts) >= min_length_in_seconds
+        segments_per_tolerance.append([[t_start, t_end] for t_start, t_end in zip(t_starts[kept].tolist(),
+                                                                                t_ends[kept].tolist())])
+
+    return segments_per_tolerance
+
+
 class SegmentComputationJob(Job):
     """
     Detection of `"stable"` segments of the video.
@@ -46,14 +125,19 @@ class SegmentComputationJob(Job):
     .. rubric:: Workflow outputs
 
     * The output of this Job is a list of segments, each specified by `[t_start, t_end]`.
+
+    The segments obtained with each tolerance of ``segment_computation_tolerance_sweep`` are given by
+    :py:func:`get_segments_per_tolerance`.
     """
 
     name = "compute_segments"
     # :
     attributes_to_serialize = ['segment_computation_tolerance',
-                               'segment_computation_min_length_in_seconds']
+                               'segment_computation_min_length_in_seconds',
+                               'segment_computation_tolerance_sweep']
     # :
-    outputs_to_cache = ['segments']
+    outputs_to_cache = ['segments',
+                        'segments_sweep']
 
     def __init__(self,
                  *args,
@@ -65,6 +149,10 @@ class SegmentComputationJob(Job):
         :param int segment_computation_min_length_in_seconds: indicates the minimum length of a stable segment
             in seconds.
 
+        :param list segment_computation_tolerance_sweep: additional tolerances for which the segments are
+            computed, for tuning the tolerance (see :py:func:`get_segments_per_tolerance`). This is either a list or
+            a string of comma separated values. Defaults to no additional tolerance.
+
         .. note::
 
            In case the segment lenght is shorter than ``segment_computation_min_length_in_seconds``
@@ -77,6 +165,14 @@ class SegmentComputationJob(Job):
         assert('segment_computation_tolerance' in kwargs)
         assert('segment_computation_min_length_in_seconds' in kwargs)
 
+        self.segment_computation_tolerance = float(self.segment_computation_tolerance)
+        self.segment_computation_min_length_in_seconds = float(self.segment_computation_min_length_in_seconds)
+
+        tolerance_sweep = kwargs.get('segment_computation_tolerance_sweep', [])
+        if isinstance(tolerance_sweep, basestring):
+            tolerance_sweep = [v for v in tolerance_sweep.split(',') if v.strip()]
+        self.segment_computation_tolerance_sweep = [float(v) for v in tolerance_sweep]
+
     def run(self, *args, **kwargs):
         """
         Segment the video using the histogram correlations.
@@ -94,39 +190,34 @@ class SegmentComputationJob(Job):
         # Second Parent is the Number of Files
         number_of_files = args[1]
 
-        self.segments = []
-
-        t_segment_start = 0.0
-        lower_bounds = 1.0 - self.segment_computation_tolerance
-
         # @todo(Stephan):
         # This information should probably be passed together with the histogram differences
         seconds_per_correlation_entry = 1
 
         # @note(Stephan): The first correlation can be computed at frame_index 2, so we start from there.
-        i = 2
-        end = number_of_files
-
-        t = i * seconds_per_correlation_entry
-
-        while i < end:
-
-            # As long as we stay over the boundary, we count it towards the same segment
-            while (i < end) and (get_histogram_correlation(i) >= lower_bounds):
-                i += 1
-                t += seconds_per_correlation_entry
-
-            # Append segment if it is big enough
-            if (t - t_segment_start) >= self.segment_computation_min_length_in_seconds:
-                self.segments.append([t_segment_start, t])
-
-            # Skip the elements below the boundary
-            while (i < end) and (get_histogram_correlation(i) < lower_bounds):
-                i += 1
-                t += seconds_per_correlation_entry
-
-            # The new segment starts as soon as we are over the boundary again
-            t_segment_start = t
+        correlations = get_correlations_array(get_histogram_correlation, number_of_files, first_index=2)
+
+        # all the tolerances are processed at once
+        tolerances = [self.segment_computation_tolerance] + self.segment_computation_tolerance_sweep
+        segments_per_tolerance = get_stable_segments(correlations,
+                                                     tolerances,
+                                                     self.segment_computation_min_length_in_seconds,
+                                                     seconds_per_correlation_entry=seconds_per_correlation_entry,
+                                                     first_index=2)
+
+        self.segments = segments_per_tolerance[0]
+        self.segments_sweep = [[tolerance, segments] for tolerance, segments in zip(tolerances[1:],
+                                                                                    segments_per_tolerance[1:])]
+
+    def get_segments_per_tolerance(self):
+        """Returns the list of the pairs ``(tolerance, segments)`` for the tolerance ``segment_computation_tolerance``
+        followed by the tolerances of ``segment_computation_tolerance_sweep``."""
+        with self._outputs_lock:
+            if self.segments is None or self.segments_sweep is None:
+                self.cache_output()
+
+        return [(self.segment_computation_tolerance, self.segments)] + \
+            [(tolerance, segments) for tolerance, segments in self.segments_sweep]
 
     def get_outputs(self):
         super(SegmentComputationJob, self).get_outputs()
@@ -18,6 +18,7 @@ from random import randint
 import numpy as np
 
 from ..job import Job
+from ..frame_source import as_frame_source
 from ....util.user_interaction import GetPolygon  # get_polygon_from_user
 
 
@@ -33,8 +34,8 @@ class SelectPolygonJob(Job):
     .. rubric:: Workflow input
 
     * either nothing, in which case the video file is used
-    * or a list of image file names, in which case a randomly picked image is
-      shown for input.
+    * or a list of image file names or a frame source (see :py:mod:`livius.video.processing.frame_source`),
+      in which case a randomly picked image is shown for input.
 
     .. rubric:: Workflow output
 
@@ -58,6 +59,9 @@ class SelectPolygonJob(Job):
     #: Specifies the window title that is shown to the user when asked to perform the area selection
     window_title = ''
 
+    #: The selection is performed by the user
+    is_interactive = True
+
     def __init__(self,
                  *args,
                  **kwargs):
@@ -100,7 +104,8 @@ class SelectPolygonJob(Job):
 
             is_from_video = True
         else:
-            im_for_selection = cv2.imread(args[0][randint(0, len(args[0]))])
+            frames = as_frame_source(args[0])
+            im_for_selection = frames.get_frame(randint(0, len(frames) - 1))
             width, height, _ = im_for_selection.shape
 
         self.points = []
@@ -130,7 +135,7 @@ class SelectPolygonJob(Job):
                         cap.set(cv2.cv.CV_CAP_PROP_POS_FRAMES, dropcount * 500)
                         _, im_for_selection = cap.read()
                     else:
-                        im_for_selection = cv2.imread(args[0][randint(0, len(args[0]))])
+                        im_for_selection = frames.get_frame(randint(0, len(frames) - 1))
 
                     self.points = selection_object.select_polygon_on_image(im_for_selection, 4)
 
@@ -0,0 +1,148 @@
+"""
+Scheduler
+=========
+
+This module provides a scheduler processing the instantiated DAG of :py:class:`Job <livius.video.processing.job.Job>`
+concurrently.
+
+The sequential :py:func:`Job.process <livius.video.processing.job.Job.process>` walks the parents depth-first,
+which means that independent branches of a workflow never overlap. The scheduler below
+sorts the Jobs topologically and starts each Job on a pool of workers as soon as all its parents
+have been processed.
+
+.. note::
+
+   The workers are threads: the Jobs keep their state in the instances of the workflow, which should
+   hence not be copied to other processes. The computationally intensive parts (OpenCV, numpy, ffmpeg)
+   release the GIL or run in their own processes.
+
+.. autosummary::
+
+  get_jobs_to_process
+  process_workflow_parallel
+
+"""
+
+import os
+import sys
+import Queue
+import logging
+from multiprocessing.pool import ThreadPool
+
+from ...util.parallel import get_nb_workers
+
+logger = logging.getLogger()
+
+
+def get_jobs_to_process(job):
+    """Returns the set of Jobs of the workflow ending at ``job`` that need to be processed.
+
+    The traversal follows :py:func:`Job.process <livius.video.processing.job.Job.process>`: a Job that
+    is up to date is not processed, and its parents are not visited.
+    """
+    to_process = set()
+    visited = set()
+    stack = [job]
+
+    while stack:
+        current = stack.pop()
+        if current in visited:
+            continue
+        visited.add(current)
+
+        if current.is_up_to_date():
+            # writes the missing headers, if any, before the children compute their state keys
+            current.serialize_state()
+            continue
+
+        to_process.add(current)
+        stack.extend(current._parent_instances)
+
+    return to_process
+
+
+def _process_node(job, done_queue):
+    """Runs one Job from the outputs of its parents and flushes its state.
+
+    The parents are expected to be processed already. The result is reported to ``done_queue``
+    as a tuple ``(job, exc_info)`` where ``exc_info`` is ``None`` on success.
+    """
+    try:
+        parent_outputs = [par.get_outputs() for par in job._parent_instances]
+
+        logger.info('Job.process: %s/%s processing...', os.path.basename(job.json_prefix), job.name)
+        job.run(*parent_outputs)
+
+        # the parents have been serialized by their own task
+        job.serialize_state(with_parents=False)
+    except Exception:
+        done_queue.put((job, sys.exc_info()))
+        return
+
+    done_queue.put((job, None))
+
+
+def process_workflow_parallel(job, nb_workers=None):
+    """
+    Processes ``job`` and all its parents, running the independent Jobs concurrently.
+
+    The state of each processed Job is serialized exactly once, right after its :py:func:`run`.
+    Jobs flagged as :py:attr:`is_interactive <livius.video.processing.job.Job.is_interactive>`
+    are run from the calling thread, one at a time.
+
+    :param job: the final Job of the workflow (instance).
+    :param int nb_workers: the number of concurrent workers. Defaults to the number of CPUs.
+    :raises: the first exception raised by a Job. The Jobs already running are allowed to finish.
+    """
+    nb_workers = get_nb_workers(nb_workers)
+
+    to_process = get_jobs_to_process(job)
+    if not to_process:
+        logger.info('Job.process: %s/%s state is up to date', os.path.basename(job.json_prefix), job.name)
+        return
+
+    # topological sort: a Job becomes ready when all its parents that need processing are done
+    remaining_parents = dict((current, set(par for par in current._parent_instances if par in to_process))
+                             for current in to_process)
+    children = dict((current, []) for current in to_process)
+    for current, parents in remaining_parents.items():
+        for par in parents:
+            children[par].append(current)
+
+    logger.info('[SCHEDULER] processing %d jobs with %d workers: %s',
+                len(to_process), nb_workers, ', '.join(sorted(current.name for current in to_process)))
+
+    ready = [current for current, parents in remaining_parents.items() if not parents]
+    nb_running = 0
+    done_queue = Queue.Queue()
+    pool = ThreadPool(processes=nb_workers)
+
+    try:
+        while ready or nb_running > 0:
+            interactive = [current for current in ready if current.is_interactive]
+            for current in ready:
+                if not current.is_interactive:
+                    pool.apply_async(_process_node, (current, done_queue))
+                    nb_running += 1
+            ready = []
+
+            # user interaction is performed from this thread
+            for current in interactive:
+                _process_node(current, done_queue)
+                nb_running += 1
+
+            finished, exc_info = done_queue.get()
+            nb_running -= 1
+
+            if exc_info is not None:
+                logger.error('[SCHEDULER] job %s failed: %r', finished.name, exc_info[1])
+                raise exc_info[0], exc_info[1], exc_info[2]
+
+            for child in children[finished]:
+                remaining_parents[child].discard(finished)
+                if not remaining_parents[child]:
+                    ready.append(child)
+
+    finally:
+        pool.close()
+        pool.join()
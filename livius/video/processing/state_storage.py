@@ -0,0 +1,164 @@
+"""
+State storage
+=============
+
+This module provides the backends used by :py:class:`Job <livius.video.processing.job.Job>` for flushing its state
+to the file system and for loading it back.
+
+The backend of a Job is given by its class attribute
+:py:attr:`state_storage_class <livius.video.processing.job.Job.state_storage_class>`.
+
+.. autosummary::
+
+  JSONStateStorage
+  NumpySidecarStateStorage
+  get_hash_of_values
+
+"""
+
+import os
+import json
+import logging
+import hashlib
+
+import numpy as np
+
+logger = logging.getLogger()
+
+
+def _hash_default(value):
+    # arrays are represented by a digest of their content
+    if isinstance(value, np.ndarray):
+        return {'dtype': str(value.dtype),
+                'shape': list(value.shape),
+                'sha1': hashlib.sha1(np.ascontiguousarray(value)).hexdigest()}
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    return repr(value)
+
+
+def get_hash_of_values(values):
+    """Returns a stable hash (hexadecimal SHA1) of ``values``.
+
+    The values are hashed through their sorted JSON representation, which makes the hash independent
+    of the ordering of the dictionaries. The numpy arrays are hashed by content.
+    """
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=_hash_default)).hexdigest()
+
+
+class JSONStateStorage(object):
+    """Stores the state of a Job in a unique JSON file.
+
+    A small header file is stored next to the state, containing the keys used by the Job for
+    checking if the state is up to date without loading the state itself.
+
+    :param str json_filename: the JSON file containing the state.
+    """
+
+    def __init__(self, json_filename):
+        self.json_filename = json_filename
+
+    @property
+    def header_filename(self):
+        """The file containing the header of the state"""
+        return os.path.splitext(self.json_filename)[0] + '.header.json'
+
+    def load_header(self):
+        """Returns the stored header as a dictionary, or ``None`` if there is no valid header"""
+        if not os.path.exists(self.header_filename):
+            return None
+
+        try:
+            with open(self.header_filename) as f:
+                return json.load(f)
+        except ValueError:
+            logger.warning("Cannot read the state header %s", self.header_filename)
+            return None
+
+    def save_header(self, header):
+        """Stores the dictionary ``header``"""
+        with open(self.header_filename, 'w') as f:
+            json.dump(header, f, indent=4)
+
+    def remove_header(self):
+        """Removes the stored header, if any"""
+        if os.path.exists(self.header_filename):
+            os.remove(self.header_filename)
+
+    def exists(self):
+        """Returns ``True`` if a state has been stored"""
+        return os.path.exists(self.json_filename)
+
+    def load(self):
+        """Returns the stored state as a dictionary"""
+        with open(self.json_filename) as f:
+            return json.load(f)
+
+    def save(self, state):
+        """Stores the dictionary ``state``"""
+        with open(self.json_filename, 'w') as f:
+            json.dump(state, f, indent=4)
+
+
+class NumpySidecarStateStorage(JSONStateStorage):
+    """Stores the state of a Job in a JSON file, except for the numpy arrays that are stored in
+    sidecar ``.npy`` files.
+
+    Each array in the state (possibly nested in lists or dictionaries) is written next to the JSON file
+    and replaced in the JSON by a reference of the form::
+
+        {"__ndarray__": "json_prefix_name.output_name.key.npy"}
+
+    The reference is relative to the location of the JSON file so that the files are relocatable.
+
+    When the state is loaded back, the arrays are memory mapped read-only: only the parts that are
+    actually accessed are read from disk. The sidecar files are replaced atomically, which keeps valid
+    the arrays mapped from a previous state.
+    """
+
+    #: Key indicating a reference to a sidecar file in the JSON file
+    reference_key = u'__ndarray__'
+
+    def get_sidecar_filename(self, path):
+        """Returns the sidecar filename for the element located at ``path`` (list of keys) in the state"""
+        base = os.path.splitext(self.json_filename)[0]
+        return base + '.' + '.'.join(unicode(i).replace(os.sep, '_') for i in path) + '.npy'
+
+    def _encode(self, value, path):
+        if isinstance(value, np.ndarray):
+            filename = self.get_sidecar_filename(path)
+            temporary_filename = filename + '.tmp'
+            with open(temporary_filename, 'wb') as f:
+                np.save(f, np.ascontiguousarray(value))
+            os.rename(temporary_filename, filename)
+
+            return {self.reference_key: os.path.basename(filename)}
+
+        elif isinstance(value, dict):
+            return dict((k, self._encode(v, path + [k])) for k, v in value.items())
+
+        elif isinstance(value, (list, tuple)):
+            return [self._encode(v, path + [index]) for index, v in enumerate(value)]
+
+        return value
+
+    def _decode(self, value):
+        if isinstance(value, dict):
+            if len(value) == 1 and self.reference_key in value:
+                filename = os.path.join(os.path.dirname(self.json_filename), value[self.reference_key])
+                return np.load(filename, mmap_mode='r')
+
+            return dict((k, self._decode(v)) for k, v in value.items())
+
+        elif isinstance(value, list):
+            return [self._decode(v) for v in value]
+
+        return value
+
+    def load(self):
+        return self._decode(super(NumpySidecarStateStorage, self).load())
+
+    def save(self, state):
+        super(NumpySidecarStateStorage, self).save(self._encode(state, []))
@@ -0,0 +1,135 @@
+"""
+Streaming of the outputs
+========================
+
+This module provides the readers over ranges of frames, through which a Job may expose its per-frame
+outputs (see :py:func:`Job.get_output_reader <livius.video.processing.job.Job.get_output_reader>`). The
+downstream Jobs then process the outputs by chunks of frames, in bounded memory, instead of accessing
+the full outputs at once.
+
+The outputs stored in sidecar files (see :py:class:`NumpySidecarStateStorage
+<livius.video.processing.state_storage.NumpySidecarStateStorage>`) are read from the files chunk by chunk:
+the memory used does not grow with the length of the video.
+
+.. autosummary::
+
+  FrameRangeReader
+  ArrayRangeReader
+  NpyFileRangeReader
+  get_range_reader
+
+"""
+
+import mmap
+
+import numpy as np
+
+#: Default number of frames per chunk
+default_chunk_size = 1024
+
+
+class FrameRangeReader(object):
+    """Base class of the readers over ranges of frames.
+
+    The frames are indexed by the first dimension of the read arrays.
+    """
+
+    def __len__(self):
+        """Returns the number of frames"""
+        raise NotImplementedError
+
+    def read(self, start, stop):
+        """Returns the outputs of the frames ``start`` to ``stop`` (excluded) in an array"""
+        raise NotImplementedError
+
+    def iter_chunks(self, chunk_size=None, overlap=0, start=0, stop=None):
+        """Iterates over the chunks of frames.
+
+        :param int chunk_size: the maximum number of frames of each chunk. Defaults to :py:data:`default_chunk_size`.
+        :param int overlap: the number of frames of a chunk repeated at the beginning of the next one (eg. ``1`` for
+          processing all the pairs of consecutive frames)
+        :param int start: the first frame
+        :param int stop: the frame after the last one. Defaults to the number of frames.
+        :returns: an iterator over the tuples ``(chunk_start, chunk)``, where ``chunk`` contains the outputs of the
+          frames ``chunk_start`` to ``chunk_start + len(chunk)`` (excluded)
+        """
+        chunk_size = default_chunk_size if chunk_size is None else int(chunk_size)
+        stop = len(self) if stop is None else min(stop, len(self))
+
+        if chunk_size <= overlap:
+            raise RuntimeError("The chunks (%d frames) should be larger than their overlap (%d frames)" %
+                               (chunk_size, overlap))
+
+        chunk_start = start
+        while chunk_start < stop:
+            chunk_stop = min(chunk_start + chunk_size, stop)
+            yield chunk_start, self.read(chunk_start, chunk_stop)
+
+            if chunk_stop == stop:
+                break
+            chunk_start = chunk_stop - overlap
+
+
+class ArrayRangeReader(FrameRangeReader):
+    """Reader over an array in memory. The chunks are views on the array.
+
+    :param array: the array, indexed by the frames on its first dimension
+    """
+
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def read(self, start, stop):
+        return self.array[start:stop]
+
+
+class NpyFileRangeReader(FrameRangeReader):
+    """Reader over an array stored in a ``.npy`` file in C order. Each chunk is read from the file into a
+    new array, without mapping the file in memory.
+
+    :param str filename: the ``.npy`` file
+    :param dtype: the type of the elements
+    :param tuple shape: the shape of the array
+    :param int offset: the position of the data in the file (after the header)
+    """
+
+    def __init__(self, filename, dtype, shape, offset):
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.offset = offset
+
+        #: Number of elements per frame
+        self.frame_size = int(np.prod(self.shape[1:]))
+
+    @classmethod
+    def from_memmap(cls, array):
+        """Creates the reader of the file mapped by ``array``, as returned by ``np.load(filename, mmap_mode='r')``"""
+        return cls(array.filename, array.dtype, array.shape, array.offset)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def read(self, start, stop):
+        start, stop = max(start, 0), min(stop, len(self))
+        nb_frames = max(stop - start, 0)
+
+        with open(self.filename, 'rb') as f:
+            f.seek(self.offset + start * self.frame_size * self.dtype.itemsize)
+            values = np.fromfile(f, dtype=self.dtype, count=nb_frames * self.frame_size)
+
+        return values.reshape((nb_frames,) + self.shape[1:])
+
+
+def get_range_reader(array):
+    """Returns the reader over the frames of ``array``: a :py:class:`NpyFileRangeReader` if the array is
+    mapped from a complete ``.npy`` file (eg. loaded from the state of a Job), an :py:class:`ArrayRangeReader`
+    otherwise."""
+    # the views on a mapped array are not the complete file
+    if isinstance(array, np.memmap) and array.filename is not None and isinstance(array.base, mmap.mmap):
+        return NpyFileRangeReader.from_memmap(array)
+
+    return ArrayRangeReader(array)
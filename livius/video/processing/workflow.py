@@ -16,13 +16,15 @@ be used.
 
 """
 
-from .jobs.histogram_computation import HistogramsLABDiff, GenerateHistogramAreas, SelectSlide
+from .jobs.histogram_computation import SelectSlide, NumberOfVerticalStripesForSpeaker
 from .jobs.ffmpeg_to_thumbnails import FFMpegThumbnailsJob, NumberOfFilesJob
 from .jobs.histogram_correlations import HistogramCorrelationJob
 from .jobs.segment_computation import SegmentComputationJob
-from .jobs.contrast_enhancement_boundaries import ContrastEnhancementBoundaries, BoundariesConvolutionOnStableSegments
+from .jobs.contrast_enhancement_boundaries import BoundariesConvolutionOnStableSegments
+from .jobs.frame_analysis import HistogramsLABDiffFromAnalysis, ContrastEnhancementBoundariesFromAnalysis
 from .jobs.extract_slide_clip import ExtractSlideClipJob, EnhanceContrastJob
 from .jobs.audio_mixer import AudioMixerJob
+from .scheduler import process_workflow_parallel
 
 import os
 
@@ -58,25 +60,21 @@ def workflow_extract_slide_clip():
 
     * ffmpeg thumbnail generation
     * Polygon Selection for the Slides and Speaker
-    * Histogram Computations
+    * Histogram Computations and Contrast Enhancement boundaries, in one pass over the thumbnails
+      (see :py:mod:`frame_analysis <livius.video.processing.jobs.frame_analysis>`)
     * Histogram Correlations
     * Segment Computation
     * Perspective Transformations and Contrast Enhancement.
 
     """
-    HistogramsLABDiff.add_parent(GenerateHistogramAreas)
-    HistogramsLABDiff.add_parent(FFMpegThumbnailsJob)
-
-    HistogramCorrelationJob.add_parent(HistogramsLABDiff)
+    HistogramCorrelationJob.add_parent(HistogramsLABDiffFromAnalysis)
     HistogramCorrelationJob.add_parent(NumberOfFilesJob)
+    HistogramCorrelationJob.add_parent(NumberOfVerticalStripesForSpeaker)
 
     SegmentComputationJob.add_parent(HistogramCorrelationJob)
     SegmentComputationJob.add_parent(NumberOfFilesJob)
 
-    ContrastEnhancementBoundaries.add_parent(FFMpegThumbnailsJob)
-    ContrastEnhancementBoundaries.add_parent(SelectSlide)
-
-    BoundariesConvolutionOnStableSegments.add_parent(ContrastEnhancementBoundaries)
+    BoundariesConvolutionOnStableSegments.add_parent(ContrastEnhancementBoundariesFromAnalysis)
     BoundariesConvolutionOnStableSegments.add_parent(SegmentComputationJob)
 
     EnhanceContrastJob.parents = None
@@ -111,10 +109,20 @@ def workflow_video_creation():
 def process(workflow_instance, **kwargs):
     """Process an instance of a workflow using the runtime parameters
     given by ``kwargs``.
+
+    If the runtime parameter ``workflow_nb_workers`` is greater than 1, the independent
+    branches of the workflow are processed concurrently by that many workers
+    (see :py:func:`process_workflow_parallel <livius.video.processing.scheduler.process_workflow_parallel>`).
+    Otherwise (default) the workflow is processed sequentially.
     """
 
     instance = workflow_instance(**kwargs)
-    instance.process()
+
+    nb_workers = int(kwargs.get('workflow_nb_workers', 1))
+    if nb_workers > 1:
+        process_workflow_parallel(instance, nb_workers=nb_workers)
+    else:
+        instance.process()
 
     out = instance.get_outputs()
     instance.serialize_state()
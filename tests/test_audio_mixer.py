@@ -0,0 +1,47 @@
+"""
+Tests the mixing of the audio channels.
+"""
+
+import unittest
+
+import numpy as np
+
+from livius.video.processing.jobs.audio_mixer import AudioMixer, get_mixing_matrix, get_pan_filter
+
+
+class AudioMixerTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.chunk = rng.uniform(-1, 1, size=(2000, 2))
+
+    def test_mixing(self):
+        mixer = AudioMixer(get_mixing_matrix(3., 1.))
+        mixed = mixer(lambda t: self.chunk, None)
+
+        expected = 0.75 * self.chunk[:, 0] + 0.25 * self.chunk[:, 1]
+        self.assertEqual(mixed.shape, (2000, 2))
+        np.testing.assert_array_equal(mixed[:, 0], expected)
+        np.testing.assert_array_equal(mixed[:, 1], expected)
+
+        # the chunk is not modified
+        self.assertFalse(np.array_equal(self.chunk[:, 0], expected))
+
+    def test_buffer(self):
+        mixer = AudioMixer(get_mixing_matrix(0.5, 0.5))
+        mixed1 = mixer(lambda t: self.chunk, None)
+        mixed2 = mixer(lambda t: self.chunk[::-1], None)
+        self.assertIs(mixed1, mixed2)
+
+        # last chunk, shorter
+        mixed3 = mixer(lambda t: self.chunk[:10], None)
+        self.assertEqual(mixed3.shape, (10, 2))
+        np.testing.assert_array_almost_equal(mixed3[:, 0], self.chunk[:10].mean(axis=1))
+
+    def test_mono(self):
+        mixer = AudioMixer(get_mixing_matrix(0.5, 0.5))
+        mono = self.chunk[:, :1]
+        self.assertIs(mixer(lambda t: mono, None), mono)
+
+    def test_pan_filter(self):
+        self.assertEqual(get_pan_filter(3., 1.), 'pan=stereo|c0=0.75*c0+0.25*c1|c1=0.75*c0+0.25*c1')
@@ -0,0 +1,80 @@
+"""
+Tests the concurrent processing of several videos.
+"""
+
+import unittest
+import os
+import shutil
+import json
+from tempfile import mkdtemp
+
+from livius.util.parallel import create_resource_limit, limited_resource
+from livius.video.processing.batch import get_video_parameters, process_videos_parallel
+
+
+def _process_test_video(workflow_instance, **kwargs):
+    """Writes the parameters of the video in its output folder, fails on the videos named 'failing'"""
+    if kwargs['video_filename'].startswith('failing'):
+        raise RuntimeError('failing on purpose')
+
+    with limited_resource('video_encoding'):
+        with open(kwargs['json_prefix'] + '_result.json', 'w') as f:
+            json.dump({'workflow': workflow_instance, 'pid': os.getpid(), 'option': kwargs['option']}, f)
+
+
+class BatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _get_videos_and_parameters(self, video_names):
+        output_folder = os.path.join(self.tmpdir, 'output')
+        thumbnails_folder = os.path.join(output_folder, 'thumbnails')
+        return [(os.path.join(self.tmpdir, video_name),
+                 get_video_parameters(os.path.join(self.tmpdir, video_name),
+                                      {'option': video_name},
+                                      output_folder=output_folder,
+                                      thumbnails_folder=thumbnails_folder))
+                for video_name in video_names]
+
+    def test_video_parameters(self):
+        (video_file, params), = self._get_videos_and_parameters(['video1.mp4'])
+
+        self.assertEqual(params['video_filename'], 'video1.mp4')
+        self.assertEqual(params['video_location'], self.tmpdir)
+        self.assertEqual(params['json_prefix'], os.path.join(self.tmpdir, 'output', 'video1', 'video1'))
+        self.assertTrue(os.path.isdir(params['thumbnails_root']))
+        self.assertFalse(params['is_visual_test'])
+        self.assertEqual(params['option'], 'video1.mp4')
+
+    def test_process_videos(self):
+        videos_and_parameters = self._get_videos_and_parameters(['video1.mp4', 'failing.mp4', 'video2.mp4'])
+
+        results = process_videos_parallel('test_workflow',
+                                          videos_and_parameters,
+                                          nb_jobs=2,
+                                          resource_limits={'video_encoding': create_resource_limit(1)},
+                                          process_function=_process_test_video)
+
+        self.assertEqual([video_file for video_file, _ in results],
+                         [video_file for video_file, _ in videos_and_parameters])
+
+        # the failure of one video does not prevent the processing of the others
+        self.assertIsNone(results[0][1])
+        self.assertIn('failing on purpose', results[1][1])
+        self.assertIsNone(results[2][1])
+
+        pids = set()
+        for video_file, params in [videos_and_parameters[0], videos_and_parameters[2]]:
+            with open(params['json_prefix'] + '_result.json') as f:
+                result = json.load(f)
+            self.assertEqual(result['workflow'], 'test_workflow')
+            self.assertEqual(result['option'], os.path.basename(video_file))
+            self.assertNotEqual(result['pid'], os.getpid())
+            pids.add(result['pid'])
+
+        # one process per video
+        self.assertEqual(len(pids), 2)
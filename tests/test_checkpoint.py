@@ -0,0 +1,195 @@
+"""
+Tests the checkpoints of the per-frame computations.
+"""
+
+import unittest
+import os
+import glob
+import shutil
+from tempfile import mkdtemp
+
+import numpy as np
+import cv2
+
+from livius.video.processing.checkpoint import FrameCheckpoint
+from livius.video.processing.frame_source import ImageFilesFrameSource
+from livius.video.processing.jobs.histogram_computation import HistogramsLABDiff
+from livius.video.processing.jobs.frame_analysis import FrameAnalysisJob, LABDiffHistogramsFeature
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedFrameSource(ImageFilesFrameSource):
+    """Frame source failing when reading the frame at position ``interrupt_at``"""
+
+    def __init__(self, filenames, interrupt_at):
+        super(InterruptedFrameSource, self).__init__(filenames)
+        self.interrupt_at = interrupt_at
+        self.read_frames = []
+
+    def get_frame(self, index):
+        if index == self.interrupt_at:
+            raise Interrupted()
+        self.read_frames.append(index)
+        return super(InterruptedFrameSource, self).get_frame(index)
+
+
+class CountingFrameSource(InterruptedFrameSource):
+
+    def __init__(self, filenames):
+        super(CountingFrameSource, self).__init__(filenames, None)
+
+
+class HistogramsAnalysis(FrameAnalysisJob):
+    feature_classes = [LABDiffHistogramsFeature]
+
+
+class CheckpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+        self.filenames = []
+        rng = np.random.RandomState(0)
+        for i in range(10):
+            im = rng.randint(0, 256, size=(24, 32, 3)).astype(np.uint8)
+            filename = os.path.join(self.tmpdir, 'frame-%05d.png' % (i + 1))
+            cv2.imwrite(filename, im)
+            self.filenames.append(filename)
+
+        self.areas = [(u'slides', [0, 0, 0.5, 1]), (u'speaker_00', [0.5, 0, 0.5, 1])]
+        self.slide_location = [[0.2, 0.1], [0.8, 0.1], [0.8, 0.9], [0.2, 0.9]]
+        self.json_prefix = os.path.join(self.tmpdir, 'video')
+
+        # the selection jobs, parents of the frame analysis, require the video file to exist
+        open(os.path.join(self.tmpdir, 'video.mp4'), 'w').close()
+        self.analysis_kwargs = {'json_prefix': self.json_prefix,
+                                'video_filename': 'video.mp4',
+                                'video_location': self.tmpdir,
+                                'nb_vertical_stripes': 2,
+                                'checkpoint_interval': '4',
+                                'nb_processes': '1'}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_checkpoint_files(self):
+        return glob.glob(os.path.join(self.tmpdir, '*.checkpoint.*'))
+
+    def test_iter_from(self):
+        source = ImageFilesFrameSource(self.filenames)
+        frames = list(source.iter_from(7))
+        self.assertEqual(len(frames), 3)
+        np.testing.assert_array_equal(frames[0], cv2.imread(self.filenames[7]))
+        self.assertEqual(list(source.iter_from(10)), [])
+
+    def test_checkpoint_storage(self):
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        checkpoint = FrameCheckpoint(job, 4)
+        self.assertEqual(checkpoint.load(), (0, None))
+
+        values = np.arange(10)
+        labels = ['frame%d' % index for index in range(10)]
+        requested = []
+
+        def get_values(start, stop):
+            requested.append((start, stop))
+            return {'values': values[start:stop], 'labels': labels[start:stop]}
+
+        checkpoint.update(3, lambda start, stop: self.fail('no checkpoint before the interval'))
+        checkpoint.update(4, get_values)
+        checkpoint.update(6, lambda start, stop: self.fail('no checkpoint before the interval'))
+
+        nb_frames, stored = FrameCheckpoint(job, 4).load()
+        self.assertEqual(nb_frames, 4)
+        np.testing.assert_array_equal(stored['values'], values[:4])
+        self.assertEqual(stored['labels'], labels[:4])
+
+        # only the frames processed since the last checkpoint are stored, the blocks being joined on resume
+        checkpoint.update(9, get_values)
+        self.assertEqual(requested, [(0, 4), (4, 9)])
+
+        resumed = FrameCheckpoint(job, 4)
+        nb_frames, stored = resumed.load()
+        self.assertEqual(nb_frames, 9)
+        np.testing.assert_array_equal(stored['values'], values[:9])
+        self.assertEqual(stored['labels'], labels[:9])
+
+        resumed.update(10, lambda start, stop: self.fail('no checkpoint before the interval'))
+        self.assertEqual(resumed.nb_frames_saved, 9)
+
+        # disabled checkpoints
+        self.assertEqual(FrameCheckpoint(job, 0).load(), (0, None))
+
+        checkpoint.remove()
+        self.assertEqual(self.get_checkpoint_files(), [])
+
+    def test_histograms_resume(self):
+        job_reference = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'reference'))
+        job_reference.run(self.areas, self.filenames)
+
+        job = HistogramsLABDiff(json_prefix=self.json_prefix, checkpoint_interval='3')
+        with self.assertRaises(Interrupted):
+            job.run(self.areas, InterruptedFrameSource(self.filenames, 7))
+        self.assertNotEqual(self.get_checkpoint_files(), [])
+
+        # restarts after the checkpoint computed on the 6 first frames, reading the reference frame first
+        frames = CountingFrameSource(self.filenames)
+        job = HistogramsLABDiff(json_prefix=self.json_prefix, checkpoint_interval='3')
+        job.run(self.areas, frames)
+
+        self.assertEqual(frames.read_frames, [0] + range(6, 10))
+        np.testing.assert_array_equal(job.histograms_labdiff, job_reference.histograms_labdiff)
+        self.assertEqual(self.get_checkpoint_files(), [])
+
+    def test_frame_analysis_resume(self):
+        job_reference = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'reference'))
+        job_reference.run(self.areas, self.filenames)
+
+        job = HistogramsAnalysis(**self.analysis_kwargs)
+        with self.assertRaises(Interrupted):
+            job.run(self.areas, InterruptedFrameSource(self.filenames, 9), self.slide_location)
+
+        frames = CountingFrameSource(self.filenames)
+        job = HistogramsAnalysis(**self.analysis_kwargs)
+        job.run(self.areas, frames, self.slide_location)
+
+        self.assertEqual(frames.read_frames, [0, 8, 9])
+        np.testing.assert_array_equal(job.frame_features['histograms_labdiff']['histograms'],
+                                      job_reference.histograms_labdiff)
+        self.assertEqual(self.get_checkpoint_files(), [])
+
+    def test_frame_analysis_resume_several_processes(self):
+        job_reference = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'reference'))
+        job_reference.run(self.areas, self.filenames)
+
+        # the checkpoints follow the ranges of frames completed by the workers, in order
+        job = HistogramsAnalysis(**dict(self.analysis_kwargs, nb_processes='3'))
+        with self.assertRaises(Interrupted):
+            job.run(self.areas, InterruptedFrameSource(self.filenames, 9), self.slide_location)
+
+        frames = CountingFrameSource(self.filenames)
+        job = HistogramsAnalysis(**self.analysis_kwargs)
+        job.run(self.areas, frames, self.slide_location)
+
+        self.assertEqual(frames.read_frames, [0, 8, 9])
+        np.testing.assert_array_equal(job.frame_features['histograms_labdiff']['histograms'],
+                                      job_reference.histograms_labdiff)
+
+    def test_other_configuration(self):
+        job = HistogramsAnalysis(**self.analysis_kwargs)
+        with self.assertRaises(Interrupted):
+            job.run(self.areas, InterruptedFrameSource(self.filenames, 9), self.slide_location)
+
+        # the checkpoint was made with another percentile: not used
+        frames = CountingFrameSource(self.filenames)
+        job = HistogramsAnalysis(histogram_contrast_enhancement_percentile='0.05', **self.analysis_kwargs)
+        job.run(self.areas, frames, self.slide_location)
+
+        self.assertEqual(frames.read_frames, range(10))
+
+
+if __name__ == '__main__':
+    unittest.main()
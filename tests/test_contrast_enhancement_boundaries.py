@@ -0,0 +1,68 @@
+"""
+Tests the functions of time giving the boundaries of the contrast enhancement.
+"""
+
+import unittest
+
+import numpy as np
+
+from livius.video.processing.jobs.contrast_enhancement_boundaries import SegmentLocator, \
+    ComputeExtremaOnAndBetweenSegments, ComputesExtremaByLinearInterpolationOnSegments
+
+
+class SegmentLocatorTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+
+        # separated segments, as given by the segment computation
+        self.segments = []
+        t = 3
+        for _ in range(40):
+            length = rng.randint(2, 10)
+            self.segments.append([t, t + length])
+            t += length + rng.randint(1, 4)
+
+        self.boundaries = rng.randint(0, 256, size=t + 5).tolist()
+        self.segment_values = dict((index, rng.uniform(0, 255, size=end - start).tolist())
+                                   for index, (start, end) in enumerate(self.segments))
+
+        # the boundaries of the segments, and times between them
+        self.times = sorted(set(np.arange(0, t + 5, 0.25).tolist() +
+                                [value for segment in self.segments for value in segment]))
+
+    def test_locate(self):
+        locator = SegmentLocator([start for start, _ in self.segments], [end for _, end in self.segments])
+        self.assertTrue(locator.is_sorted)
+
+        for t in self.times:
+            self.assertEqual(locator.locate(t), locator.locate_by_scan(t))
+
+        self.assertEqual(locator.locate(0), (0, False))
+        self.assertEqual(locator.locate(self.segments[0][0]), (0, True))
+        self.assertEqual(locator.locate(self.segments[-1][1] + 1), (len(self.segments), False))
+
+    def test_unsorted(self):
+        locator = SegmentLocator([10, 0], [12, 2])
+        self.assertFalse(locator.is_sorted)
+        self.assertEqual(locator.locate(1), (0, False))
+        self.assertEqual(locator.locate(11), (0, True))
+
+    def _assert_same_as_scan(self, function):
+        values = [function(t) for t in self.times]
+
+        function.segment_locator.is_sorted = False
+        values_scan = [function(t) for t in self.times]
+
+        self.assertEqual(values, values_scan)
+
+    def test_extrema_on_and_between_segments(self):
+        self._assert_same_as_scan(ComputeExtremaOnAndBetweenSegments(self.boundaries, self.segments, 0))
+
+    def test_extrema_by_linear_interpolation(self):
+        function = ComputesExtremaByLinearInterpolationOnSegments(self.segment_values, self.segments, 255)
+        self._assert_same_as_scan(function)
+
+        self.assertEqual(function(0), 255)
+        self.assertEqual(function(self.segments[0][0]), self.segment_values[0][0])
+        self.assertEqual(function(self.segments[-1][1] + 1), self.segment_values[len(self.segments) - 1][-1])
@@ -0,0 +1,111 @@
+"""
+Tests the ffmpeg runner and the parsing of the progress of ffmpeg.
+"""
+
+import unittest
+import os
+import shutil
+import distutils.spawn
+from tempfile import mkdtemp
+
+from livius.util.ffmpeg_runner import FFMpegProgressParser, run_ffmpeg
+
+progress_output = """frame=25
+fps=12.50
+stream_0_0_q=-0.0
+bitrate=N/A
+total_size=N/A
+out_time_us=1000000
+out_time_ms=1000000
+out_time=00:00:01.000000
+dup_frames=0
+drop_frames=0
+speed=0.5x
+progress=continue
+frame=100
+fps=25.00
+out_time=00:00:04.000000
+progress=end
+"""
+
+
+class FFMpegProgressTests(unittest.TestCase):
+
+    def test_parse(self):
+        parser = FFMpegProgressParser(duration=10, start_time=0)
+        blocks = [progress for progress in (parser.feed(line) for line in progress_output.splitlines())
+                  if progress is not None]
+        self.assertEqual(len(blocks), 2)
+
+        progress = blocks[0]
+        self.assertEqual(progress.frame, 25)
+        self.assertEqual(progress.fps, 12.5)
+        self.assertEqual(progress.out_time, 1)
+        self.assertEqual(progress.values['bitrate'], 'N/A')
+        self.assertFalse(progress.is_end)
+
+        # out_time given as a time
+        self.assertEqual(blocks[1].out_time, 4)
+        self.assertTrue(blocks[1].is_end)
+        self.assertEqual(blocks[1].eta, 0)
+
+    def test_eta(self):
+        parser = FFMpegProgressParser(duration=10)
+        parser.start_time -= 2
+        for line in ['frame=10', 'fps=0.0', 'out_time_us=4000000']:
+            self.assertIsNone(parser.feed(line))
+
+        progress = parser.feed('progress=continue')
+        self.assertAlmostEqual(progress.speed, 2, places=1)
+        self.assertAlmostEqual(progress.eta, 3, places=1)
+
+        # fps computed from the elapsed time when not reported
+        self.assertAlmostEqual(progress.fps, 5, places=1)
+
+        # unknown duration
+        parser = FFMpegProgressParser()
+        self.assertIsNone(parser.feed('progress=continue').eta)
+
+
+@unittest.skipIf(distutils.spawn.find_executable('ffmpeg') is None, "ffmpeg not available")
+class FFMpegRunnerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_arguments(self, duration):
+        return ['ffmpeg', '-y', '-v', 'error',
+                '-f', 'lavfi', '-i', 'testsrc=duration=%d:size=64x48:rate=10' % duration,
+                os.path.join(self.tmpdir, 'output.avi')]
+
+    def test_progress(self):
+        blocks = []
+        last_progress = run_ffmpeg(self.get_arguments(2), progress_callback=blocks.append, duration=2)
+
+        self.assertTrue(blocks)
+        self.assertIs(blocks[-1], last_progress)
+        self.assertTrue(last_progress.is_end)
+        self.assertEqual(last_progress.frame, 20)
+
+    def test_failure(self):
+        with self.assertRaises(RuntimeError):
+            run_ffmpeg(['ffmpeg', '-v', 'error', '-i', os.path.join(self.tmpdir, 'missing.mp4'),
+                        os.path.join(self.tmpdir, 'output.avi')])
+
+    def test_timeout(self):
+        with self.assertRaises(RuntimeError):
+            run_ffmpeg(self.get_arguments(100000), timeout=0.5)
+
+    def test_callback_error(self):
+        def callback(progress):
+            raise ValueError('stop')
+
+        with self.assertRaises(ValueError):
+            run_ffmpeg(self.get_arguments(100000), progress_callback=callback)
+
+
+if __name__ == '__main__':
+    unittest.main()
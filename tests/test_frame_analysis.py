@@ -0,0 +1,133 @@
+"""
+Tests the one pass computation of the per-frame features.
+"""
+
+import unittest
+import os
+import shutil
+from tempfile import mkdtemp
+
+import numpy as np
+import cv2
+
+from livius.video.processing.jobs.frame_analysis import FrameAnalysisJob, FrameFeature, \
+    LABDiffHistogramsFeature, SlideContrastBoundariesFeature, HistogramsLABDiffFromAnalysis, \
+    ContrastEnhancementBoundariesFromAnalysis
+from livius.video.processing.jobs.histogram_computation import HistogramsLABDiff
+from livius.video.processing.jobs.contrast_enhancement_boundaries import ContrastEnhancementBoundaries
+
+
+class MeanIntensityFeature(FrameFeature):
+    name = 'mean_intensity'
+
+    def __init__(self, job, nb_frames):
+        super(MeanIntensityFeature, self).__init__(job, nb_frames)
+        self.means = []
+
+    def process_frame(self, index, conversions):
+        self.means.append(float(conversions.gray.mean()))
+
+    def get_result(self):
+        return self.means
+
+
+class HistogramsAnalysis(FrameAnalysisJob):
+    feature_classes = [LABDiffHistogramsFeature]
+
+
+class ContrastAnalysis(FrameAnalysisJob):
+    feature_classes = [SlideContrastBoundariesFeature]
+
+
+class FrameAnalysisTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+        # the selection jobs require the video file to exist
+        open(os.path.join(self.tmpdir, 'video.mp4'), 'w').close()
+        self.kwargs = {'json_prefix': os.path.join(self.tmpdir, 'video'),
+                       'video_filename': 'video.mp4',
+                       'video_location': self.tmpdir,
+                       'nb_vertical_stripes': 2}
+
+        self.filenames = []
+        rng = np.random.RandomState(0)
+        for i in range(5):
+            im = rng.randint(0, 256, size=(30, 40, 3)).astype(np.uint8)
+            filename = os.path.join(self.tmpdir, 'frame-%05d.png' % (i + 1))
+            cv2.imwrite(filename, im)
+            self.filenames.append(filename)
+
+        self.areas = [(u'slides', [0, 0.1, 0.2, 0.8]),
+                      (u'slides', [0.8, 0.1, 0.2, 0.8]),
+                      (u'speaker_00', [0, 0.5, 0.5, 0.5]),
+                      (u'speaker_01', [0.5, 0.5, 0.5, 0.5])]
+        self.slide_location = [[0.2, 0.1], [0.8, 0.1], [0.8, 0.9], [0.2, 0.9]]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_histograms(self):
+        job = HistogramsAnalysis(**self.kwargs)
+        job.run(self.areas, self.filenames, self.slide_location)
+
+        job_histograms = HistogramsLABDiff(json_prefix=self.kwargs['json_prefix'])
+        job_histograms.run(self.areas, self.filenames)
+
+        histograms = job.frame_features['histograms_labdiff']
+        self.assertEqual(histograms['area_names'], job_histograms.histogram_area_names)
+        np.testing.assert_array_equal(histograms['histograms'], job_histograms.histograms_labdiff)
+
+    @unittest.skipIf(not cv2.__version__.startswith('2.'), "OpenCV 2 API needed")
+    def test_same_contrast_boundaries(self):
+        job = ContrastAnalysis(**self.kwargs)
+        job.run(self.areas, self.filenames, self.slide_location)
+
+        job_contrast = ContrastEnhancementBoundaries(json_prefix=self.kwargs['json_prefix'])
+        job_contrast.run(self.filenames, self.slide_location)
+
+        boundaries = job.frame_features['contrast_enhancement_boundaries']
+        self.assertEqual(boundaries['min_bounds'], job_contrast.min_bounds)
+        self.assertEqual(boundaries['max_bounds'], job_contrast.max_bounds)
+
+    def test_several_processes(self):
+        job = HistogramsAnalysis(nb_processes='1', **self.kwargs)
+        job.run(self.areas, self.filenames, self.slide_location)
+
+        # the frames are analysed by ranges in the workers
+        job_processes = HistogramsAnalysis(nb_processes='3', **self.kwargs)
+        job_processes.run(self.areas, self.filenames, self.slide_location)
+
+        np.testing.assert_array_equal(job_processes.frame_features['histograms_labdiff']['histograms'],
+                                      job.frame_features['histograms_labdiff']['histograms'])
+
+    def test_nb_processes_option(self):
+        # the runtime option given to the workflow reaches the analysis
+        job = HistogramsLABDiffFromAnalysis(nb_processes='4', **self.kwargs)
+        self.assertEqual(job.frame_analysis.nb_processes, '4')
+
+    def test_state_files(self):
+        # the Jobs exposing the features do not use the state files of the Jobs they replace
+        for job_class, replaced_class in [(HistogramsLABDiffFromAnalysis, HistogramsLABDiff),
+                                          (ContrastEnhancementBoundariesFromAnalysis, ContrastEnhancementBoundaries)]:
+            self.assertNotEqual(job_class(**self.kwargs).json_filename, replaced_class(**self.kwargs).json_filename)
+
+    def test_register_feature(self):
+        class FrameAnalysisWithMean(HistogramsAnalysis):
+            pass
+
+        FrameAnalysisWithMean.register_feature(MeanIntensityFeature)
+        self.assertNotIn(MeanIntensityFeature, HistogramsAnalysis.feature_classes)
+        self.assertNotIn(MeanIntensityFeature, FrameAnalysisJob.feature_classes)
+
+        with self.assertRaises(RuntimeError):
+            FrameAnalysisWithMean.register_feature(MeanIntensityFeature)
+
+        job = FrameAnalysisWithMean(**self.kwargs)
+        self.assertEqual(job.features, ['histograms_labdiff', 'mean_intensity'])
+        job.run(self.areas, self.filenames, self.slide_location)
+
+        means = job.frame_features['mean_intensity']
+        self.assertEqual(len(means), 5)
+        self.assertAlmostEqual(means[0], cv2.cvtColor(cv2.imread(self.filenames[0]), cv2.COLOR_BGR2GRAY).mean())
@@ -0,0 +1,193 @@
+"""
+Tests the frame sources feeding the per-frame analysis Jobs.
+"""
+
+import unittest
+import os
+import shutil
+import distutils.spawn
+from tempfile import mkdtemp
+
+import numpy as np
+import cv2
+
+from livius.video.processing.frame_source import ImageFilesFrameSource, FFMpegFrameSource, MemmapFrameSource, \
+    write_memmap_frames, as_frame_source, get_video_identity, video_identity_size
+from livius.video.processing.jobs.histogram_computation import HistogramsLABDiff
+from livius.video.processing.jobs.ffmpeg_to_thumbnails import FFMpegThumbnailsJob
+
+
+class FrameSourceTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+        self.images = []
+        self.filenames = []
+        rng = np.random.RandomState(0)
+        for i in range(4):
+            im = rng.randint(0, 256, size=(24, 32, 3)).astype(np.uint8)
+            filename = os.path.join(self.tmpdir, 'frame-%05d.png' % (i + 1))
+            cv2.imwrite(filename, im)
+            self.images.append(im)
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_image_files(self):
+        source = as_frame_source(self.filenames)
+        self.assertIsInstance(source, ImageFilesFrameSource)
+        self.assertIs(as_frame_source(source), source)
+
+        self.assertEqual(len(source), 4)
+        for im, frame in zip(self.images, source):
+            np.testing.assert_array_equal(im, frame)
+
+        np.testing.assert_array_equal(source.get_frame(2), self.images[2])
+
+    def test_histograms_on_frame_source(self):
+        areas = [(u'slides', [0, 0, 0.5, 1]), (u'speaker_00', [0.5, 0, 0.5, 1])]
+
+        job_files = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'files'))
+        job_files.run(areas, self.filenames)
+
+        job_source = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'source'))
+        job_source.run(areas, ImageFilesFrameSource(self.filenames))
+
+        self.assertEqual(job_source.histograms_labdiff.shape, (4, 2, 256))
+        np.testing.assert_array_equal(job_files.histograms_labdiff, job_source.histograms_labdiff)
+
+    def test_memmap_frames(self):
+        filename = os.path.join(self.tmpdir, 'frames.raw')
+        write_memmap_frames(filename, ImageFilesFrameSource(self.filenames), fps=2)
+        self.assertFalse(os.path.exists(filename + '.tmp'))
+
+        source = MemmapFrameSource(filename)
+        self.assertIs(as_frame_source(source), source)
+        self.assertEqual(len(source), 4)
+        self.assertEqual((source.width, source.height), (32, 24))
+
+        for im, frame in zip(self.images, source):
+            np.testing.assert_array_equal(im, frame)
+        np.testing.assert_array_equal(list(source.iter_from(3)), self.images[3:])
+
+        # views on the mapped file
+        frame = source.get_frame(2)
+        np.testing.assert_array_equal(frame, self.images[2])
+        self.assertIsInstance(frame, np.memmap)
+        self.assertFalse(frame.flags.writeable)
+        with self.assertRaises(IndexError):
+            source.get_frame(4)
+
+        # the frames written from the image files are identified by the raw file
+        self.assertEqual(source.video_key, get_video_identity(filename))
+        self.assertEqual(len(set(source.get_frame_keys())), 4)
+
+        areas = [(u'slides', [0, 0, 0.5, 1]), (u'speaker_00', [0.5, 0, 0.5, 1])]
+        job_files = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'files'))
+        job_files.run(areas, self.filenames)
+
+        job_memmap = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'memmap'))
+        job_memmap.run(areas, source)
+        np.testing.assert_array_equal(job_files.histograms_labdiff, job_memmap.histograms_labdiff)
+
+    def test_video_frame_keys(self):
+        video = os.path.join(self.tmpdir, 'video.mp4')
+        other_video = os.path.join(self.tmpdir, 'other_video.mp4')
+        for filename, content in [(video, 'video content'), (other_video, 'other video content')]:
+            with open(filename, 'wb') as f:
+                f.write(content + '\0' * video_identity_size)
+
+        keys = FFMpegFrameSource(video, width=32, height=24, fps=2, nb_frames=4).get_frame_keys()
+        self.assertEqual(len(set(keys)), 4)
+
+        # another video of the same size and duration
+        other_keys = FFMpegFrameSource(other_video, width=32, height=24, fps=2, nb_frames=4).get_frame_keys()
+        self.assertFalse(set(keys) & set(other_keys))
+
+        # the keys of an extended recording are kept
+        with open(video, 'ab') as f:
+            f.write('extension')
+        self.assertEqual(FFMpegFrameSource(video, width=32, height=24, fps=2, nb_frames=6).get_frame_keys()[:4],
+                         keys)
+
+        # same keys for the frames of the raw file as for the frames decoded on the fly
+        frames = ImageFilesFrameSource(self.filenames)
+        frames.video_key = get_video_identity(video)
+        filename = os.path.join(self.tmpdir, 'frames.raw')
+        write_memmap_frames(filename, frames, fps=2)
+        self.assertEqual(MemmapFrameSource(filename).get_frame_keys(), keys)
+
+    def test_memmap_frames_errors(self):
+        with self.assertRaises(RuntimeError):
+            write_memmap_frames(os.path.join(self.tmpdir, 'frames.raw'), ImageFilesFrameSource([]), fps=1)
+
+        with self.assertRaises(RuntimeError):
+            MemmapFrameSource(self.filenames[0])
+
+    @unittest.skipIf(distutils.spawn.find_executable('ffmpeg') is None, "ffmpeg not available")
+    def test_ffmpeg_stream(self):
+        video = os.path.join(self.tmpdir, 'video.avi')
+        writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'MJPG'), 2, (32, 24))
+        for im in self.images:
+            writer.write(im)
+        writer.release()
+
+        source = FFMpegFrameSource(video, width=16, height=12, fps=1, nb_frames=3)
+        frames = list(source)
+        self.assertEqual(len(frames), 3)
+        for frame in frames:
+            self.assertEqual(frame.shape, (12, 16, 3))
+            self.assertEqual(frame.dtype, np.uint8)
+
+        # stream shorter by a frame or two: the last frame is repeated
+        source = FFMpegFrameSource(video, width=16, height=12, fps=1, nb_frames=4)
+        frames = list(source)
+        self.assertEqual(len(frames), 4)
+        np.testing.assert_array_equal(frames[-1], frames[-2])
+
+        self.assertEqual(source.get_frame(1).shape, (12, 16, 3))
+
+        # much shorter stream: the frames are missing
+        source = FFMpegFrameSource(video, width=16, height=12, fps=1, nb_frames=10)
+        with self.assertRaises(RuntimeError):
+            list(source)
+
+        # ffmpeg does not start decoding within the timeout
+        source = FFMpegFrameSource(video, width=16, height=12, fps=1, nb_frames=3, timeout=1e-4)
+        with self.assertRaises(RuntimeError) as context:
+            list(source)
+        self.assertIn('within', str(context.exception))
+
+    @unittest.skipIf(distutils.spawn.find_executable('ffmpeg') is None, "ffmpeg not available")
+    def test_ffmpeg_stream_error(self):
+        video = os.path.join(self.tmpdir, 'video.avi')
+        with open(video, 'wb') as f:
+            f.write('not a video' * 100)
+
+        source = FFMpegFrameSource(video, width=16, height=12, fps=1, nb_frames=3)
+        with self.assertRaises(RuntimeError) as context:
+            list(source)
+        self.assertIn('ffmpeg failed', str(context.exception))
+
+    @unittest.skipIf(distutils.spawn.find_executable('ffmpeg') is None, "ffmpeg not available")
+    def test_raw_thumbnails_job(self):
+        video = os.path.join(self.tmpdir, 'video.avi')
+        writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'MJPG'), 1, (32, 24))
+        for im in self.images:
+            writer.write(im)
+        writer.release()
+
+        job = FFMpegThumbnailsJob(json_prefix=os.path.join(self.tmpdir, 'video'),
+                                  video_filename='video.avi',
+                                  video_location=self.tmpdir,
+                                  video_width=16,
+                                  thumbnails_format='raw')
+        job.run()
+        job.serialize_state()
+
+        source = job.get_outputs()
+        self.assertIsInstance(source, MemmapFrameSource)
+        self.assertEqual(len(source), job.stream_parameters['nb_frames'])
+        self.assertEqual(source.get_frame(0).shape, (12, 16, 3))
@@ -0,0 +1,129 @@
+"""
+Tests the computation of the histograms on several areas.
+"""
+
+import unittest
+import os
+import json
+import shutil
+from tempfile import mkdtemp
+
+import numpy as np
+import cv2
+
+from livius.util.tools import crop_image_from_normalized_coordinates
+from livius.video.processing.jobs.histogram_computation import AreaHistograms, HistogramsLABDiff, \
+    get_area_histograms_functor, LABDifference
+
+
+class AreaHistogramsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+        # overlapping areas, areas merged by name and area going out of the image
+        self.areas = [(u'slides', [0, 0.2, 0.3, 0.6]),
+                      (u'slides', [0.7, 0.2, 0.3, 0.6]),
+                      (u'speaker_00', [0, 0.5, 0.55, 0.5]),
+                      (u'speaker_01', [0.45, 0.5, 0.6, 0.5])]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_as_calchist(self):
+        rng = np.random.RandomState(0)
+        image = rng.uniform(0, 256, size=(37, 51))
+
+        area_histograms = AreaHistograms(self.areas, image.shape)
+        self.assertEqual(area_histograms.area_names, [u'slides', u'speaker_00', u'speaker_01'])
+
+        out = np.zeros(area_histograms.shape, dtype=np.float32)
+        area_histograms.accumulate(image, out)
+
+        for index, area_name in enumerate(area_histograms.area_names):
+            expected = np.zeros(256, dtype=np.float32)
+            for name, rect in self.areas:
+                if name == area_name:
+                    cropped = crop_image_from_normalized_coordinates(image, rect)
+                    expected += cv2.calcHist([cropped.astype(np.uint8)], [0], None, [256], [0, 256]).ravel()
+
+            np.testing.assert_array_equal(out[index], expected)
+
+    def test_functor(self):
+        histograms = np.arange(3 * 2 * 256, dtype=np.float32).reshape(3, 2, 256)
+        get_histogram = get_area_histograms_functor(histograms, [u'slides', u'speaker_00'])
+
+        np.testing.assert_array_equal(get_histogram(u'speaker_00', 2), histograms[2, 1])
+        np.testing.assert_array_equal(get_histogram(u'slides', 1), histograms[1, 0])
+
+        # views on the histograms
+        self.assertTrue(np.shares_memory(get_histogram(u'slides', 1), histograms))
+
+        # range of frames
+        np.testing.assert_array_equal(get_histogram.get_range(u'speaker_00', 1, 3), histograms[1:3, 1])
+        np.testing.assert_array_equal(get_histogram(u'slides', slice(0, 2)), histograms[0:2, 0])
+        np.testing.assert_array_equal(get_histogram(u'slides', 2, slice(10, 12)), histograms[2, 0, 10:12])
+
+        with self.assertRaises(RuntimeError):
+            get_area_histograms_functor(histograms, [u'slides'])
+
+    def test_previous_state_format(self):
+        job = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'test'))
+        with open(job.json_filename, 'w') as f:
+            json.dump({'histograms_labdiff': {'slides': {'2': [1] * 256, '1': [2] * 256},
+                                              'speaker_00': {'1': [3] * 256, '2': [4] * 256}}},
+                      f)
+
+        state = job.load_state()
+        self.assertEqual(state['histogram_area_names'], [u'slides', u'speaker_00'])
+        self.assertEqual(state['histograms_labdiff'].shape, (3, 2, 256))
+        np.testing.assert_array_equal(state['histograms_labdiff'][0], 0)
+        np.testing.assert_array_equal(state['histograms_labdiff'][1, 0], 2)
+        np.testing.assert_array_equal(state['histograms_labdiff'][2, 1], 4)
+
+    def test_lab_difference(self):
+        rng = np.random.RandomState(1)
+        imlab_t = rng.randint(0, 256, size=(20, 30, 3)).astype(np.uint8)
+        imlab_tm1 = rng.randint(0, 256, size=(20, 30, 3)).astype(np.uint8)
+        imlab_t[0, 0] = [255, 255, 255]
+        imlab_tm1[0, 0] = [0, 0, 0]
+
+        expected = np.minimum(np.sqrt(np.sum((imlab_t.astype(np.float64) - imlab_tm1) ** 2, axis=2)), 255)
+
+        lab_difference = LABDifference(imlab_t.shape)
+        for _ in range(2):
+            distances = lab_difference.compute(imlab_t, imlab_tm1)
+            np.testing.assert_allclose(distances, expected, rtol=1e-6)
+
+        # no overflow of the differences, the distances are saturated
+        self.assertEqual(distances[0, 0], 255)
+        self.assertLessEqual(distances.max(), 255)
+
+    def test_largest_difference_in_last_bin(self):
+        white = np.full((4, 6, 3), 255, dtype=np.uint8)
+        black = np.zeros((4, 6, 3), dtype=np.uint8)
+
+        area_histograms = AreaHistograms([(u'slides', [0, 0, 1, 1])], white.shape)
+        histograms = np.zeros(area_histograms.shape)
+        area_histograms.accumulate(LABDifference(white.shape).compute(white, black), histograms)
+
+        self.assertEqual(histograms[0, 255], 4 * 6)
+        self.assertEqual(histograms.sum(), 4 * 6)
+
+    def test_reference_frame(self):
+        rng = np.random.RandomState(2)
+        first = rng.randint(0, 256, size=(20, 30, 3)).astype(np.uint8)
+        second = rng.randint(0, 256, size=(20, 30, 3)).astype(np.uint8)
+
+        filenames = []
+        for index, im in enumerate([first, second, second]):
+            filenames.append(os.path.join(self.tmpdir, 'frame-%05d.png' % index))
+            cv2.imwrite(filenames[-1], im)
+
+        job = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'test'))
+        job.run([(u'slides', [0, 0, 1, 1])], filenames)
+
+        # all the frames are compared to the first one
+        np.testing.assert_array_equal(job.histograms_labdiff[2], job.histograms_labdiff[1])
+        self.assertLess(job.histograms_labdiff[1, 0, 0], 20 * 30)
+        self.assertEqual(job.histograms_labdiff[1].sum(), 20 * 30)
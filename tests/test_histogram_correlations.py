@@ -0,0 +1,95 @@
+"""
+Tests the comparisons of the histograms of consecutive frames.
+"""
+
+import unittest
+import os
+import shutil
+from tempfile import mkdtemp
+
+import numpy as np
+import cv2
+
+from livius.util.histogram import compare_consecutive_histograms
+from livius.video.processing.jobs.histogram_computation import get_area_histograms_functor
+from livius.video.processing.jobs.histogram_correlations import HistogramCorrelationJob
+
+
+def _get_opencv_method(name):
+    # OpenCV 3+ / OpenCV 2 constants
+    if hasattr(cv2, 'HISTCMP_' + name):
+        return getattr(cv2, 'HISTCMP_' + name)
+    return getattr(cv2.cv, 'CV_COMP_' + name)
+
+
+class HistogramComparisonTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+        rng = np.random.RandomState(0)
+        self.area_names = [u'slides', u'speaker_00', u'speaker_01']
+        self.histograms = rng.randint(0, 50, size=(12, 3, 256)).astype(np.float32)
+
+        # empty and constant histograms
+        self.histograms[0] = 0
+        self.histograms[4, 1] = 0
+        self.histograms[7, 2] = 3
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_as_opencv(self):
+        histograms = self.histograms.transpose(1, 0, 2)
+        for method, opencv_name in [('correl', 'CORREL'),
+                                    ('chisqr', 'CHISQR'),
+                                    ('intersect', 'INTERSECT'),
+                                    ('bhattacharyya', 'BHATTACHARYYA')]:
+            comparisons = compare_consecutive_histograms(histograms, method)
+            self.assertEqual(comparisons.shape, (3, 11))
+
+            expected = [[cv2.compareHist(histograms[area, i + 1], histograms[area, i], _get_opencv_method(opencv_name))
+                         for i in range(11)]
+                        for area in range(3)]
+            np.testing.assert_allclose(comparisons, expected, rtol=1e-9, atol=1e-9)
+
+        with self.assertRaises(RuntimeError):
+            compare_consecutive_histograms(histograms, 'unknown')
+
+    def test_job(self):
+        get_histogram = get_area_histograms_functor(self.histograms, self.area_names)
+
+        job = HistogramCorrelationJob(json_prefix=os.path.join(self.tmpdir, 'video'),
+                                      histogram_comparison_methods='chisqr, correl')
+        self.assertEqual(job.histogram_comparison_methods, ['correl', 'chisqr'])
+
+        job.run(get_histogram, 12, 2)
+
+        histograms = self.histograms.transpose(1, 0, 2)
+        expected = compare_consecutive_histograms(histograms[:, 1:], 'correl')
+
+        self.assertEqual(sorted(job.histogram_correlations.keys()), range(2, 12))
+        for frame_index, correlation in job.histogram_correlations.items():
+            self.assertAlmostEqual(correlation, expected[0, frame_index - 2])
+
+        speaker_correlations = job.get_speaker_correlations()
+        self.assertEqual(speaker_correlations.shape, (2, 12))
+        self.assertTrue(np.isnan(speaker_correlations[:, :2]).all())
+        np.testing.assert_allclose(speaker_correlations[:, 2:], expected[1:])
+
+        np.testing.assert_allclose(job.get_area_comparisons('chisqr')['speaker_01'][2:],
+                                   compare_consecutive_histograms(histograms[2, 1:], 'chisqr'))
+
+        # same results from a plain function
+        job_function = HistogramCorrelationJob(json_prefix=os.path.join(self.tmpdir, 'function'))
+        job_function.run(lambda area_name, frame_index: get_histogram(area_name, frame_index), 12, 2)
+        self.assertEqual(job_function.histogram_correlations, job.histogram_correlations)
+
+    def test_unknown_method(self):
+        with self.assertRaises(RuntimeError):
+            HistogramCorrelationJob(json_prefix=os.path.join(self.tmpdir, 'video'),
+                                    histogram_comparison_methods=['emd'])
+
+
+if __name__ == '__main__':
+    unittest.main()
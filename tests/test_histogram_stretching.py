@@ -0,0 +1,75 @@
+"""
+Tests the histogram stretching with lookup tables.
+"""
+
+import unittest
+
+import numpy as np
+
+from livius.util.histogram import get_histogram_stretching_lut, HistogramStretching
+
+
+def _stretch_float(image, min_val, max_val):
+    """Reference stretching computed on the full image"""
+    contrast_enhanced = (np.maximum(image.astype(np.float32) - min_val, 0)) * (255.0 / (max_val - min_val))
+    contrast_enhanced = np.minimum(contrast_enhanced, 255.0)
+    return contrast_enhanced.astype(np.uint8)
+
+
+class HistogramStretchingTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.image = rng.randint(0, 256, size=(48, 64, 3)).astype(np.uint8)
+
+    def test_lut(self):
+        for min_val, max_val in [(0, 255), (12, 240), (17.25, 201.5), (33.3333, 180.123)]:
+            lut = get_histogram_stretching_lut(min_val, max_val)
+            self.assertEqual(lut.dtype, np.uint8)
+            self.assertEqual(lut.shape, (256,))
+            np.testing.assert_array_equal(lut[self.image], _stretch_float(self.image, min_val, max_val))
+
+    def test_stretching(self):
+        stretching = HistogramStretching()
+
+        # boundaries on the quantization grid: exact
+        np.testing.assert_array_equal(stretching(self.image, 12.5, 230.25), _stretch_float(self.image, 12.5, 230.25))
+
+        # quantized boundaries: at most one gray level of difference
+        result = stretching(self.image, 33.3333, 180.123)
+        difference = np.abs(result.astype(np.int32) - _stretch_float(self.image, 33.3333, 180.123))
+        self.assertLessEqual(difference.max(), 1)
+
+    def test_narrow_boundaries(self):
+        stretching = HistogramStretching()
+        rng = np.random.RandomState(1)
+
+        # the quantization error is amplified by 255 / (max_val - min_val)
+        for _ in range(200):
+            min_val = rng.uniform(0, 250)
+            max_val = min_val + rng.choice([0.05, 0.3, 1, 2.5, 3, 20]) * rng.uniform(1, 1.5)
+            difference = np.abs(stretching(self.image, min_val, max_val).astype(np.int32) -
+                                _stretch_float(self.image, min_val, max_val))
+            self.assertLessEqual(difference.max(), 1, (min_val, max_val))
+
+    def test_tables_cache(self):
+        stretching = HistogramStretching(max_tables=2)
+
+        lut = stretching.get_lut(10, 200)
+        self.assertIs(stretching.get_lut(10.001, 200.001), lut)
+
+        stretching.get_lut(20, 200)
+        stretching.get_lut(10, 200)
+        stretching.get_lut(30, 200)
+
+        # the least recently used is dropped
+        self.assertEqual(len(stretching.tables), 2)
+        self.assertIs(stretching.get_lut(10, 200), lut)
+
+    def test_reuse_output(self):
+        stretching = HistogramStretching(reuse_output=True)
+
+        result1 = stretching(self.image, 10, 200)
+        result2 = stretching(self.image, 20, 100)
+        self.assertIs(result1, result2)
+        np.testing.assert_array_equal(result2, _stretch_float(self.image, 20, 100))
@@ -0,0 +1,268 @@
+"""
+Tests the reuse of the per-frame outputs of the previous runs.
+"""
+
+import unittest
+import os
+import shutil
+from tempfile import mkdtemp
+
+import numpy as np
+import cv2
+
+from livius.video.processing.job import Job
+from livius.video.processing.frame_source import ImageFilesFrameSource
+from livius.video.processing.incremental import PreviousFrameOutputs
+from livius.video.processing.jobs.histogram_computation import HistogramsLABDiff, get_area_histograms_functor
+from livius.video.processing.jobs.histogram_correlations import HistogramCorrelationJob
+from livius.video.processing.jobs.frame_analysis import FrameAnalysisJob, LABDiffHistogramsFeature
+from livius.video.processing.jobs.ffmpeg_to_thumbnails import FFMpegThumbnailsJob
+
+
+class CountingFrameSource(ImageFilesFrameSource):
+    """Frame source recording the frames read"""
+
+    def __init__(self, filenames):
+        super(CountingFrameSource, self).__init__(filenames)
+        self.read_frames = []
+
+    def get_frame(self, index):
+        self.read_frames.append(index)
+        return super(CountingFrameSource, self).get_frame(index)
+
+
+class HistogramsAnalysis(FrameAnalysisJob):
+    feature_classes = [LABDiffHistogramsFeature]
+
+
+class HistogramsOfFiles(Job):
+    """Histograms of the frame files, with the keys of the frames"""
+    name = 'test_histograms_of_files'
+    attributes_to_serialize = ['areas', 'filenames']
+    outputs_to_cache = ['histograms_labdiff', 'frame_keys', 'frame_reuse_key']
+
+    def run(self, *args, **kwargs):
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, self.filenames)
+        self.histograms_labdiff = job.histograms_labdiff
+        self.frame_keys = job.frame_keys
+        self.frame_reuse_key = job.frame_reuse_key
+
+    def get_outputs(self):
+        super(HistogramsOfFiles, self).get_outputs()
+        return get_area_histograms_functor(self.histograms_labdiff, [area[0] for area in self.areas],
+                                           self.frame_keys, self.frame_reuse_key)
+
+
+class CorrelationsOfFiles(HistogramCorrelationJob):
+    parents = [HistogramsOfFiles]
+
+    def run(self, *args, **kwargs):
+        super(CorrelationsOfFiles, self).run(args[0], len(args[0].frame_keys), 1)
+
+
+class SlideComparisons(Job):
+    """Child Job of the correlations, reading all the comparisons of the slides"""
+    name = 'test_slide_comparisons'
+    outputs_to_cache = ['slide_comparisons']
+    parents = [CorrelationsOfFiles]
+
+    def run(self, *args, **kwargs):
+        self.slide_comparisons = dict((method, list(comparisons['slides'][2:]))
+                                      for method, comparisons in args[0].area_comparisons.items())
+
+    def get_outputs(self):
+        super(SlideComparisons, self).get_outputs()
+        return self.slide_comparisons
+
+
+class IncrementalTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.rng = np.random.RandomState(0)
+
+        self.filenames = [self.write_frame(i) for i in range(8)]
+
+        self.areas = [(u'slides', [0, 0, 0.5, 1]), (u'speaker_00', [0.5, 0, 0.5, 1])]
+        self.slide_location = [[0.2, 0.1], [0.8, 0.1], [0.8, 0.9], [0.2, 0.9]]
+        self.json_prefix = os.path.join(self.tmpdir, 'video')
+
+        # the selection jobs, parents of the frame analysis, require the video file to exist
+        open(os.path.join(self.tmpdir, 'video.mp4'), 'w').close()
+        self.analysis_kwargs = {'json_prefix': self.json_prefix,
+                                'video_filename': 'video.mp4',
+                                'video_location': self.tmpdir,
+                                'nb_vertical_stripes': 2,
+                                'nb_processes': '1'}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_frame(self, index):
+        filename = os.path.join(self.tmpdir, 'frame-%05d.png' % (index + 1))
+        cv2.imwrite(filename, self.rng.randint(0, 256, size=(24, 32, 3)).astype(np.uint8))
+        return filename
+
+    def get_reference_histograms(self):
+        job = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'reference'))
+        job.run(self.areas, self.filenames)
+        return job.histograms_labdiff
+
+    def test_reusable_frames(self):
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, self.filenames[:5])
+        job.serialize_state()
+
+        previous = PreviousFrameOutputs(HistogramsLABDiff(json_prefix=self.json_prefix),
+                                        ['a'] + job.frame_keys[1:3] + ['b'] + job.frame_keys[3:],
+                                        inputs=self.areas)
+        self.assertEqual(previous.get_reusable_frames(), {1: 1, 2: 2, 4: 3, 5: 4})
+        self.assertEqual(previous.get_reusable_frames(nb_preceding_frames=1), {2: 2, 5: 4})
+
+        # changed reference frame
+        self.assertEqual(previous.get_reusable_frames(reference_frames=[0]), {})
+        previous = PreviousFrameOutputs(HistogramsLABDiff(json_prefix=self.json_prefix),
+                                        job.frame_keys[:3] + ['b'] + job.frame_keys[3:],
+                                        inputs=self.areas)
+        self.assertEqual(previous.get_reusable_frames(reference_frames=[0]), {0: 0, 1: 1, 2: 2, 4: 3, 5: 4})
+
+        # other inputs
+        previous = PreviousFrameOutputs(HistogramsLABDiff(json_prefix=self.json_prefix),
+                                        job.frame_keys,
+                                        inputs=self.areas[:1])
+        self.assertEqual(previous.get_reusable_frames(), {})
+
+    def test_histograms_appended_frames(self):
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, self.filenames[:5])
+        job.serialize_state()
+
+        frames = CountingFrameSource(self.filenames)
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, frames)
+
+        # reading the reference frame and the new frames
+        self.assertEqual(frames.read_frames, [0, 5, 6, 7])
+        np.testing.assert_array_equal(job.histograms_labdiff, self.get_reference_histograms())
+
+    def test_histograms_changed_frame(self):
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, self.filenames)
+        job.serialize_state()
+
+        self.write_frame(5)
+
+        frames = CountingFrameSource(self.filenames)
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, frames)
+
+        self.assertEqual(frames.read_frames[:2], [0, 5])
+        np.testing.assert_array_equal(job.histograms_labdiff, self.get_reference_histograms())
+
+    def test_histograms_changed_reference_frame(self):
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, self.filenames)
+        job.serialize_state()
+
+        self.write_frame(0)
+
+        frames = CountingFrameSource(self.filenames)
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, frames)
+
+        self.assertEqual(frames.read_frames, [0] + range(1, 8))
+        np.testing.assert_array_equal(job.histograms_labdiff, self.get_reference_histograms())
+
+    def test_histograms_other_areas(self):
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas[:1], self.filenames)
+        job.serialize_state()
+
+        frames = CountingFrameSource(self.filenames)
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, frames)
+
+        self.assertEqual(frames.read_frames, range(8))
+
+    def test_frame_analysis_appended_frames(self):
+        job = HistogramsAnalysis(**self.analysis_kwargs)
+        job.run(self.areas, self.filenames[:6], self.slide_location)
+        job.serialize_state(with_parents=False)
+
+        frames = CountingFrameSource(self.filenames)
+        job = HistogramsAnalysis(**self.analysis_kwargs)
+        job.run(self.areas, frames, self.slide_location)
+
+        self.assertEqual(frames.read_frames, [0, 6, 7])
+        np.testing.assert_array_equal(job.frame_features['histograms_labdiff']['histograms'],
+                                      self.get_reference_histograms())
+
+    def test_correlations_appended_frames(self):
+        area_names = [u'slides', u'speaker_00']
+
+        def get_histogram(job, histograms=None):
+            return get_area_histograms_functor(job.histograms_labdiff if histograms is None else histograms,
+                                               area_names, job.frame_keys, job.frame_reuse_key)
+
+        job = HistogramsLABDiff(json_prefix=self.json_prefix)
+        job.run(self.areas, self.filenames[:5])
+        correlations = HistogramCorrelationJob(json_prefix=self.json_prefix, histogram_comparison_methods='chisqr')
+        correlations.run(get_histogram(job), 5, 1)
+        correlations.serialize_state()
+
+        job = HistogramsLABDiff(json_prefix=os.path.join(self.tmpdir, 'all'))
+        job.run(self.areas, self.filenames)
+        expected = HistogramCorrelationJob(json_prefix=os.path.join(self.tmpdir, 'all'),
+                                           histogram_comparison_methods='chisqr')
+        expected.run(get_histogram(job), 8, 1)
+
+        # the histograms of the frames preceding the last compared frame are not read again
+        histograms = np.array(job.histograms_labdiff, dtype=np.float32)
+        histograms[:4] = np.nan
+        correlations = HistogramCorrelationJob(json_prefix=self.json_prefix, histogram_comparison_methods='chisqr')
+        correlations.run(get_histogram(job, histograms), 8, 1)
+
+        self.assertEqual(correlations.histogram_correlations, expected.histogram_correlations)
+        for method in ['correl', 'chisqr']:
+            for area_name in area_names:
+                np.testing.assert_array_equal(correlations.area_comparisons[method][area_name],
+                                              expected.area_comparisons[method][area_name])
+
+    def test_area_comparisons_of_child(self):
+        kwargs = {'areas': self.areas, 'histogram_comparison_methods': 'chisqr'}
+
+        job = SlideComparisons(json_prefix=self.json_prefix, filenames=self.filenames[:5], **kwargs)
+        job.process()
+
+        # the comparisons of the first frames are reused
+        job = SlideComparisons(json_prefix=self.json_prefix, filenames=self.filenames, **kwargs)
+        job.process()
+
+        expected = SlideComparisons(json_prefix=os.path.join(self.tmpdir, 'all'), filenames=self.filenames, **kwargs)
+        expected.process()
+
+        self.assertEqual(sorted(job.get_outputs().keys()), ['chisqr', 'correl'])
+        for method in ['correl', 'chisqr']:
+            self.assertEqual(len(job.get_outputs()[method]), 6)
+            np.testing.assert_array_equal(job.get_outputs()[method], expected.get_outputs()[method])
+
+        # the comparisons loaded from the state of the correlations
+        loaded = SlideComparisons(json_prefix=self.json_prefix, filenames=self.filenames, **kwargs)
+        comparisons = loaded.histogram_correlation.get_outputs().area_comparisons
+        for method in ['correl', 'chisqr']:
+            np.testing.assert_array_equal(comparisons[method]['slides'][2:], expected.get_outputs()[method])
+
+    def test_extended_recording(self):
+        job = FFMpegThumbnailsJob(**self.analysis_kwargs)
+        parameters_hash = job.get_parameters_hash()
+
+        with open(os.path.join(self.tmpdir, 'video.mp4'), 'a') as f:
+            f.write('extended')
+
+        job = FFMpegThumbnailsJob(**self.analysis_kwargs)
+        self.assertNotEqual(job.get_parameters_hash(), parameters_hash)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@ Test that the outputs of nodes that are up to date are loaded from the JSON file
 
 import unittest
 import os
+import time
+from multiprocessing.pool import ThreadPool
 
 from livius.video.processing.job import Job
 
@@ -52,6 +54,17 @@ class J3(Job):
         pass
 
 
+class J4(J3):
+    name = 'j4'
+    attributes_to_serialize = ['j4_attr1']
+
+    def load_state(self):
+        # slow loading, for interleaving the threads
+        self.nb_loads = getattr(self, 'nb_loads', 0) + 1
+        time.sleep(0.05)
+        return super(J4, self).load_state()
+
+
 class TestOutputCaching(JobTestsFixture, unittest.TestCase):
     def setUp(self):
         super(TestOutputCaching, self).setUp()
@@ -101,3 +114,21 @@ class TestOutputCaching(JobTestsFixture, unittest.TestCase):
         # Should not be run again, because has_run is not a parameter, but a cached output.
         j3.process()
         self.assertFalse(j3.has_run)
+
+    def test_concurrent_get_outputs(self):
+        j4 = J4(json_prefix=os.path.join(self.tmpdir, 'test_concurrent'), j4_attr1=41)
+        j4.process()
+
+        j4.has_run = None
+        j4.nb_loads = 0
+
+        # the Jobs of the threaded scheduler query the outputs of their shared parents concurrently
+        pool = ThreadPool(4)
+        try:
+            pool.map(lambda _: j4.get_outputs(), range(8))
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertTrue(j4.has_run)
+        self.assertEqual(j4.nb_loads, 1)
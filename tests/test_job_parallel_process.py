@@ -0,0 +1,127 @@
+'''
+Test the concurrent processing of the Job DAG
+'''
+
+import unittest
+import os
+import threading
+
+from livius.video.processing.job import Job
+from livius.video.processing.scheduler import process_workflow_parallel, get_jobs_to_process
+
+from .test_job import JobTestsFixture
+
+
+class CountingJob(Job):
+    """Records the number of runs and state flushes"""
+    outputs_to_cache = ['result']
+
+    def __init__(self, *args, **kwargs):
+        super(CountingJob, self).__init__(*args, **kwargs)
+        self.nb_runs = 0
+        self.nb_serializations = 0
+
+    def serialize_state(self, *args, **kwargs):
+        self.nb_serializations += 1
+        super(CountingJob, self).serialize_state(*args, **kwargs)
+
+    def get_outputs(self):
+        super(CountingJob, self).get_outputs()
+        return self.result
+
+
+class JRoot(CountingJob):
+    name = 'jroot'
+    attributes_to_serialize = ['root_param']
+
+    def run(self, *args, **kwargs):
+        self.nb_runs += 1
+        self.result = [1, 2, 3]
+
+
+# both branches wait for each other: this would never finish if they were
+# not run concurrently
+_left_started = threading.Event()
+_right_started = threading.Event()
+
+
+class JLeft(CountingJob):
+    name = 'jleft'
+    parents = [JRoot]
+
+    def run(self, *args, **kwargs):
+        self.nb_runs += 1
+        _left_started.set()
+        assert(_right_started.wait(5))
+        self.result = [i ** 2 for i in args[0]]
+
+
+class JRight(CountingJob):
+    name = 'jright'
+    parents = [JRoot]
+
+    def run(self, *args, **kwargs):
+        self.nb_runs += 1
+        _right_started.set()
+        assert(_left_started.wait(5))
+        self.result = [i + 1 for i in args[0]]
+
+
+class JFinal(CountingJob):
+    name = 'jfinal'
+    parents = [JLeft, JRight]
+
+    def run(self, *args, **kwargs):
+        self.nb_runs += 1
+        self.result = [a * b for (a, b) in zip(*args)]
+
+
+class JFailing(CountingJob):
+    name = 'jfailing'
+    parents = [JRoot]
+
+    def run(self, *args, **kwargs):
+        raise RuntimeError('failing on purpose')
+
+
+class JobParallelProcessTests(JobTestsFixture, unittest.TestCase):
+
+    def setUp(self):
+        super(JobParallelProcessTests, self).setUp()
+        _left_started.clear()
+        _right_started.clear()
+        self.json_prefix = os.path.join(self.tmpdir, 'test_parallel')
+
+    def test_process_diamond(self):
+        job_final = JFinal(json_prefix=self.json_prefix, root_param=1)
+        self.assertEqual(get_jobs_to_process(job_final),
+                         set([job_final, job_final.jleft, job_final.jright, job_final.jleft.jroot]))
+
+        process_workflow_parallel(job_final, nb_workers=4)
+
+        self.assertTrue(job_final.is_up_to_date())
+        self.assertEqual(job_final.get_outputs(), [2, 12, 36])
+
+        for current in [job_final, job_final.jleft, job_final.jright, job_final.jleft.jroot]:
+            self.assertEqual(current.nb_runs, 1)
+            self.assertEqual(current.nb_serializations, 1)
+            self.assertTrue(os.path.exists(current.json_filename))
+
+    def test_process_up_to_date(self):
+        process_workflow_parallel(JFinal(json_prefix=self.json_prefix, root_param=1), nb_workers=4)
+
+        job_final = JFinal(json_prefix=self.json_prefix, root_param=1)
+        self.assertFalse(get_jobs_to_process(job_final))
+        process_workflow_parallel(job_final, nb_workers=4)
+        self.assertEqual(job_final.nb_runs, 0)
+        self.assertEqual(job_final.jleft.jroot.nb_runs, 0)
+        self.assertEqual(job_final.get_outputs(), [2, 12, 36])
+
+    def test_process_failure(self):
+        job = JFailing(json_prefix=self.json_prefix, root_param=1)
+
+        with self.assertRaises(RuntimeError):
+            process_workflow_parallel(job, nb_workers=2)
+
+        self.assertEqual(job.jroot.nb_runs, 1)
+        self.assertFalse(os.path.exists(job.json_filename))
@@ -0,0 +1,163 @@
+"""
+Tests the state keys stored in the headers of the Job states.
+"""
+
+import unittest
+import os
+import shutil
+import json
+
+from livius.video.processing.job import Job
+
+from .test_job import JobTestsFixture
+
+
+class JKeyRoot(Job):
+    name = 'jkey_root'
+    attributes_to_serialize = ['root_param']
+    outputs_to_cache = ['root_output']
+
+    def run(self, *args, **kwargs):
+        self.root_output = [self.root_param] * 3
+
+    def get_outputs(self):
+        super(JKeyRoot, self).get_outputs()
+        return self.root_output
+
+
+class JKeyChild(Job):
+    name = 'jkey_child'
+    attributes_to_serialize = ['child_param']
+    outputs_to_cache = ['child_output']
+    parents = [JKeyRoot]
+
+    def load_state(self):
+        self.nb_loads = getattr(self, 'nb_loads', 0) + 1
+        return super(JKeyChild, self).load_state()
+
+    def run(self, *args, **kwargs):
+        self.child_output = [i + self.child_param for i in args[0]]
+
+    def get_outputs(self):
+        super(JKeyChild, self).get_outputs()
+        return self.child_output
+
+
+class StateKeyTests(JobTestsFixture, unittest.TestCase):
+
+    def setUp(self):
+        super(StateKeyTests, self).setUp()
+        self.json_prefix = os.path.join(self.tmpdir, 'test_state_key')
+
+    def test_header(self):
+        job = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        job.process()
+
+        header = job.get_stored_header()
+        self.assertEqual(header['state_key'], job.get_state_key())
+        self.assertIn('outputs_hash', header)
+
+        job2 = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        self.assertTrue(job2.is_up_to_date())
+        self.assertEqual(getattr(job2, 'nb_loads', 0), 0)
+        self.assertEqual(job2.get_outputs(), [3, 3, 3])
+
+    def test_key_depends_on_parents(self):
+        job = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        job.process()
+        key = job.get_state_key()
+
+        job.jkey_root.root_param = 10
+        self.assertFalse(job.is_up_to_date())
+        job.process()
+
+        self.assertNotEqual(job.get_state_key(), key)
+        self.assertEqual(job.get_outputs(), [12, 12, 12])
+
+    def test_parent_outputs_changed(self):
+        job = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        job.process()
+
+        # the parent is recomputed with the same parameters but produces another output
+        root = job.jkey_root
+        root.root_output = [5, 5]
+        os.remove(root.json_filename)
+        os.remove(root.get_state_storage().header_filename)
+        root.serialize_state(with_parents=False)
+
+        job2 = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        self.assertTrue(job2.jkey_root.is_up_to_date())
+        self.assertFalse(job2.is_up_to_date())
+
+    def test_relocation(self):
+        job = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        job.process()
+
+        other_location = os.path.join(self.tmpdir, 'other_location')
+        os.makedirs(other_location)
+        for f in os.listdir(self.tmpdir):
+            if f.startswith('test_state_key'):
+                shutil.copy(os.path.join(self.tmpdir, f), other_location)
+
+        job2 = JKeyChild(json_prefix=os.path.join(other_location, 'test_state_key'), root_param=1, child_param=2)
+        self.assertTrue(job2.is_up_to_date())
+        self.assertEqual(job2.get_outputs(), [3, 3, 3])
+
+    def test_state_without_header(self):
+        job = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        job.process()
+
+        for current in [job, job.jkey_root]:
+            os.remove(current.get_state_storage().header_filename)
+
+        with open(job.json_filename) as f:
+            self.assertEqual(json.load(f)['child_param'], 2)
+
+        job2 = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        self.assertTrue(job2.is_up_to_date())
+
+        job3 = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=3)
+        self.assertFalse(job3.is_up_to_date())
+
+        # a new flush writes the header
+        job3.process()
+        self.assertIsNotNone(job3.get_stored_header())
+
+    def test_upgrade_state_without_header(self):
+        job = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        job.process()
+        key = job.get_state_key()
+
+        for current in [job, job.jkey_root]:
+            os.remove(current.get_state_storage().header_filename)
+
+        # the states are still up to date, and are stored again with their headers
+        job2 = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        job2.process()
+        for current in [job2, job2.jkey_root]:
+            self.assertTrue(os.path.exists(current.get_state_storage().header_filename))
+        self.assertEqual(job2.get_stored_header()['state_key'], key)
+
+        # the next checks do not load the state
+        job3 = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        self.assertTrue(job3.is_up_to_date())
+        self.assertEqual(getattr(job3, 'nb_loads', 0), 0)
+        self.assertEqual(job3.get_outputs(), [3, 3, 3])
+
+    def test_version(self):
+        job = JKeyChild(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        job.process()
+
+        class JKeyChildNewVersion(JKeyChild):
+            version = 2
+
+        job2 = JKeyChildNewVersion(json_prefix=self.json_prefix, root_param=1, child_param=2)
+        self.assertTrue(job2.jkey_root.is_up_to_date())
+        self.assertFalse(job2.is_up_to_date())
+
+        job2.process()
+        self.assertTrue(JKeyChildNewVersion(json_prefix=self.json_prefix, root_param=1, child_param=2).is_up_to_date())
+
+        # versioned Jobs do not consider the states without header
+        os.remove(job2.get_state_storage().header_filename)
+        self.assertFalse(JKeyChildNewVersion(json_prefix=self.json_prefix, root_param=1, child_param=2).is_up_to_date())
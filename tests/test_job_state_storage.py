@@ -0,0 +1,104 @@
+"""
+Tests the storage of the numpy arrays of the Job states in memory mapped sidecar files.
+"""
+
+import unittest
+import os
+import json
+
+import numpy as np
+
+from livius.video.processing.job import Job
+from livius.video.processing.state_storage import JSONStateStorage
+
+from .test_job import JobTestsFixture
+
+
+class JArray(Job):
+    name = 'jarray'
+    attributes_to_serialize = ['some_parameter']
+    outputs_to_cache = ['array_output', 'dict_output', 'small_output']
+
+    def run(self, *args, **kwargs):
+        self.array_output = np.arange(12, dtype=np.float32).reshape(3, 4) * self.some_parameter
+        self.dict_output = {u'area1': np.ones((2, 256), dtype=np.float32),
+                            u'area2': np.zeros((2, 256), dtype=np.float32)}
+        self.small_output = [1, 2, 3]
+
+    def get_outputs(self):
+        super(JArray, self).get_outputs()
+        return self.array_output
+
+
+class JArrayParameter(Job):
+    name = 'jarray_parameter'
+    attributes_to_serialize = ['array_parameter']
+    state_storage_class = JSONStateStorage
+
+
+class StateStorageTests(JobTestsFixture, unittest.TestCase):
+
+    def setUp(self):
+        super(StateStorageTests, self).setUp()
+        self.json_prefix = os.path.join(self.tmpdir, 'test_state_storage')
+
+    def test_sidecar_files(self):
+        job = JArray(json_prefix=self.json_prefix, some_parameter=2)
+        job.process()
+
+        with open(job.json_filename) as f:
+            raw_state = json.load(f)
+
+        # only references in the JSON file, relative to the JSON location
+        self.assertEqual(raw_state['small_output'], [1, 2, 3])
+        self.assertEqual(raw_state['array_output'].keys(), ['__ndarray__'])
+        self.assertEqual(os.path.dirname(raw_state['array_output']['__ndarray__']), '')
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, raw_state['array_output']['__ndarray__'])))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, raw_state['dict_output']['area1']['__ndarray__'])))
+
+    def test_load_memory_mapped(self):
+        job = JArray(json_prefix=self.json_prefix, some_parameter=2)
+        job.process()
+
+        job2 = JArray(json_prefix=self.json_prefix, some_parameter=2)
+        self.assertTrue(job2.is_up_to_date())
+
+        out = job2.get_outputs()
+        self.assertIsInstance(out, np.memmap)
+        self.assertFalse(out.flags.writeable)
+        np.testing.assert_array_equal(out, np.arange(12, dtype=np.float32).reshape(3, 4) * 2)
+        np.testing.assert_array_equal(job2.dict_output['area1'], np.ones((2, 256)))
+
+        # flushing again while the previous arrays are mapped
+        job2.some_parameter = 3
+        job2.process()
+        np.testing.assert_array_equal(out, np.arange(12, dtype=np.float32).reshape(3, 4) * 2)
+
+        job3 = JArray(json_prefix=self.json_prefix, some_parameter=3)
+        np.testing.assert_array_equal(job3.get_outputs(), np.arange(12, dtype=np.float32).reshape(3, 4) * 3)
+
+    def test_array_parameters(self):
+        job = JArrayParameter(json_prefix=self.json_prefix, array_parameter=np.array([1, 2, 3]))
+        self.assertFalse(job.are_states_equal())
+
+        # the array is stored in JSON
+        job.array_parameter = job.array_parameter.tolist()
+        job.serialize_state()
+
+        # states without header are compared attribute by attribute
+        os.remove(job.get_state_storage().header_filename)
+
+        job2 = JArrayParameter(json_prefix=self.json_prefix, array_parameter=np.array([1, 2, 3]))
+        self.assertTrue(job2.are_states_equal())
+
+        job3 = JArrayParameter(json_prefix=self.json_prefix, array_parameter=np.array([1, 2, 4]))
+        self.assertFalse(job3.are_states_equal())
+
+    def test_array_parameters_hash(self):
+        job = JArrayParameter(json_prefix=self.json_prefix, array_parameter=np.array([1, 2, 3]))
+        self.assertEqual(job.get_parameters_hash(),
+                         JArrayParameter(json_prefix=self.json_prefix, array_parameter=np.array([1, 2, 3])).get_parameters_hash())
+        self.assertNotEqual(job.get_parameters_hash(),
+                            JArrayParameter(json_prefix=self.json_prefix, array_parameter=np.array([1, 2, 4])).get_parameters_hash())
+        self.assertNotEqual(job.get_parameters_hash(),
+                            JArrayParameter(json_prefix=self.json_prefix, array_parameter=np.array([1., 2., 3.])).get_parameters_hash())
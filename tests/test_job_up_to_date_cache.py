@@ -0,0 +1,87 @@
+"""
+Tests the memoization of the up to date checks across a workflow instance.
+"""
+
+import unittest
+import os
+
+from livius.video.processing.job import Job
+
+from .test_job import JobTestsFixture
+
+
+class LoadCountingJob(Job):
+    """Counts the number of times the state is read back"""
+
+    def __init__(self, *args, **kwargs):
+        super(LoadCountingJob, self).__init__(*args, **kwargs)
+        self.nb_loads = 0
+
+    def load_state(self):
+        self.nb_loads += 1
+        return super(LoadCountingJob, self).load_state()
+
+    def run(self, *args, **kwargs):
+        pass
+
+
+class J1(LoadCountingJob):
+    name = 'j1'
+    attributes_to_serialize = ['j1_attr']
+
+
+class J2(LoadCountingJob):
+    name = 'j2'
+    parents = [J1]
+
+
+class J3(LoadCountingJob):
+    name = 'j3'
+    parents = [J1]
+
+
+class J4(LoadCountingJob):
+    name = 'j4'
+    parents = [J2, J3]
+
+
+class UpToDateCacheTests(JobTestsFixture, unittest.TestCase):
+
+    def setUp(self):
+        super(UpToDateCacheTests, self).setUp()
+        self.json_prefix = os.path.join(self.tmpdir, 'test_up_to_date_cache')
+
+    def test_cache_shared_by_workflow(self):
+        job_final = J4(json_prefix=self.json_prefix, j1_attr=1)
+        self.assertIs(job_final._up_to_date_cache, job_final.j2.j1._up_to_date_cache)
+        self.assertIs(job_final._up_to_date_cache, job_final.j3._up_to_date_cache)
+
+        other_instance = J4(json_prefix=self.json_prefix, j1_attr=1)
+        self.assertIsNot(job_final._up_to_date_cache, other_instance._up_to_date_cache)
+
+    def test_state_loaded_once(self):
+        J4(json_prefix=self.json_prefix, j1_attr=1).process()
+
+        job_final = J4(json_prefix=self.json_prefix, j1_attr=1)
+        for _ in range(10):
+            self.assertTrue(job_final.is_up_to_date())
+            job_final.serialize_state()
+
+        # the checks only read the headers of the states
+        self.assertEqual(job_final.j2.j1.nb_loads, 0)
+        self.assertEqual(job_final.j2.nb_loads, 0)
+        self.assertEqual(job_final.nb_loads, 0)
+
+    def test_invalidation(self):
+        job_final = J4(json_prefix=self.json_prefix, j1_attr=1)
+        self.assertFalse(job_final.is_up_to_date())
+
+        job_final.process()
+        self.assertTrue(job_final.is_up_to_date())
+
+        # changing a parameter invalidates the memoized values
+        job_final.j2.j1.j1_attr = 2
+        self.assertFalse(job_final.is_up_to_date())
+
+        job_final.process()
+        self.assertTrue(job_final.is_up_to_date())
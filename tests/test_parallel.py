@@ -0,0 +1,56 @@
+"""
+Tests the pool of worker processes shared by the Jobs.
+"""
+
+import unittest
+import os
+import multiprocessing
+
+from livius.util.parallel import get_nb_workers, get_chunk_size, process_pool, parallel_map
+
+
+def _square(x):
+    return x * x
+
+
+def _get_pid(x):
+    return os.getpid()
+
+
+def _fail(x):
+    raise ValueError('failing on purpose')
+
+
+class ParallelTests(unittest.TestCase):
+
+    def test_nb_workers(self):
+        self.assertEqual(get_nb_workers(), multiprocessing.cpu_count())
+        self.assertEqual(get_nb_workers(0), multiprocessing.cpu_count())
+        self.assertEqual(get_nb_workers('3'), 3)
+
+    def test_chunk_size(self):
+        self.assertEqual(get_chunk_size(0, 4), 1)
+        self.assertEqual(get_chunk_size(10, 4), 1)
+        self.assertEqual(get_chunk_size(7200, 32), 57)
+
+    def test_map(self):
+        self.assertEqual(parallel_map(_square, xrange(100), nb_workers=3), [i * i for i in range(100)])
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_map_on_pool(self):
+        # several maps on the same workers
+        with process_pool(2) as pool:
+            pids = parallel_map(_get_pid, xrange(20), nb_workers=2, pool=pool)
+            pids += parallel_map(_get_pid, xrange(20), nb_workers=2, pool=pool)
+            self.assertEqual(set(pids) - set(worker.pid for worker in multiprocessing.active_children()), set())
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_teardown_on_error(self):
+        with self.assertRaises(ValueError):
+            parallel_map(_fail, range(10), nb_workers=2)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+        with self.assertRaises(RuntimeError):
+            with process_pool(2):
+                raise RuntimeError('failing on purpose')
+        self.assertEqual(multiprocessing.active_children(), [])
@@ -0,0 +1,159 @@
+"""
+Tests the rendering of the videos: time chunks and settings of the encoder.
+"""
+
+import unittest
+import os
+import shutil
+from tempfile import mkdtemp
+
+from livius.video.editing.rendering import get_chunk_boundaries, get_encoding_settings, get_write_arguments, \
+    encoding_profiles, write_videofile
+
+
+class ChunkBoundariesTests(unittest.TestCase):
+
+    def test_one_section(self):
+        self.assertEqual(get_chunk_boundaries(10, 30, 1), [0, 10])
+        self.assertEqual(get_chunk_boundaries(10, 30, 4), [0, 2.5, 5, 7.5, 10])
+
+        # aligned to the frames
+        boundaries = get_chunk_boundaries(10, 30, 3)
+        self.assertEqual(len(boundaries), 4)
+        for t in boundaries:
+            self.assertAlmostEqual(t * 30, round(t * 30))
+
+    def test_sections(self):
+        # introduction, talk and credits
+        boundaries = get_chunk_boundaries(110, 25, 8, [5, 100])
+        self.assertEqual(len(boundaries), 9)
+        self.assertIn(5, boundaries)
+        self.assertIn(100, boundaries)
+        self.assertEqual(boundaries, sorted(boundaries))
+
+        # the talk takes the additional chunks
+        self.assertEqual(boundaries[:3], [0, 5, 20.84])
+        self.assertEqual(boundaries[-2:], [100, 110])
+
+    def test_keyframes(self):
+        # groups of pictures of 2 seconds
+        boundaries = get_chunk_boundaries(110, 25, 8, [5, 100], keyframe_interval=50)
+        self.assertIn(5, boundaries)
+        self.assertIn(100, boundaries)
+        for t in boundaries[1:-2]:
+            self.assertAlmostEqual((t - 5) % 2, 0)
+
+        self.assertEqual(boundaries, sorted(set(boundaries)))
+
+    def test_min_chunk_duration(self):
+        self.assertEqual(get_chunk_boundaries(100, 25, 8, min_chunk_duration=30), [0, 33.32, 66.68, 100])
+        self.assertEqual(len(get_chunk_boundaries(100, 25, 8, min_chunk_duration=10)), 9)
+
+        # the sections are kept
+        self.assertEqual(get_chunk_boundaries(110, 25, 8, [5, 100], min_chunk_duration=40), [0, 5, 52.52, 100, 110])
+
+    def test_more_sections_than_chunks(self):
+        self.assertEqual(get_chunk_boundaries(20, 30, 1, [5, 15]), [0, 5, 15, 20])
+
+    def test_boundaries_outside(self):
+        self.assertEqual(get_chunk_boundaries(20, 30, 2, [0, 20, 25]), [0, 10, 20])
+
+
+class EncodingSettingsTests(unittest.TestCase):
+
+    def test_default(self):
+        settings = get_encoding_settings()
+        self.assertEqual(settings['fps'], 30)
+        self.assertEqual(settings['codec'], 'libx264')
+
+        # moviepy defaults
+        self.assertEqual(get_write_arguments(settings), {'fps': 30, 'codec': 'libx264', 'two_pass': False})
+
+    def test_profiles(self):
+        for profile in encoding_profiles:
+            settings = get_encoding_settings(profile)
+            self.assertEqual(set(settings.keys()), set(encoding_profiles['default'].keys()))
+
+        arguments = get_write_arguments(get_encoding_settings('web-fast'))
+        self.assertEqual(arguments['preset'], 'veryfast')
+        self.assertEqual(arguments['ffmpeg_params'], ['-crf', '23', '-g', '60'])
+        self.assertEqual(arguments['audio_bitrate'], '128k')
+
+        with self.assertRaises(RuntimeError):
+            get_encoding_settings('unknown')
+
+    def test_overrides(self):
+        # as given by the runtime options
+        settings = get_encoding_settings('archive', {'crf': '20', 'preset': 'none', 'fps': '25'})
+        self.assertEqual(settings['crf'], 20)
+        self.assertIsNone(settings['preset'])
+        self.assertEqual(settings['fps'], 25)
+        self.assertNotIn('preset', get_write_arguments(settings))
+
+        with self.assertRaises(RuntimeError):
+            get_encoding_settings('archive', {'unknown_setting': 1})
+
+    def test_two_pass(self):
+        with self.assertRaises(RuntimeError):
+            get_encoding_settings('archive', {'two_pass': 'true'})
+
+        settings = get_encoding_settings('archive', {'two_pass': 'true', 'video_bitrate': '3000k'})
+        arguments = get_write_arguments(settings)
+        self.assertTrue(arguments['two_pass'])
+        self.assertEqual(arguments['bitrate'], '3000k')
+
+        # the rate factor is not used with a target bitrate
+        self.assertEqual(arguments['ffmpeg_params'], ['-g', '300'])
+
+
+class RecordedAudioClip(object):
+    """Records the writing of an audio clip, in place of a moviepy clip"""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def write_audiofile(self, filename, **kwargs):
+        self.calls.append(('audio', filename, kwargs))
+        open(filename, 'w').close()
+
+
+class RecordedVideoClip(object):
+    """Records the writing of a video clip, in place of a moviepy clip"""
+
+    def __init__(self):
+        self.calls = []
+        self.audio = RecordedAudioClip(self.calls)
+
+    def write_videofile(self, filename, fps, **kwargs):
+        self.calls.append(('video', filename, kwargs))
+
+
+class WriteVideoTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.output_file = os.path.join(self.tmpdir, 'video.mp4')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_audio_filter(self):
+        clip = RecordedVideoClip()
+        write_videofile(clip, self.output_file, 30, audio_filter='pan=stereo|c0=c0|c1=c0', audio_bitrate='128k')
+
+        # the audio is encoded with the filter, and muxed as is
+        (kind, audio_file, audio_kwargs), (_, video_file, video_kwargs) = clip.calls
+        self.assertEqual(kind, 'audio')
+        self.assertEqual(audio_kwargs['ffmpeg_params'], ['-af', 'pan=stereo|c0=c0|c1=c0'])
+        self.assertEqual(audio_kwargs['bitrate'], '128k')
+        self.assertEqual(video_file, self.output_file)
+        self.assertEqual(video_kwargs['audio'], audio_file)
+        self.assertFalse(os.path.exists(audio_file))
+
+    def test_no_audio_filter(self):
+        clip = RecordedVideoClip()
+        write_videofile(clip, self.output_file, 30)
+
+        [(kind, _, video_kwargs)] = clip.calls
+        self.assertEqual(kind, 'video')
+        self.assertNotIn('audio', video_kwargs)
@@ -0,0 +1,113 @@
+"""
+Tests the detection of the stable segments.
+"""
+
+import unittest
+import os
+import shutil
+from tempfile import mkdtemp
+
+import numpy as np
+
+from livius.util.functor import Functor
+from livius.video.processing.jobs.segment_computation import SegmentComputationJob, get_stable_segments, \
+    get_correlations_array
+
+
+def _get_stable_segments_by_scan(get_histogram_correlation, number_of_files, tolerance, min_length_in_seconds):
+    """Reference implementation scanning the frames one by one"""
+    segments = []
+    t_segment_start = 0.0
+    lower_bounds = 1.0 - tolerance
+    i = 2
+    end = number_of_files
+    t = i
+
+    while i < end:
+        while (i < end) and (get_histogram_correlation(i) >= lower_bounds):
+            i += 1
+            t += 1
+
+        if (t - t_segment_start) >= min_length_in_seconds:
+            segments.append([t_segment_start, t])
+
+        while (i < end) and (get_histogram_correlation(i) < lower_bounds):
+            i += 1
+            t += 1
+
+        t_segment_start = t
+
+    return segments
+
+
+class SegmentComputationTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_against_scan(self, correlations, tolerances, min_length):
+        get_correlation = Functor(dict((i + 2, c) for i, c in enumerate(correlations)))
+        number_of_files = len(correlations) + 2
+
+        segments_per_tolerance = get_stable_segments(correlations, tolerances, min_length)
+        self.assertEqual(len(segments_per_tolerance), len(tolerances))
+
+        for tolerance, segments in zip(tolerances, segments_per_tolerance):
+            self.assertEqual(segments,
+                             _get_stable_segments_by_scan(get_correlation, number_of_files, tolerance, min_length))
+
+    def test_random_correlations(self):
+        rng = np.random.RandomState(0)
+        for _ in range(20):
+            correlations = 1 - rng.exponential(0.05, size=rng.randint(1, 200))
+            self.check_against_scan(correlations, [0.01, 0.05, 0.1, 0.5], 2)
+            self.check_against_scan(correlations, [0.02, 0.2], 5)
+
+    def test_boundaries(self):
+        # first entry unstable, last entry stable
+        self.check_against_scan([0.5, 1, 1, 1, 0.5, 1], [0.1], 2)
+        self.check_against_scan([0.5, 1, 1, 1, 0.5, 1], [0.1], 0)
+        self.check_against_scan([1, 1, 0.5, 0.5], [0.1], 1)
+        self.check_against_scan([0.5], [0.1], 1)
+        self.check_against_scan([1], [0.1], 1)
+
+        self.assertEqual(get_stable_segments([], [0.1, 0.2], 1), [[], []])
+        self.assertEqual(get_stable_segments([1, 1, 0.5, 1, 1], 0.1, 2), [[[0.0, 4.0], [5.0, 7.0]]])
+
+    def test_undefined_correlations(self):
+        # undefined correlations are unstable
+        self.assertEqual(get_stable_segments([1, 1, np.nan, 1, 1], 0.1, 2),
+                         get_stable_segments([1, 1, 0, 1, 1], 0.1, 2))
+
+    def test_correlations_array(self):
+        correlations = dict((i, 1.0 / i) for i in range(2, 10))
+        expected = [1.0 / i for i in range(2, 10)]
+
+        np.testing.assert_array_equal(get_correlations_array(Functor(correlations), 10), expected)
+        np.testing.assert_array_equal(get_correlations_array(lambda i: correlations[i], 10), expected)
+
+    def test_job_tolerance_sweep(self):
+        rng = np.random.RandomState(1)
+        correlations = 1 - rng.exponential(0.05, size=100)
+        get_correlation = Functor(dict((i + 2, c) for i, c in enumerate(correlations)))
+
+        job = SegmentComputationJob(json_prefix=os.path.join(self.tmpdir, 'video'),
+                                    segment_computation_tolerance='0.05',
+                                    segment_computation_min_length_in_seconds='2',
+                                    segment_computation_tolerance_sweep='0.01, 0.1,0.2')
+        self.assertEqual(job.segment_computation_tolerance_sweep, [0.01, 0.1, 0.2])
+
+        job.run(get_correlation, 102)
+
+        segments_per_tolerance = job.get_segments_per_tolerance()
+        self.assertEqual([tolerance for tolerance, _ in segments_per_tolerance], [0.05, 0.01, 0.1, 0.2])
+        self.assertEqual(job.segments, segments_per_tolerance[0][1])
+        for tolerance, segments in segments_per_tolerance:
+            self.assertEqual(segments, _get_stable_segments_by_scan(get_correlation, 102, tolerance, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
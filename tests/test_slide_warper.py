@@ -0,0 +1,67 @@
+"""
+Tests the warping of the slides.
+"""
+
+import unittest
+
+import numpy as np
+import cv2
+
+try:
+    from livius.video.processing.jobs.extract_slide_clip import SlideWarper
+    from livius.util.tools import get_transformation_points_from_normalized_rect
+    has_moviepy = True
+except ImportError:
+    has_moviepy = False
+
+
+@unittest.skipIf(not has_moviepy, "moviepy not available")
+class SlideWarperTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.image = cv2.GaussianBlur(rng.randint(0, 256, size=(120, 160, 3)).astype(np.uint8), (5, 5), 2)
+        self.slide_rect = [0.1, 0.2, 0.6, 0.5]
+        self.layout = (64, 48)
+
+    def _warp_reference(self, image):
+        slideShow = np.array([[0, 0],
+                              [self.layout[0] - 1, 0],
+                              [self.layout[0] - 1, self.layout[1] - 1],
+                              [0, self.layout[1] - 1]],
+                             np.float32)
+        slide_coordinates = get_transformation_points_from_normalized_rect(self.slide_rect, image)
+        return cv2.warpPerspective(image, cv2.getPerspectiveTransform(slide_coordinates, slideShow), self.layout)
+
+    def test_perspective(self):
+        warper = SlideWarper(self.slide_rect, list(self.layout))
+        warped = warper(self.image)
+        self.assertEqual(warped.shape, (48, 64, 3))
+        np.testing.assert_array_equal(warped, self._warp_reference(self.image))
+
+        # computed once per frame size
+        self.assertIs(warper.get_transformation(self.image.shape), warper.get_transformation((120, 160)))
+
+        small_image = self.image[::2, ::2].copy()
+        np.testing.assert_array_equal(warper(small_image), self._warp_reference(small_image))
+        self.assertEqual(len(warper.transformations), 2)
+
+    def test_remap(self):
+        warper = SlideWarper(self.slide_rect, self.layout, method='remap')
+        warped = warper(self.image)
+        self.assertEqual(warped.shape, (48, 64, 3))
+
+        difference = np.abs(warped.astype(np.int32) - self._warp_reference(self.image))
+        self.assertLessEqual(difference.max(), 2)
+
+    def test_reuse_output(self):
+        for method in SlideWarper.methods:
+            warper = SlideWarper(self.slide_rect, self.layout, method=method, reuse_output=True)
+            warped1 = warper(self.image)
+            warped2 = warper(255 - self.image)
+            self.assertIs(warped1, warped2)
+            np.testing.assert_array_equal(warped2, SlideWarper(self.slide_rect, self.layout, method=method)(255 - self.image))
+
+    def test_unknown_method(self):
+        with self.assertRaises(RuntimeError):
+            SlideWarper(self.slide_rect, self.layout, method='unknown')
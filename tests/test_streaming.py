@@ -0,0 +1,89 @@
+"""
+Tests the streaming of the per-frame outputs by chunks of frames.
+"""
+
+import unittest
+import os
+import shutil
+from tempfile import mkdtemp
+
+import numpy as np
+
+from livius.video.processing.streaming import ArrayRangeReader, NpyFileRangeReader, get_range_reader
+from livius.video.processing.jobs.histogram_computation import get_area_histograms_functor
+from livius.video.processing.jobs.histogram_correlations import HistogramCorrelationJob
+
+
+class StreamingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+        rng = np.random.RandomState(0)
+        self.area_names = [u'slides', u'speaker_00', u'speaker_01']
+        self.histograms = rng.randint(0, 50, size=(23, 3, 256)).astype(np.float32)
+        self.histograms[0] = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def save_histograms(self):
+        filename = os.path.join(self.tmpdir, 'histograms.npy')
+        np.save(filename, self.histograms)
+        return np.load(filename, mmap_mode='r')
+
+    def test_chunks(self):
+        reader = ArrayRangeReader(np.arange(10))
+
+        chunks = list(reader.iter_chunks(4))
+        self.assertEqual([chunk_start for chunk_start, _ in chunks], [0, 4, 8])
+        np.testing.assert_array_equal(np.concatenate([chunk for _, chunk in chunks]), np.arange(10))
+
+        chunks = list(reader.iter_chunks(4, overlap=1, start=1, stop=9))
+        self.assertEqual([chunk.tolist() for _, chunk in chunks], [[1, 2, 3, 4], [4, 5, 6, 7], [7, 8]])
+        for chunk_start, chunk in chunks:
+            self.assertEqual(chunk[0], chunk_start)
+
+        self.assertEqual(list(reader.iter_chunks(4, start=10)), [])
+
+        with self.assertRaises(RuntimeError):
+            list(reader.iter_chunks(1, overlap=1))
+
+    def test_npy_file(self):
+        histograms = self.save_histograms()
+
+        reader = get_range_reader(histograms)
+        self.assertIsInstance(reader, NpyFileRangeReader)
+        self.assertEqual(len(reader), 23)
+
+        np.testing.assert_array_equal(reader.read(5, 12), self.histograms[5:12])
+        np.testing.assert_array_equal(reader.read(20, 30), self.histograms[20:])
+        np.testing.assert_array_equal(np.concatenate([chunk for _, chunk in reader.iter_chunks(7)]), self.histograms)
+
+        # the views and the arrays in memory are read directly
+        self.assertIsInstance(get_range_reader(histograms[2:]), ArrayRangeReader)
+        self.assertIsInstance(get_range_reader(self.histograms), ArrayRangeReader)
+
+    def test_correlations_by_chunks(self):
+        expected = HistogramCorrelationJob(json_prefix=os.path.join(self.tmpdir, 'full'),
+                                           histogram_comparison_methods='chisqr')
+        expected.run(get_area_histograms_functor(self.histograms, self.area_names), 23, 2)
+
+        histograms = self.save_histograms()
+        get_histogram = get_area_histograms_functor(histograms, self.area_names, reader=get_range_reader(histograms))
+
+        for chunk_size in [2, 5, 64]:
+            job = HistogramCorrelationJob(json_prefix=os.path.join(self.tmpdir, 'chunks'),
+                                          histogram_comparison_methods='chisqr',
+                                          histogram_correlation_chunk_size=str(chunk_size))
+            job.run(get_histogram, 23, 2)
+
+            self.assertEqual(job.histogram_correlations, expected.histogram_correlations)
+            for method in ['correl', 'chisqr']:
+                for area_name in self.area_names:
+                    np.testing.assert_array_equal(job.get_area_comparisons(method)[area_name],
+                                                  expected.get_area_comparisons(method)[area_name])
+
+
+if __name__ == '__main__':
+    unittest.main()